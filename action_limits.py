@@ -0,0 +1,89 @@
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from outbound import TokenBucket
+
+ACTION_KINDS = ("meta", "res")
+IDLE_PRUNE_INTERVAL = 300.0
+
+
+class ActionLimiter:
+    """按用户、按会话的令牌桶限流（META 与 RES 动作分别配置），并统计消耗最多的用户/会话。"""
+
+    def __init__(self, limits: Dict[str, Dict[str, Tuple[float, float]]], exempt: Tuple[str, ...] = ()):
+        # limits[kind][scope] = (per minute, burst), scope is "user" or "chat"; a rate <= 0 disables it.
+        self.limits = limits
+        self.exempt = {str(x) for x in exempt if x}
+        self._buckets: Dict[Tuple[str, str, str], TokenBucket] = {}
+        self._usage: Dict[str, "Counter[Tuple[str, str]]"] = {"user": Counter(), "chat": Counter()}
+        self._denied: "Counter[Tuple[str, str]]" = Counter()
+        self._stats = {f"limit_{kind}_{outcome}": 0 for kind in ACTION_KINDS for outcome in ("allowed", "denied")}
+        self._last_prune = time.monotonic()
+
+    def _bucket(self, kind: str, scope: str, key: str) -> Optional[TokenBucket]:
+        per_minute, burst = self.limits.get(kind, {}).get(scope, (0, 0))
+        if per_minute <= 0:
+            return None
+        bucket = self._buckets.get((kind, scope, key))
+        if bucket is None:
+            bucket = self._buckets[(kind, scope, key)] = TokenBucket(per_minute / 60, burst)
+        return bucket
+
+    def _prune(self, now: float):
+        if now - self._last_prune < IDLE_PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        for key in [k for k, b in self._buckets.items() if b.idle(now)]:
+            del self._buckets[key]
+
+    def acquire(self, kind: str, user_id: Any = None, chat_id: Any = None) -> float:
+        """Take one token from both the user's and the chat's bucket; returns 0, or seconds to wait if denied."""
+        user = str(user_id) if user_id is not None else None
+        chat = str(chat_id) if chat_id is not None else None
+        if user is not None and user in self.exempt:
+            return 0.0
+        now = time.monotonic()
+        self._prune(now)
+        buckets = [
+            b
+            for b in (
+                self._bucket(kind, "user", user) if user is not None else None,
+                # A private chat's id is the user's id; only groups get a separate chat bucket.
+                self._bucket(kind, "chat", chat) if chat is not None and chat != user else None,
+            )
+            if b is not None
+        ]
+        # Check every bucket first so a denial never spends tokens from the others.
+        wait = max((b.wait_time(now) for b in buckets), default=0.0)
+        if wait > 0:
+            self._stats[f"limit_{kind}_denied"] += 1
+            if user is not None:
+                self._denied[("user", user)] += 1
+            if chat is not None and chat != user:
+                self._denied[("chat", chat)] += 1
+            return wait
+        for bucket in buckets:
+            bucket.take()
+        self._stats[f"limit_{kind}_allowed"] += 1
+        if user is not None:
+            self._usage["user"][(user, kind)] += 1
+        if chat is not None and chat != user:
+            self._usage["chat"][(chat, kind)] += 1
+        return 0.0
+
+    def top_consumers(self, scope: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Users or chats with the most allowed actions (RES first, since those spend quota)."""
+        totals: Dict[str, Dict[str, int]] = {}
+        for (key, kind), count in self._usage[scope].items():
+            totals.setdefault(key, {"meta": 0, "res": 0})[kind] += count
+        ranked = sorted(totals.items(), key=lambda kv: (-kv[1]["res"], -kv[1]["meta"]))[:limit]
+        return [
+            {"id": key, "meta": counts["meta"], "res": counts["res"], "denied": self._denied.get((scope, key), 0)}
+            for key, counts in ranked
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        data = dict(self._stats)
+        data["limit_buckets"] = len(self._buckets)
+        return data
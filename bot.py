@@ -1,14 +1,28 @@
 import os
 import logging
 import asyncio
-import sqlite3
 import time
-import secrets
+import math
+from bisect import bisect_left
+from contextlib import aclosing
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InputTextMessageContent, BotCommand
 from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler, InlineQueryHandler, Application, ContextTypes
+from db import AuthDB
 from nullbr_api import NullbrAPI
-from message_utils import escape_md, build_resource_message
+from fair_gate import PRIORITIES as GATE_PRIORITIES
+from gateway import GatewayClient
+from metrics import start_metrics_server
+from prefetch import Prefetcher
+from inline_search import InlineSearchCoordinator
+from outbound import OutboundDispatcher
+from update_processor import ChatOrderedUpdateProcessor
+from action_limits import ActionLimiter
+from session_store import SearchSessionStore
+from records import MediaItem, SearchPage
+from message_utils import escape_md
+from resource_view import ResourceViewStore
+from resource_index import SORTS as RESOURCE_SORTS
 from telegram.constants import ParseMode
 
 load_dotenv()
@@ -21,122 +35,246 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 # --- Database Setup ---
-DB_FILE = "auth.db"
+DB_FILE = os.getenv("AUTH_DB_FILE", "auth.db")
 AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "60"))
 METRICS_LOG_INTERVAL = int(os.getenv("METRICS_LOG_INTERVAL", "60"))
-SEARCH_SESSION_TTL = int(os.getenv("SEARCH_SESSION_TTL", "300"))
+METRICS_HTTP_HOST = os.getenv("METRICS_HTTP_HOST", "127.0.0.1")
+METRICS_HTTP_PORT = int(os.getenv("METRICS_HTTP_PORT", "0"))
+# Webhook mode is enabled by setting the public URL; otherwise the bot long-polls.
+WEBHOOK_URL = os.getenv("TG_WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_LISTEN = os.getenv("TG_WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("TG_WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("TG_WEBHOOK_PATH", "telegram").strip("/")
+WEBHOOK_SECRET = os.getenv("TG_WEBHOOK_SECRET") or None
+# Sessions outlive restarts, so the TTL is in hours; SEARCH_SESSION_TTL (seconds) still overrides it.
+SEARCH_SESSION_TTL = int(os.getenv("SEARCH_SESSION_TTL") or float(os.getenv("SEARCH_SESSION_TTL_HOURS", "24")) * 3600)
 SEARCH_SESSION_MAX = int(os.getenv("SEARCH_SESSION_MAX", "200"))
+SEARCH_VIEW_SIZE = 8
+# How long to wait for upstream before answering from the local search index.
+LOCAL_PREVIEW_DELAY = float(os.getenv("LOCAL_PREVIEW_DELAY_MS", "300")) / 1000
+# Callback prefixes that may call upstream, by the kind of quota they spend; sp_/sf_ only when the screen is not cached.
+META_CALLBACKS = ("st_", "rd_", "sp_", "sf_")
+RES_CALLBACKS = ("r115_", "rmag_")
 _AUTH_CACHE = set()
 _AUTH_CACHE_AT = 0.0
-_SEARCH_SESSIONS = {}
+
+db = AuthDB(DB_FILE)
+search_sessions = SearchSessionStore(
+    os.getenv("SEARCH_SESSION_DB", "search_sessions.db"),
+    ttl=SEARCH_SESSION_TTL,
+    max_sessions=SEARCH_SESSION_MAX,
+    flush_interval=float(os.getenv("SEARCH_SESSION_FLUSH_INTERVAL", "2")),
+    max_pages=int(os.getenv("SEARCH_SESSION_PAGES", "10")),
+)
+
+
+def action_limit_config(kind, user_default, chat_default):
+    """读取 RATE_<KIND>_<USER|CHAT>_PER_MIN / _BURST；每分钟次数 <= 0 表示不限制"""
+    limits = {}
+    for scope, (per_minute, burst) in (("user", user_default), ("chat", chat_default)):
+        prefix = f"RATE_{kind.upper()}_{scope.upper()}"
+        limits[scope] = (
+            float(os.getenv(f"{prefix}_PER_MIN", str(per_minute))),
+            float(os.getenv(f"{prefix}_BURST", str(burst))),
+        )
+    return limits
 
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_FILE, timeout=5)
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA synchronous=NORMAL")
-    return conn
+action_limits = ActionLimiter(
+    {
+        "meta": action_limit_config("meta", (30, 10), (60, 20)),
+        # RES lookups spend key-pool quota, so they are limited much harder.
+        "res": action_limit_config("res", (6, 3), (12, 5)),
+    },
+    exempt=(ADMIN_ID,),
+)
 
 
-def refresh_auth_cache(force=False):
+async def refresh_auth_cache(force=False):
     global _AUTH_CACHE, _AUTH_CACHE_AT
     now = time.time()
     if not force and (now - _AUTH_CACHE_AT) <= AUTH_CACHE_TTL and _AUTH_CACHE:
         return
 
     try:
-        with get_db_connection() as conn:
-            c = conn.cursor()
-            c.execute("SELECT chat_id FROM whitelist")
-            _AUTH_CACHE = {str(row[0]) for row in c.fetchall()}
-            _AUTH_CACHE_AT = now
+        _AUTH_CACHE = set(await db.list_whitelist_ids())
+        _AUTH_CACHE_AT = now
     except Exception as e:
         logger.error("刷新白名单缓存失败: %s", e)
 
 def init_db():
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS whitelist
-                     (chat_id TEXT PRIMARY KEY,
-                      added_by TEXT,
-                      add_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-
-        c.execute('''CREATE TABLE IF NOT EXISTS api_keys
-                     (app_id TEXT PRIMARY KEY,
-                      api_key TEXT,
-                      add_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-
-        # Ensure ADMIN is always authorized
-        if ADMIN_ID:
-            c.execute("INSERT OR IGNORE INTO whitelist (chat_id, added_by) VALUES (?, ?)", (str(ADMIN_ID), "System"))
-
-        # Seed default API key from .env if table is empty
-        c.execute("SELECT COUNT(*) FROM api_keys")
-        if c.fetchone()[0] == 0:
-            env_app_id = os.getenv("X_APP_ID") or os.getenv("NULLBR_APP_ID")
-            env_api_key = os.getenv("X_API_KEY") or os.getenv("NULLBR_API_KEY")
-            if env_app_id and env_api_key:
-                c.execute("INSERT INTO api_keys (app_id, api_key) VALUES (?, ?)", (env_app_id, env_api_key))
-
-    refresh_auth_cache(force=True)
-
-def is_authorized(chat_id: str) -> bool:
+    db.init_schema(
+        ADMIN_ID,
+        os.getenv("X_APP_ID") or os.getenv("NULLBR_APP_ID"),
+        os.getenv("X_API_KEY") or os.getenv("NULLBR_API_KEY"),
+    )
+
+async def is_authorized(chat_id: str) -> bool:
     """Check if a user or group is authorized."""
-    refresh_auth_cache(force=False)
+    await refresh_auth_cache(force=False)
     return str(chat_id) in _AUTH_CACHE
 
 init_db()
-
-api_client = NullbrAPI()
+search_sessions.load()
+
+# With a gateway socket configured, the shared gateway process owns caches, credentials and rate limits.
+API_GATEWAY_SOCKET = os.getenv("API_GATEWAY_SOCKET", "")
+if API_GATEWAY_SOCKET:
+    api_client = GatewayClient(API_GATEWAY_SOCKET, timeout=float(os.getenv("API_GATEWAY_TIMEOUT", "60")))
+else:
+    api_client = NullbrAPI(db=db)
+
+prefetcher = Prefetcher(
+    api_client,
+    top_n=int(os.getenv("PREFETCH_TOP_N", "3")),
+    max_queue=int(os.getenv("PREFETCH_QUEUE_MAX", "32")),
+    per_minute=int(os.getenv("PREFETCH_PER_MINUTE", "60")),
+    idle_inflight=int(os.getenv("PREFETCH_IDLE_INFLIGHT", "4")),
+    enabled=os.getenv("PREFETCH_ENABLED", "1").lower() in ("1", "true", "yes", "on"),
+)
+
+inline_searches = InlineSearchCoordinator(
+    debounce=float(os.getenv("INLINE_DEBOUNCE_MS", "350")) / 1000,
+    prefix_ttl=float(os.getenv("INLINE_PREFIX_TTL", "60")),
+)
+
+resource_views = ResourceViewStore(
+    ttl=float(os.getenv("RESOURCE_VIEW_TTL", "1800")),
+    max_views=int(os.getenv("RESOURCE_VIEW_MAX", "500")),
+    page_chars=int(os.getenv("RESOURCE_PAGE_CHARS", "3500")),
+    page_items=int(os.getenv("RESOURCE_PAGE_ITEMS", "10")),
+)
+
+update_processor = ChatOrderedUpdateProcessor(
+    max_concurrent=int(os.getenv("UPDATE_CONCURRENCY", "16")),
+    max_pending=int(os.getenv("UPDATE_MAX_PENDING", "1024")),
+)
+
+outbound = OutboundDispatcher(
+    global_rate=float(os.getenv("TG_GLOBAL_RATE", "30")),
+    chat_rate=float(os.getenv("TG_CHAT_RATE", "1")),
+    chat_burst=float(os.getenv("TG_CHAT_BURST", "3")),
+    group_per_minute=float(os.getenv("TG_GROUP_PER_MINUTE", "20")),
+    group_burst=float(os.getenv("TG_GROUP_BURST", "5")),
+    max_retries=int(os.getenv("TG_FLOOD_MAX_RETRIES", "3")),
+)
+
+# Writes through the DB layer refresh the in-memory caches immediately.
+db.add_listener("whitelist", lambda: refresh_auth_cache(force=True))
+db.add_listener("api_keys", api_client.invalidate_credentials_cache)
 
 # --- Common Helper Functions ---
 
 
-def cleanup_search_sessions():
-    now = time.time()
-    expired = [k for k, v in _SEARCH_SESSIONS.items() if now - v.get("ts", 0) > SEARCH_SESSION_TTL]
-    for k in expired:
-        _SEARCH_SESSIONS.pop(k, None)
-
-    if len(_SEARCH_SESSIONS) > SEARCH_SESSION_MAX:
-        ordered = sorted(_SEARCH_SESSIONS.items(), key=lambda x: x[1].get("ts", 0))
-        for key, _ in ordered[: len(_SEARCH_SESSIONS) - SEARCH_SESSION_MAX]:
-            _SEARCH_SESSIONS.pop(key, None)
+def create_search_session(query, source="search", chat_id=None):
+    return search_sessions.create(
+        {
+            "query": query,
+            "source": source,
+            # Upstream calls for this session queue under this chat in the fair gate.
+            "chat": chat_id,
+            "filter": "all",
+            # filter -> {view page: (upstream page, index)} where that view starts
+            "cursors": {},
+        }
+    )
 
 
-def create_search_session(query):
-    cleanup_search_sessions()
-    token = secrets.token_hex(4)
-    _SEARCH_SESSIONS[token] = {
-        "query": query,
-        "filter": "all",
-        "ts": time.time(),
-    }
-    return token
+def get_search_session(token):
+    return search_sessions.get(token)
 
 
-def get_search_session(token):
-    session = _SEARCH_SESSIONS.get(token)
-    if session:
-        session["ts"] = time.time()
-    return session
+def iter_session_pages(session, start_page):
+    tenant = session.get("chat")
+    if session.get("source") == "list":
+        return api_client.iter_list_pages(session["query"], start_page=start_page, tenant=tenant)
+    return api_client.iter_search_pages(session["query"], start_page=start_page, tenant=tenant)
 
 
-def filter_results(items, media_filter):
-    if media_filter == "all":
-        return items
-    return [x for x in items if str(x.get("media_type", "")).lower() == media_filter]
+async def session_pages(session, start_page):
+    """先复用会话里已取过的页，缺页时再从上游逐页读取（预读下一页）并存入会话"""
+    page = start_page
+    while True:
+        data = search_sessions.get_page(session, page)
+        if data is None:
+            break
+        yield data
+        if not data.has_next():
+            return
+        page += 1
+    async with aclosing(iter_session_pages(session, page)) as pages:
+        async for data in pages:
+            search_sessions.put_page(session, data)
+            yield data
+
+
+async def collect_view_items(session, media_filter, page):
+    """从跨页结果流中取出筛选后的第 page 屏（每屏 8 条），返回 (条目, 最后读取的上游页, 是否有数据)"""
+    cursors = session.setdefault("cursors", {}).setdefault(media_filter, {1: (1, 0)})
+    known = max(p for p in cursors if p <= page)
+    upstream_page, offset = cursors[known]
+    skip = (page - known) * SEARCH_VIEW_SIZE
+    items = []
+    last_page = None
+    async with aclosing(session_pages(session, upstream_page)) as pages:
+        async for data in pages:
+            last_page = data.page
+            if data.title:
+                session["title"] = data.title
+            # Per-type positions are precomputed on the page, so a filter only visits its own items.
+            positions = data.indexes_for(media_filter)
+            for idx in positions[bisect_left(positions, offset):]:
+                if skip:
+                    skip -= 1
+                    continue
+                if len(items) == SEARCH_VIEW_SIZE:
+                    # Remember where the next screen starts so it resumes without re-reading earlier pages.
+                    cursors[page + 1] = (data.page, idx)
+                    return items, last_page, True
+                items.append(data.items[idx])
+            offset = 0
+    return items, last_page, last_page is not None
+
+
+def view_is_cached(session, media_filter, page):
+    """第 page 屏能否只用会话里已取过的页渲染（与 collect_view_items 同样的游标与计数，但不读上游）"""
+    pages = session.get("_pages") or {}
+    cursors = (session.get("cursors") or {}).get(media_filter) or {1: (1, 0)}
+    known = max(p for p in cursors if p <= page)
+    upstream_page, offset = cursors[known]
+    # The screen is complete once one item past it is seen, or the last upstream page is reached.
+    needed = (page - known + 1) * SEARCH_VIEW_SIZE + 1
+    while True:
+        data = pages.get(upstream_page)
+        if data is None:
+            return False
+        positions = data.indexes_for(media_filter)
+        needed -= len(positions) - bisect_left(positions, offset)
+        if needed <= 0 or not data.has_next():
+            return True
+        upstream_page += 1
+        offset = 0
+
+
+def search_callback_is_local(data):
+    """sp_/sf_ 翻页或筛选可由会话缓存直接渲染时不计入 META 额度；会话已过期时同样无上游请求"""
+    if data.startswith("sp_"):
+        _, token, page = data.split("_", 2)
+        media_filter = None
+    elif data.startswith("sf_"):
+        _, token, media_filter, page = data.split("_", 3)
+    else:
+        return False
+    session = get_search_session(token)
+    if not session:
+        return True
+    return view_is_cached(session, media_filter or session.get("filter", "all"), max(1, int(page)))
 
 
 def build_search_keyboard(items, token, page, media_filter):
     keyboard = []
     for item in items[:8]:
-        title = item.get('name') or item.get('title') or '未知'
-        tmdbid = item.get('tmdbid', '')
-        date = item.get('release_date', '')
-        year = date[:4] if date else "未知年份"
-        media_type = item.get('media_type', 'movie')
-        keyboard.append([InlineKeyboardButton(f"{title} ({year})", callback_data=f"st_{media_type}_{tmdbid}")])
+        keyboard.append([InlineKeyboardButton(f"{item.name} ({item.year})", callback_data=f"st_{item.media_type}_{item.tmdbid}")])
 
     keyboard.append(
         [
@@ -181,12 +319,73 @@ def build_resource_menu_keyboard(media_type, tmdbid):
     )
 
 
-def build_admin_panel_text(whitelist_rows, key_rows):
+def build_resource_view_keyboard(token, view, page, has_next):
+    keyboard = []
+    row = []
+    if page > 1:
+        row.append(InlineKeyboardButton("◀ 上一页", callback_data=f"rv_{token}_{page - 1}"))
+    row.append(InlineKeyboardButton(f"第 {page} 页", callback_data="noop"))
+    if has_next:
+        row.append(InlineKeyboardButton("下一页 ▶", callback_data=f"rv_{token}_{page + 1}"))
+    if len(row) > 1:
+        keyboard.append(row)
+    if len(view.index) > 1:
+        current = view.selection
+        resolutions = view.index.facet_counts("resolution")
+        if len(resolutions) > 1 or current["resolution"]:
+            row = [InlineKeyboardButton("全部" + (" ✓" if not current["resolution"] else ""), callback_data=f"rx_{token}_r_")]
+            for value, count in resolutions[:4]:
+                mark = " ✓" if value == current["resolution"] else ""
+                row.append(InlineKeyboardButton(f"{value}({count}){mark}", callback_data=f"rx_{token}_r_{value}"))
+            keyboard.append(row)
+        row = []
+        for sort, label in (("", "默认"), ("size", "体积↑"), ("size_desc", "体积↓"), ("group", "发布组")):
+            mark = " ✓" if (current["sort"] or "") == sort else ""
+            row.append(InlineKeyboardButton(label + mark, callback_data=f"rx_{token}_s_{sort}"))
+        keyboard.append(row)
+    return InlineKeyboardMarkup(keyboard) if keyboard else None
+
+
+def open_resource_view(title, res_list):
+    """保存完整资源列表并渲染第一页，返回 (文本, 翻页键盘)"""
+    token, view = resource_views.add(title, res_list)
+    text, page, has_next = view.render(1)
+    return text, build_resource_view_keyboard(token, view, page, has_next)
+
+
+def format_key_state(state):
+    if not state:
+        return "⚪ 未使用"
+    if state["cooldown_left"] > 0:
+        head = f"🧊 冷却中 {state['cooldown_left']}s"
+    elif state["error_rate"] >= 50:
+        head = "🟠 异常"
+    else:
+        head = "🟢 正常"
+    return (
+        f"{head} | 429(10分钟): {state['recent_429']} | 错误率: {state['error_rate']}% | "
+        f"延迟: {state['latency_ms']}ms | 请求: {state['requests']} | 进行中: {state['inflight']}"
+    )
+
+
+def format_top_consumers(rows):
+    if not rows:
+        return "暂无"
+    return "\n".join(
+        f"`{r['id']}` RES `{r['res']}` / META `{r['meta']}`" + (f" (被限流 `{r['denied']}`)" if r["denied"] else "")
+        for r in rows
+    )
+
+
+def build_admin_panel_text(whitelist_rows, key_rows, key_states=None, top_users=None, top_chats=None):
     auth_list_text = "\n".join([f"ID: `{r[0]}` (由 {r[1]} 添加于 {r[2][:10]})" for r in whitelist_rows])
     if not auth_list_text:
         auth_list_text = "空白"
 
-    keys_list_text = "\n".join([f"AppID: `{r[0]}` (添加于 {r[1][:10]})" for r in key_rows])
+    states = {s["app_id"]: s for s in (key_states or [])}
+    keys_list_text = "\n".join(
+        [f"AppID: `{r[0]}` (添加于 {r[1][:10]})\n  {escape_md(format_key_state(states.get(r[0])))}" for r in key_rows]
+    )
     if not keys_list_text:
         keys_list_text = "无可用接口！请从.env或命令添加。"
 
@@ -194,6 +393,8 @@ def build_admin_panel_text(whitelist_rows, key_rows):
         "🛡️ *机器人管理中心*\n\n"
         f"👥 *当前白名单（{len(whitelist_rows)}）：*\n{auth_list_text}\n\n"
         f"🔑 *当前接口池（{len(key_rows)}）*:\n{keys_list_text}\n\n"
+        f"🔥 *消耗最多的用户：*\n{format_top_consumers(top_users)}\n\n"
+        f"🔥 *消耗最多的群组：*\n{format_top_consumers(top_chats)}\n\n"
         "---\n"
         "如需添加/删除白名单，请使用:\n"
         "`/auth add <TelegramID>`\n"
@@ -219,22 +420,64 @@ def build_admin_panel_markup():
 async def metrics_reporter(application: Application):
     while True:
         await asyncio.sleep(max(10, METRICS_LOG_INTERVAL))
-        metrics = api_client.get_metrics_snapshot(reset=True)
-        logger.info(
-            "metrics interval=%ss total=%s meta=%s res=%s user=%s hit=%s miss=%s avg_ms=%s http429=%s http_err=%s req_err=%s cache=%s",
-            METRICS_LOG_INTERVAL,
-            metrics["requests_total"],
-            metrics["requests_meta"],
-            metrics["requests_res"],
-            metrics["requests_user"],
-            metrics["meta_cache_hit"],
-            metrics["meta_cache_miss"],
-            metrics["latency_ms_avg"],
-            metrics["http_429"],
-            metrics["http_errors"],
-            metrics["request_errors"],
-            metrics["meta_cache_size"],
-        )
+        try:
+            log_metrics(collect_metrics(reset=True))
+        except Exception as e:
+            logger.error("指标汇总失败: %s", e)
+
+
+def log_metrics(metrics):
+    logger.info(
+        "metrics interval=%ss total=%s meta=%s res=%s user=%s hit=%s miss=%s coalesced=%s res_hit=%s res_miss=%s upstream=%s retries=%s hedges=%s/%s avg_ms=%s http429=%s http_err=%s req_err=%s cache=%s",
+        METRICS_LOG_INTERVAL,
+        metrics["requests_total"],
+        metrics["requests_meta"],
+        metrics["requests_res"],
+        metrics["requests_user"],
+        metrics["meta_cache_hit"],
+        metrics["meta_cache_miss"],
+        metrics["coalesced_waiters"],
+        metrics["res_cache_hit"],
+        metrics["res_cache_miss"],
+        metrics["upstream_calls"],
+        metrics["retries"],
+        metrics["hedges_sent"],
+        metrics["hedges_won"],
+        metrics["latency_ms_avg"],
+        metrics["http_429"],
+        metrics["http_errors"],
+        metrics["request_errors"],
+        metrics["meta_cache_size"],
+    )
+
+
+def format_latency_text(percentiles):
+    if not percentiles:
+        return "暂无数据"
+    return "\n".join(
+        f"`{family}`: p50 `{p['p50']}` / p95 `{p['p95']}` / p99 `{p['p99']}` ms (n={p['count']})"
+        for family, p in percentiles.items()
+    )
+
+
+def format_gate_classes_text(metrics):
+    return "\n".join(
+        f"`{name}`: `{metrics.get(f'gate_{name}_queue', 0)}` / `{metrics.get(f'gate_{name}_wait_ms_avg', 0)}`"
+        f" / `{metrics.get(f'gate_{name}_expired', 0)}`"
+        for name in GATE_PRIORITIES
+    )
+
+
+def collect_metrics(reset=False):
+    metrics = api_client.get_metrics_snapshot(reset=reset)
+    metrics.update(prefetcher.stats())
+    metrics.update(inline_searches.stats())
+    metrics.update(outbound.stats())
+    metrics.update(update_processor.stats())
+    metrics.update(search_sessions.stats())
+    metrics.update(resource_views.stats())
+    metrics.update(action_limits.stats())
+    return metrics
 
 
 def format_metrics_text(metrics):
@@ -243,24 +486,91 @@ def format_metrics_text(metrics):
         f"总请求: `{metrics['requests_total']}`\n"
         f"META/RES/USER: `{metrics['requests_meta']}` / `{metrics['requests_res']}` / `{metrics['requests_user']}`\n"
         f"META缓存 命中/未命中: `{metrics['meta_cache_hit']}` / `{metrics['meta_cache_miss']}`\n"
+        f"合并请求(节省上游): `{metrics['coalesced_waiters']}`\n"
+        f"RES缓存 命中/未命中: `{metrics['res_cache_hit']}` / `{metrics['res_cache_miss']}`\n"
+        f"负缓存命中(空结果/404): `{metrics['negative_cache_hit']}` (大小 `{metrics['negative_cache_size']}`)\n"
+        f"节省配额(次): `{metrics['quota_saved']}`\n"
+        f"上游调用: `{metrics['upstream_calls']}`\n"
+        f"DNS缓存 命中/解析(累计): `{metrics.get('dns_cache_hit', 0)}` / `{metrics.get('dns_cache_miss', 0)}`\n"
+        f"重试次数: `{metrics['retries']}`\n"
+        f"对冲请求 发出/胜出: `{metrics['hedges_sent']}` / `{metrics['hedges_won']}`\n"
+        f"预取 请求/命中/命中率: `{metrics['prefetch_requests']}` / `{metrics['prefetch_hits']}` / `{metrics['prefetch_hit_rate']}%`"
+        f" (队列 `{metrics.get('prefetch_queue', 0)}`, 丢弃 `{metrics.get('prefetch_dropped', 0) + metrics.get('prefetch_expired', 0)}`)\n"
+        f"本地索引 命中/未命中/命中率: `{metrics['local_search_hit']}` / `{metrics['local_search_miss']}` / `{metrics['local_search_hit_rate']}%`"
+        f" (条目 `{metrics.get('search_index_entries', 0)}`, `{round(metrics.get('search_index_bytes', 0) / 1024, 1)}` KB,"
+        f" 写入均耗时 `{metrics.get('search_index_write_ms_avg', 0)}` ms)\n"
+        f"行内查询 总数/被取代/已取消/前缀复用: `{metrics.get('inline_queries', 0)}` / `{metrics.get('inline_superseded', 0)}`"
+        f" / `{metrics.get('inline_cancelled', 0)}` / `{metrics.get('inline_prefix_hits', 0)}`"
+        f" (中止上游 `{metrics.get('flights_abandoned', 0)}`)\n"
+        f"TG出站 已发送/排队/等待均值/p95(ms): `{metrics.get('tg_sent', 0)}` / `{metrics.get('tg_queue_depth', 0)}`"
+        f" / `{metrics.get('tg_wait_ms_avg', 0)}` / `{metrics.get('tg_wait_ms_p95', 0)}`"
+        f" (限流等待 `{metrics.get('tg_flood_waits', 0)}`, 失败 `{metrics.get('tg_failed', 0)}`)\n"
+        f"搜索会话 活跃/过期/淘汰: `{metrics.get('sessions_active', 0)}` / `{metrics.get('sessions_expired', 0)}`"
+        f" / `{metrics.get('sessions_evicted', 0)}`，会话页命中率: `{metrics.get('session_page_hit_rate', 0)}%`\n"
+        f"更新处理 已完成/处理中/积压/排队会话: `{metrics.get('updates_processed', 0)}` / `{metrics.get('updates_active', 0)}`"
+        f" / `{metrics.get('updates_backlog', 0)}` / `{metrics.get('updates_queued_chats', 0)}`\n"
+        f"上游闸门 进行中/等待/等待会话/等待均值(ms): `{metrics.get('gate_active', 0)}` / `{metrics.get('gate_waiting', 0)}`"
+        f" / `{metrics.get('gate_waiting_tenants', 0)}` / `{metrics.get('gate_wait_ms_avg', 0)}`\n"
+        f"分级队列 排队/等待均值(ms)/超时丢弃:\n{format_gate_classes_text(metrics)}\n"
+        f"动作限流 META 放行/拒绝: `{metrics.get('limit_meta_allowed', 0)}` / `{metrics.get('limit_meta_denied', 0)}`，"
+        f"RES 放行/拒绝: `{metrics.get('limit_res_allowed', 0)}` / `{metrics.get('limit_res_denied', 0)}`\n"
         f"HTTP 429: `{metrics['http_429']}`\n"
         f"HTTP错误: `{metrics['http_errors']}`\n"
         f"请求异常: `{metrics['request_errors']}`\n"
         f"平均延迟(ms): `{metrics['latency_ms_avg']}`\n"
-        f"META缓存大小: `{metrics['meta_cache_size']}`"
+        f"分接口延迟(累计):\n{format_latency_text(metrics.get('latency_percentiles'))}\n"
+        f"META缓存大小: `{metrics['meta_cache_size']}` (`{round(metrics['meta_cache_bytes'] / 1024, 1)}` KB, 淘汰 `{metrics['meta_cache_evictions']}`)\n"
+        f"RES缓存大小: `{metrics['res_cache_size']}`"
     )
 
 
-def load_admin_rows():
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        c.execute("SELECT chat_id, added_by, add_time FROM whitelist")
-        whitelist_rows = c.fetchall()
-        c.execute("SELECT app_id, add_time FROM api_keys")
-        key_rows = c.fetchall()
+def quota_field(value):
+    # An empty code span breaks Markdown, so unknown values are spelled out.
+    return "未知" if value is None or value == "" else escape_md(str(value))
+
+
+def format_quota_text(snapshot):
+    lines = [f"📊 *接口池配额信息（{len(snapshot)} 个 Key）*\n"]
+    known = [e["remaining"] for e in snapshot if isinstance(e["remaining"], int)]
+    for e in snapshot:
+        if e["error"]:
+            status = f"⚠️ {e['error']}"
+        elif e["exhausted"]:
+            status = "⛔ 已耗尽"
+        else:
+            status = "✅ 可用"
+        lines.append(
+            f"AppID: `{e['app_id']}` {escape_md(status)}\n"
+            f"  套餐: `{quota_field(e['plan'])}` | 剩余/总配额: `{quota_field(e['remaining'])}` / `{quota_field(e['total'])}`"
+        )
+    if known:
+        lines.append(f"\n合计剩余: `{sum(known)}`")
+    return "\n".join(lines)
+
+
+async def load_admin_rows():
+    whitelist_rows = await db.list_whitelist()
+    key_rows = await db.list_api_key_rows()
     return whitelist_rows, key_rows
 
 
+async def render_local_preview(msg_obj, token, query, media_filter, note):
+    """用本地索引即时渲染一屏结果；索引无命中时返回空列表且不修改消息"""
+    items = await api_client.search_local(
+        query, limit=SEARCH_VIEW_SIZE, media_type=None if media_filter == "all" else media_filter
+    )
+    if items:
+        try:
+            await msg_obj.edit_text(
+                f"⚡ `{escape_md(query)}` 的本地索引结果（{note}）",
+                parse_mode=ParseMode.MARKDOWN,
+                reply_markup=build_search_keyboard(items, token, 1, media_filter),
+            )
+        except Exception as e:
+            logger.debug("本地预览消息更新失败: %s", e)
+    return items
+
+
 async def render_search_page(msg_obj, token, page):
     session = get_search_session(token)
     if not session:
@@ -270,13 +580,23 @@ async def render_search_page(msg_obj, token, page):
     page = max(1, int(page))
     query = session["query"]
     media_filter = session.get("filter", "all")
-    data = await api_client.search(query, page=page)
-    if not data or not isinstance(data, dict):
-        await msg_obj.edit_text("❌ 搜索请求失败。")
+    upstream = asyncio.ensure_future(collect_view_items(session, media_filter, page))
+    preview = []
+    if page == 1 and session.get("source") != "list":
+        # Slow upstream: show what the local index already knows, then replace it below.
+        done, _ = await asyncio.wait({upstream}, timeout=LOCAL_PREVIEW_DELAY)
+        if not done:
+            preview = await render_local_preview(msg_obj, token, query, media_filter, "正在从上游刷新…")
+    filtered, last_page, ok = await upstream
+    # Cursors and the list title were updated across awaits; queue them for the next write-behind flush.
+    search_sessions.save(token)
+    if not ok and page == 1:
+        if preview:
+            await render_local_preview(msg_obj, token, query, media_filter, "上游暂不可用")
+            return
+        await msg_obj.edit_text("❌ 搜索请求失败。" if session.get("source") != "list" else "❌ 片单获取失败或为空。")
         return
 
-    results = data.get("items", [])
-    filtered = filter_results(results, media_filter)
     if not filtered:
         await msg_obj.edit_text(
             f"📭 第 {page} 页暂无 `{media_filter}` 结果。",
@@ -286,11 +606,27 @@ async def render_search_page(msg_obj, token, page):
         return
 
     reply_markup = build_search_keyboard(filtered, token, page, media_filter)
-    await msg_obj.edit_text(
-        f"🔍 `{escape_md(query)}` 的搜索结果（筛选: `{media_filter}`）",
-        parse_mode=ParseMode.MARKDOWN,
-        reply_markup=reply_markup,
-    )
+    if session.get("source") == "list":
+        title = f"📋 片单 `{escape_md(session.get('title') or query)}`（筛选: `{media_filter}`）"
+    else:
+        title = f"🔍 `{escape_md(query)}` 的搜索结果（筛选: `{media_filter}`）"
+    await msg_obj.edit_text(title, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
+    if session.get("source") != "list":
+        prefetcher.schedule_search_page(query, last_page, filtered)
+
+async def check_action_limit(update: Update, kind):
+    """按用户/会话令牌桶检查 META/RES 动作；超限时提示等待时间并返回 False"""
+    chat = update.effective_chat
+    wait = action_limits.acquire(kind, update.effective_user.id, chat.id if chat else None)
+    if not wait:
+        return True
+    text = f"⏳ 操作过于频繁，请 {math.ceil(wait)} 秒后再试。"
+    if update.callback_query:
+        await update.callback_query.answer(text, show_alert=True)
+    else:
+        await update.message.reply_text(text)
+    return False
+
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
@@ -304,7 +640,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "🔍 *基础搜索*\n"
         "`/s <关键字>` - 搜索影视\n"
         "`/sid <对应类型> <id>` - 按 TMDB ID 查询详情 (类型默认 movie)\n"
-        "`/quota` - 查询当前账号配额\n"
+        "`/list <片单id>` - 浏览片单（可按类型筛选翻页）\n"
+        "`/quota` - 查询接口池全部账号配额\n"
         "`/tvmag <tmdbid> <季号> [集号]` - 获取剧集磁力（季包或单集）\n"
         "支持类型: `movie`, `tv`, `person`, `collection`.\n\n"
         "*(当前已支持影视查询、115/磁力资源、配额查询及 TV 分季分集磁力)*"
@@ -316,8 +653,14 @@ async def check_api(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⛔ 只有管理员可以使用此命令。")
         return
         
-    whitelist_rows, key_rows = load_admin_rows()
-    text = build_admin_panel_text(whitelist_rows, key_rows)
+    whitelist_rows, key_rows = await load_admin_rows()
+    text = build_admin_panel_text(
+        whitelist_rows,
+        key_rows,
+        api_client.get_credential_states(),
+        action_limits.top_consumers("user"),
+        action_limits.top_consumers("chat"),
+    )
     await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=build_admin_panel_markup())
 
 async def key_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -332,25 +675,19 @@ async def key_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     action = args[0]
     app_id = args[1]
     
-    with get_db_connection() as conn:
-        c = conn.cursor()
-    
-        if action == "add":
-            if len(args) < 3:
-                await update.message.reply_text("⚠️ 缺少 API Key。\n添加: `/key add <AppID> <APIKey>`", parse_mode=ParseMode.MARKDOWN)
-                return
-            api_key = args[2]
-            c.execute("INSERT OR REPLACE INTO api_keys (app_id, api_key) VALUES (?, ?)", (app_id, api_key))
-            await update.message.reply_text(f"✅ 已将 AppID `{app_id}` 添加入接口轮询池！", parse_mode=ParseMode.MARKDOWN)
-
-        elif action == "del":
-            c.execute("DELETE FROM api_keys WHERE app_id = ?", (app_id,))
-            if c.rowcount > 0:
-                await update.message.reply_text(f"🗑️ 已将 AppID `{app_id}` 从接口池移除。", parse_mode=ParseMode.MARKDOWN)
-            else:
-                await update.message.reply_text(f"⚠️ 接口池中未找到 AppID `{app_id}`。", parse_mode=ParseMode.MARKDOWN)
+    if action == "add":
+        if len(args) < 3:
+            await update.message.reply_text("⚠️ 缺少 API Key。\n添加: `/key add <AppID> <APIKey>`", parse_mode=ParseMode.MARKDOWN)
+            return
+        api_key = args[2]
+        await db.upsert_api_key(app_id, api_key)
+        await update.message.reply_text(f"✅ 已将 AppID `{app_id}` 添加入接口轮询池！", parse_mode=ParseMode.MARKDOWN)
 
-    api_client.invalidate_credentials_cache()
+    elif action == "del":
+        if await db.remove_api_key(app_id) > 0:
+            await update.message.reply_text(f"🗑️ 已将 AppID `{app_id}` 从接口池移除。", parse_mode=ParseMode.MARKDOWN)
+        else:
+            await update.message.reply_text(f"⚠️ 接口池中未找到 AppID `{app_id}`。", parse_mode=ParseMode.MARKDOWN)
 
 async def auth_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if str(update.effective_user.id) != str(ADMIN_ID):
@@ -364,49 +701,34 @@ async def auth_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     action = args[0]
     target_id = args[1]
     
-    with get_db_connection() as conn:
-        c = conn.cursor()
-
-        if action == "add":
-            c.execute("INSERT OR IGNORE INTO whitelist (chat_id, added_by) VALUES (?, ?)", (str(target_id), str(update.effective_user.id)))
-            await update.message.reply_text(f"✅ 已将 `{target_id}` 添加入授权白名单！\n如果这是一个群组，机器人现在可以在贴内回复请求了。", parse_mode=ParseMode.MARKDOWN)
-        elif action == "del":
-            if str(target_id) == str(ADMIN_ID):
-                await update.message.reply_text("⚠️ 无法移除最高管理员！")
-            else:
-                c.execute("DELETE FROM whitelist WHERE chat_id = ?", (str(target_id),))
-                await update.message.reply_text(f"🗑️ 已将 `{target_id}` 从白名单中移除。", parse_mode=ParseMode.MARKDOWN)
-
-    refresh_auth_cache(force=True)
+    if action == "add":
+        await db.add_whitelist(str(target_id), str(update.effective_user.id))
+        await update.message.reply_text(f"✅ 已将 `{target_id}` 添加入授权白名单！\n如果这是一个群组，机器人现在可以在贴内回复请求了。", parse_mode=ParseMode.MARKDOWN)
+    elif action == "del":
+        if str(target_id) == str(ADMIN_ID):
+            await update.message.reply_text("⚠️ 无法移除最高管理员！")
+        else:
+            await db.remove_whitelist(str(target_id))
+            await update.message.reply_text(f"🗑️ 已将 `{target_id}` 从白名单中移除。", parse_mode=ParseMode.MARKDOWN)
 
 
 async def quota_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = str(update.effective_chat.id)
-    if not is_authorized(chat_id):
+    if not await is_authorized(chat_id):
         await update.message.reply_text("⛔ 未经授权。")
         return
 
-    msg = await update.message.reply_text("📊 正在查询当前账号配额...")
-    data = await api_client.get_user_info()
-    if not data or not isinstance(data, dict):
+    msg = await update.message.reply_text("📊 正在查询接口池配额...")
+    snapshot = await api_client.refresh_quota_ledger()
+    if not snapshot:
         await msg.edit_text("❌ 查询失败，请稍后重试。")
         return
-
-    plan = data.get("plan") or data.get("subscription") or "未知"
-    total = data.get("limit") or data.get("total") or data.get("quota_total") or "未知"
-    remain = data.get("remaining") or data.get("left") or data.get("quota_left") or "未知"
-    await msg.edit_text(
-        f"📊 *账号配额信息*\n\n"
-        f"套餐: `{escape_md(plan)}`\n"
-        f"总配额: `{escape_md(total)}`\n"
-        f"剩余: `{escape_md(remain)}`",
-        parse_mode=ParseMode.MARKDOWN,
-    )
+    await msg.edit_text(format_quota_text(snapshot), parse_mode=ParseMode.MARKDOWN)
 
 
 async def tvmag_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = str(update.effective_chat.id)
-    if not is_authorized(chat_id):
+    if not await is_authorized(chat_id):
         await update.message.reply_text("⛔ 未经授权。")
         return
 
@@ -424,12 +746,15 @@ async def tvmag_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ tmdbid/季号/集号必须是数字。")
         return
 
+    if not await check_action_limit(update, "res"):
+        return
+
     msg = await update.message.reply_text("🔄 正在获取剧集磁力资源...")
     if episode_num:
-        data = await api_client.get_tv_episode_magnet(tmdbid, season_num, episode_num)
+        data = await api_client.get_tv_episode_magnet(tmdbid, season_num, episode_num, tenant=chat_id)
         title_hint = f"S{int(season_num):02d}E{int(episode_num):02d}"
     else:
-        data = await api_client.get_tv_season_magnet(tmdbid, season_num)
+        data = await api_client.get_tv_season_magnet(tmdbid, season_num, tenant=chat_id)
         title_hint = f"Season {int(season_num):02d}"
 
     if not data or not isinstance(data, dict):
@@ -441,17 +766,8 @@ async def tvmag_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await msg.edit_text("📭 暂无可用磁力资源。")
         return
 
-    text_blocks = []
-    for item in res_list[:10]:
-        file_name = escape_md(item.get('name') or item.get('title', '未命名文件'))
-        size = escape_md(str(item.get('size', '未知大小')))
-        link = item.get('magnet') or item.get('url') or item.get('link') or ''
-        text_blocks.append(f"📄 *{file_name}*\n大小: {size}\n`{link}`\n")
-
-    final_text = f"✅ *{escape_md(title_hint)} 磁力资源 ({len(res_list)}条)*\n\n" + "\n".join(text_blocks)
-    if len(final_text) > 4000:
-        final_text = final_text[:4000] + "...\n(截断)"
-    await msg.edit_text(final_text, parse_mode=ParseMode.MARKDOWN)
+    text, reply_markup = open_resource_view(f"{title_hint} 磁力资源", res_list)
+    await msg.edit_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
 
 
 async def metrics_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -459,7 +775,7 @@ async def metrics_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⛔ 只有管理员可以使用此命令。")
         return
 
-    metrics = api_client.get_metrics_snapshot(reset=False)
+    metrics = collect_metrics()
     text = format_metrics_text(metrics)
     await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
 
@@ -467,7 +783,7 @@ async def metrics_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def search_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理 /s 命令"""
     chat_id = str(update.effective_chat.id)
-    if not is_authorized(chat_id):
+    if not await is_authorized(chat_id):
         await update.message.reply_text("⛔ 该群组或用户未被授权使用此机器人。")
         return
 
@@ -476,16 +792,39 @@ async def search_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ 请提供搜索关键字，例如: `/s 蜘蛛侠`", parse_mode=ParseMode.MARKDOWN)
         return
         
+    if not await check_action_limit(update, "meta"):
+        return
+
     query = " ".join(args)
     msg = await update.message.reply_text(f"🔍 正在搜索: `{escape_md(query)}`...", parse_mode=ParseMode.MARKDOWN)
     
-    token = create_search_session(query)
+    token = create_search_session(query, chat_id=chat_id)
+    await render_search_page(msg, token, 1)
+
+async def list_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """处理 /list 命令"""
+    chat_id = str(update.effective_chat.id)
+    if not await is_authorized(chat_id):
+        await update.message.reply_text("⛔ 未经授权。")
+        return
+
+    args = context.args or []
+    if not args or not args[0].isdigit():
+        await update.message.reply_text("❌ 请提供片单 ID，例如: `/list 12345`", parse_mode=ParseMode.MARKDOWN)
+        return
+
+    if not await check_action_limit(update, "meta"):
+        return
+
+    listid = args[0]
+    msg = await update.message.reply_text(f"📋 正在获取片单: `{listid}`...", parse_mode=ParseMode.MARKDOWN)
+    token = create_search_session(listid, source="list", chat_id=chat_id)
     await render_search_page(msg, token, 1)
 
 async def sid_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理 /sid 命令"""
     chat_id = str(update.effective_chat.id)
-    if not is_authorized(chat_id):
+    if not await is_authorized(chat_id):
         await update.message.reply_text("⛔ 未经授权。")
         return
 
@@ -504,6 +843,9 @@ async def sid_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ TMDB ID 必须是数字。")
         return
 
+    if not await check_action_limit(update, "meta"):
+        return
+
     msg = await update.message.reply_text(f"🔍 正在获取详情: `{tmdbid}`...", parse_mode=ParseMode.MARKDOWN)
     # Re-use the handler logic
     await send_detail_message(msg, tmdbid, media_type)
@@ -511,9 +853,18 @@ async def sid_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def inline_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理按钮回调响应"""
     query = update.callback_query
-    await query.answer()
-    
     data = query.data
+    # Checked before answering: a denied press is answered with the wait time instead.
+    if data.startswith(RES_CALLBACKS) and not await check_action_limit(update, "res"):
+        return
+    if (
+        data.startswith(META_CALLBACKS)
+        and not search_callback_is_local(data)
+        and not await check_action_limit(update, "meta")
+    ):
+        return
+    await query.answer()
+
     if data == "noop":
         return
 
@@ -521,30 +872,50 @@ async def inline_callback_handler(update: Update, context: ContextTypes.DEFAULT_
         if str(update.effective_user.id) != str(ADMIN_ID):
             return
         if data == "admin_refresh":
-            whitelist_rows, key_rows = load_admin_rows()
-            text = build_admin_panel_text(whitelist_rows, key_rows)
+            whitelist_rows, key_rows = await load_admin_rows()
+            text = build_admin_panel_text(
+                whitelist_rows,
+                key_rows,
+                api_client.get_credential_states(),
+                action_limits.top_consumers("user"),
+                action_limits.top_consumers("chat"),
+            )
             await query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=build_admin_panel_markup())
             return
         if data == "admin_metrics":
-            metrics = api_client.get_metrics_snapshot(reset=False)
+            metrics = collect_metrics()
             await query.edit_message_text(format_metrics_text(metrics), parse_mode=ParseMode.MARKDOWN)
             return
         if data == "admin_quota":
-            res = await api_client.get_user_info()
-            if not res or not isinstance(res, dict):
+            snapshot = await api_client.refresh_quota_ledger()
+            if not snapshot:
                 await query.edit_message_text("❌ 查询失败，请稍后重试。")
                 return
-            plan = res.get("plan") or res.get("subscription") or "未知"
-            total = res.get("limit") or res.get("total") or res.get("quota_total") or "未知"
-            remain = res.get("remaining") or res.get("left") or res.get("quota_left") or "未知"
-            text = (
-                f"📊 *账号配额信息*\n\n"
-                f"套餐: `{escape_md(plan)}`\n"
-                f"总配额: `{escape_md(total)}`\n"
-                f"剩余: `{escape_md(remain)}`"
-            )
-            await query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN)
+            await query.edit_message_text(format_quota_text(snapshot), parse_mode=ParseMode.MARKDOWN)
+            return
+
+    if data.startswith(("rv_", "rx_")):
+        # Resource pages, filters and sorts come from the stored result set: no upstream call, no quota.
+        _, token, arg = data.split("_", 2)
+        view = resource_views.get(token)
+        if view is None:
+            # Expired (or lost in a restart): keep the page on screen, drop the dead buttons.
+            await query.edit_message_reply_markup(reply_markup=None)
             return
+        page = 1
+        if data.startswith("rv_"):
+            page = int(arg)
+        else:
+            kind, _, value = arg.partition("_")
+            if kind == "r":
+                view.select(resolution=value, sort=view.selection["sort"])
+            elif kind == "s" and (not value or value in RESOURCE_SORTS):
+                view.select(resolution=view.selection["resolution"], sort=value)
+        text, page, has_next = view.render(page)
+        await query.edit_message_text(
+            text, parse_mode=ParseMode.MARKDOWN, reply_markup=build_resource_view_keyboard(token, view, page, has_next)
+        )
+        return
 
     if data.startswith("sp_"):
         _, token, page = data.split("_", 2)
@@ -601,26 +972,25 @@ async def inline_callback_handler(update: Update, context: ContextTypes.DEFAULT_
 
 async def send_detail_message(msg_obj, tmdbid, media_type):
     """提取详情的公共函数"""
+    tenant = str(msg_obj.chat_id)
     data = None
     if media_type == 'movie':
-        data = await api_client.get_movie_info(tmdbid)
+        data = await api_client.get_movie_info(tmdbid, tenant=tenant)
     elif media_type == 'tv':
-        data = await api_client.get_tv_info(tmdbid)
+        data = await api_client.get_tv_info(tmdbid, tenant=tenant)
     elif media_type == 'person':
-        data = await api_client.get_person_info(tmdbid)
+        data = await api_client.get_person_info(tmdbid, tenant=tenant)
     elif media_type == 'collection':
-        data = await api_client.get_collection_info(tmdbid)
+        data = await api_client.get_collection_info(tmdbid, tenant=tenant)
         
-    if not data or not isinstance(data, dict):
+    if not isinstance(data, MediaItem):
         await msg_obj.edit_text("❌ 获取详情失败，条目可能不存在。")
         return
         
-    title = escape_md(data.get('name') or data.get('title', '未知'))
-    desc = escape_md(data.get('overview', '无简介信息')[:300] + ('...' if len(data.get('overview', '')) > 300 else ''))
-    rating = data.get('vote') or data.get('vote_average', 0)
-    poster = data.get('poster') or data.get('poster_path', '')
-    if poster and not poster.startswith('http'):
-        poster = f"https://image.tmdb.org/t/p/w500{poster}"
+    title = escape_md(data.name)
+    desc = escape_md(data.short_overview(300) or '无简介信息')
+    rating = data.vote
+    poster = data.poster_url("w500")
     
     text = (
         f"🎬 *{title}*\n"
@@ -646,15 +1016,16 @@ async def send_detail_message(msg_obj, tmdbid, media_type):
 
 async def send_res_message(msg_obj, tmdbid, media_type, res_type):
     """获取具体资源的公共函数"""
+    tenant = str(msg_obj.chat_id)
     data = None
     if media_type == 'movie':
         if res_type == '115':
-            data = await api_client.get_movie_115(tmdbid)
+            data = await api_client.get_movie_115(tmdbid, tenant=tenant)
         elif res_type == 'magnet':
-            data = await api_client.get_movie_magnet(tmdbid)
+            data = await api_client.get_movie_magnet(tmdbid, tenant=tenant)
     elif media_type == 'tv':
         if res_type == '115':
-            data = await api_client.get_tv_115(tmdbid)
+            data = await api_client.get_tv_115(tmdbid, tenant=tenant)
         elif res_type == 'magnet':
             await msg_obj.reply_text(
                 f"ℹ️ 剧集磁力需要指定季/集。\n请使用命令: `/tvmag {tmdbid} <季号> [集号]`",
@@ -672,8 +1043,8 @@ async def send_res_message(msg_obj, tmdbid, media_type, res_type):
         await msg_obj.reply_text(f"📭 服务器中目前没有关于该资源的 {res_type} 链接。")
         return
         
-    final_text = build_resource_message("获取资源成功", res_list)
-    await msg_obj.reply_text(final_text, parse_mode=ParseMode.MARKDOWN)
+    text, reply_markup = open_resource_view("获取资源成功", res_list)
+    await msg_obj.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=reply_markup)
 
 async def send_res_message_inline(update: Update, context: ContextTypes.DEFAULT_TYPE, tmdbid, media_type, res_type):
     """用于处理全局行内查询发出的消息（没有原始的机器人上文 msg_obj，需要向用户单独发送或原路编辑）"""
@@ -681,15 +1052,17 @@ async def send_res_message_inline(update: Update, context: ContextTypes.DEFAULT_
     # 但 Inline Keyboard 触发的 CallbackQuery 包含 inline_message_id，可以直接编辑那条气泡消息
     
     query = update.callback_query
+    # Inline messages have no chat; the pressing user is the tenant.
+    tenant = str(query.from_user.id)
     data = None
     if media_type == 'movie':
         if res_type == '115':
-            data = await api_client.get_movie_115(tmdbid)
+            data = await api_client.get_movie_115(tmdbid, tenant=tenant)
         elif res_type == 'magnet':
-            data = await api_client.get_movie_magnet(tmdbid)
+            data = await api_client.get_movie_magnet(tmdbid, tenant=tenant)
     elif media_type == 'tv':
         if res_type == '115':
-            data = await api_client.get_tv_115(tmdbid)
+            data = await api_client.get_tv_115(tmdbid, tenant=tenant)
         elif res_type == 'magnet':
             await context.bot.edit_message_text(
                 f"ℹ️ 剧集磁力需要指定季/集。\n请私聊机器人使用: /tvmag {tmdbid} <季号> [集号]",
@@ -706,47 +1079,27 @@ async def send_res_message_inline(update: Update, context: ContextTypes.DEFAULT_
         await context.bot.edit_message_text(f"📭 服务器中目前没有关于该资源的 {res_type} 链接。", inline_message_id=query.inline_message_id)
         return
         
-    final_text = build_resource_message("获取资源成功", res_list)
-        
+    text, reply_markup = open_resource_view("获取资源成功", res_list)
     await context.bot.edit_message_text(
-        final_text, 
-        inline_message_id=query.inline_message_id, 
-        parse_mode=ParseMode.MARKDOWN
+        text,
+        inline_message_id=query.inline_message_id,
+        parse_mode=ParseMode.MARKDOWN,
+        reply_markup=reply_markup,
     )
 
-async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """处理 @botname <关键字> 形式的全局行内查询"""
-    user_id = str(update.effective_user.id)
-    if not is_authorized(user_id):
-        return # Silently ignore unauthorized inline queries
-
-    query_str = update.inline_query.query.strip()
-    if not query_str:
-        return
-        
-    data = await api_client.search(query_str)
-    if not data or not isinstance(data, dict):
-        return
-        
-    results = data.get("items", [])
-    if not results:
-        return
-        
+def build_inline_results(items):
     inline_results = []
     # Maximum API results per inline response is 50, but we just take top 10 for speed
-    for i, item in enumerate(results[:10]):
-        title = escape_md(item.get('name') or item.get('title') or '未知')
-        tmdbid = item.get('tmdbid', '')
-        date = item.get('release_date', '')
-        year = date[:4] if date else "未知年份"
-        media_type = item.get('media_type', 'movie')
-        overview = item.get('overview', '无简介信息')[:150]
-        poster = item.get('poster') or item.get('poster_path', '')
-        if poster and not poster.startswith('http'):
-            poster = f"https://image.tmdb.org/t/p/w200{poster}"
+    for item in items[:10]:
+        title = escape_md(item.name)
+        tmdbid = item.tmdbid
+        year = item.year
+        media_type = item.media_type
+        overview = item.overview[:150] or '无简介信息'
+        poster = item.poster_url("w200")
             
-        desc = escape_md(overview + ('...' if len(item.get('overview', '')) > 150 else ''))
-        rating = item.get('vote') or item.get('vote_average', 0)
+        desc = escape_md(item.short_overview(150) or '无简介信息')
+        rating = item.vote
         
         text = (
             f"🎬 *{title}* ({escape_md(year)})\n"
@@ -763,7 +1116,7 @@ async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         inline_results.append(
             InlineQueryResultArticle(
                 id=str(tmdbid),
-                title=f"{item.get('name') or item.get('title') or '未知'} ({year})",
+                title=f"{item.name} ({year})",
                 description=overview[:50],
                 thumbnail_url=poster if poster else None,
                 input_message_content=InputTextMessageContent(
@@ -773,9 +1126,68 @@ async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYP
                 reply_markup=InlineKeyboardMarkup(keyboard)
             )
         )
-        
+    return inline_results
+
+
+async def wait_inline_search(task):
+    """等待行内查询的上游搜索；被更新的按键取代（取消）时返回 None"""
+    await asyncio.wait({task})
+    if task.cancelled():
+        return None
+    data = task.result()
+    return data.items if isinstance(data, SearchPage) else []
+
+
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """处理 @botname <关键字> 形式的全局行内查询"""
+    user_id = str(update.effective_user.id)
+    if not await is_authorized(user_id):
+        return # Silently ignore unauthorized inline queries
+
+    query_str = update.inline_query.query.strip()
+    if not query_str:
+        return
+
+    # A new keystroke supersedes the user's previous query and cancels its upstream search.
+    generation = inline_searches.begin(user_id)
     inline_cache_time = int(os.getenv("INLINE_CACHE_TIME", "30"))
-    await update.inline_query.answer(inline_results, cache_time=inline_cache_time)
+    prefix_items = inline_searches.prefix_results(query_str)
+    if prefix_items:
+        # Extends a query we just answered: reply at once, the fresh search below only warms the caches.
+        await update.inline_query.answer(build_inline_results(prefix_items), cache_time=inline_cache_time)
+
+    if not await inline_searches.settle(user_id, generation):
+        return
+    upstream = asyncio.ensure_future(api_client.search(query_str, tenant=user_id, priority="inline"))
+    inline_searches.track(user_id, generation, query_str, upstream)
+    if prefix_items:
+        return
+
+    # Answer from upstream if it is quick; otherwise from the local index while upstream keeps filling caches.
+    done, _ = await asyncio.wait({upstream}, timeout=LOCAL_PREVIEW_DELAY)
+    items = []
+    if not done:
+        items = await api_client.search_local(query_str, limit=10)
+    if not items:
+        items = await wait_inline_search(upstream)
+        if items is None:
+            return
+    if not items:
+        items = await api_client.search_local(query_str, limit=10)
+    if not items or not inline_searches.is_current(user_id, generation):
+        return
+
+    await update.inline_query.answer(build_inline_results(items), cache_time=inline_cache_time)
+
+
+def webhook_supported():
+    """Webhook 依赖 python-telegram-bot[webhooks]（tornado），缺失时回退到轮询"""
+    try:
+        import tornado  # noqa: F401
+    except ImportError:
+        logger.error('已设置 TG_WEBHOOK_URL，但未安装 Webhook 依赖（pip install "python-telegram-bot[webhooks]"），回退到轮询模式')
+        return False
+    return True
 
 
 async def post_init(application: Application):
@@ -783,6 +1195,7 @@ async def post_init(application: Application):
     commands = [
         BotCommand("s", "搜索影视 例如：/s 蜘蛛侠"),
         BotCommand("sid", "ID搜索 例如：/sid tv 1234"),
+        BotCommand("list", "浏览片单 例如：/list 12345"),
         BotCommand("tvmag", "剧集磁力 /tvmag 1399 1 [2]"),
         BotCommand("quota", "查询当前账号配额"),
         BotCommand("metrics", "查看运行指标(管理员)"),
@@ -792,10 +1205,27 @@ async def post_init(application: Application):
     await application.bot.set_my_commands(commands)
     task = asyncio.create_task(metrics_reporter(application))
     application.bot_data["metrics_reporter_task"] = task
+    prefetcher.start()
+    search_sessions.start()
+    # Pre-open upstream connections in the background; failures only cost the first request its handshake.
+    application.bot_data["warmup_task"] = asyncio.create_task(api_client.warm_up())
+    if METRICS_HTTP_PORT > 0:
+        try:
+            application.bot_data["metrics_server"] = await start_metrics_server(
+                api_client.render_prometheus, METRICS_HTTP_HOST, METRICS_HTTP_PORT
+            )
+        except OSError as e:
+            logger.error("Prometheus 指标端口启动失败: %s", e)
     logger.info("Bot commands menu has been synced.")
 
 
 async def post_shutdown(application: Application):
+    await prefetcher.stop()
+    await search_sessions.stop()
+    server = application.bot_data.get("metrics_server")
+    if server:
+        server.close()
+        await server.wait_closed()
     task = application.bot_data.get("metrics_reporter_task")
     if task:
         task.cancel()
@@ -803,13 +1233,23 @@ async def post_shutdown(application: Application):
             await task
         except asyncio.CancelledError:
             pass
+    # Must run on the application's loop: the API client's background tasks live there.
+    await api_client.close()
 
 if __name__ == '__main__':
     if not BOT_TOKEN:
         logger.error("请在 .env 文件中设置 BOT_TOKEN！")
         exit(1)
         
-    app = ApplicationBuilder().token(BOT_TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
+    app = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .rate_limiter(outbound)
+        .concurrent_updates(update_processor)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("help", help_command))
     app.add_handler(CommandHandler("check_api", check_api))
@@ -818,16 +1258,29 @@ if __name__ == '__main__':
     app.add_handler(CommandHandler("key", key_cmd))
     app.add_handler(CommandHandler("s", search_cmd))
     app.add_handler(CommandHandler("sid", sid_cmd))
+    app.add_handler(CommandHandler("list", list_cmd))
     app.add_handler(CommandHandler("quota", quota_cmd))
     app.add_handler(CommandHandler("tvmag", tvmag_cmd))
     app.add_handler(CommandHandler("metrics", metrics_cmd))
-    app.add_handler(InlineQueryHandler(inline_query_handler))
+    # Non-blocking so a newer keystroke can supersede a query that is still waiting upstream.
+    app.add_handler(InlineQueryHandler(inline_query_handler, block=False))
     app.add_handler(CallbackQueryHandler(inline_callback_handler))
 
-    logger.info("Bot 已启动并开始轮询...")
     try:
-        app.run_polling(poll_interval=1.0, timeout=20)
+        if WEBHOOK_URL and webhook_supported():
+            logger.info("Bot 已启动 Webhook 模式，监听 %s:%s/%s", WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH)
+            app.run_webhook(
+                listen=WEBHOOK_LISTEN,
+                port=WEBHOOK_PORT,
+                url_path=WEBHOOK_PATH,
+                webhook_url=f"{WEBHOOK_URL}/{WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET,
+            )
+        else:
+            logger.info("Bot 已启动并开始轮询...")
+            app.run_polling(poll_interval=1.0, timeout=20)
     except Exception as e:
         logger.error(e)
     finally:
-        asyncio.run(api_client.close())
+        search_sessions.close()
+        db.close()
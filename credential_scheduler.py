@@ -0,0 +1,168 @@
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Weight of the newest sample in the error-rate / latency moving averages.
+EWMA_ALPHA = 0.2
+RECENT_429_WINDOW = 600
+
+
+class KeyHealth:
+    """单个 AppID/APIKey 的健康状态。"""
+
+    __slots__ = (
+        "app_id",
+        "api_key",
+        "recent_429",
+        "strikes",
+        "cooldown_until",
+        "requests",
+        "errors",
+        "error_rate",
+        "latency_ms",
+        "inflight",
+        "last_used",
+    )
+
+    def __init__(self, app_id: str, api_key: str):
+        self.app_id = app_id
+        self.api_key = api_key
+        self.recent_429: "deque[float]" = deque(maxlen=50)
+        self.strikes = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.error_rate = 0.0
+        self.latency_ms = 0.0
+        self.inflight = 0
+        self.last_used = 0.0
+
+    def cooling(self, now: float) -> bool:
+        return self.cooldown_until > now
+
+    def count_recent_429(self, now: float) -> int:
+        while self.recent_429 and now - self.recent_429[0] > RECENT_429_WINDOW:
+            self.recent_429.popleft()
+        return len(self.recent_429)
+
+    def score(self) -> Tuple[int, int, int]:
+        # Lower is better: spread concurrent load first, then prefer healthy and fast keys.
+        # Coarse buckets keep small jitter from breaking the round-robin between equal keys.
+        return self.inflight, int(self.error_rate * 5), int(self.latency_ms // 250)
+
+
+class CredentialScheduler:
+    """感知 429 冷却的凭证调度器：绕开被惩罚的 Key，并在健康 Key 之间公平轮转。"""
+
+    def __init__(self, cooldown_base: float = 30.0, cooldown_max: float = 600.0):
+        self.cooldown_base = cooldown_base
+        self.cooldown_max = cooldown_max
+        self._keys: List[KeyHealth] = []
+        self._cursor = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def set_credentials(self, credentials: Iterable[Tuple[str, str]]):
+        """替换凭证列表，保留已存在 AppID 的健康数据。"""
+        existing = {k.app_id: k for k in self._keys}
+        keys = []
+        for app_id, api_key in credentials:
+            state = existing.get(app_id)
+            if state is None:
+                state = KeyHealth(app_id, api_key)
+            state.api_key = api_key
+            keys.append(state)
+        self._keys = keys
+        if self._cursor >= len(keys):
+            self._cursor = 0
+
+    def acquire(
+        self,
+        app_id: Optional[str] = None,
+        skip: Optional[Callable[[KeyHealth], bool]] = None,
+        rank: Optional[Callable[[KeyHealth], Any]] = None,
+    ) -> Optional[KeyHealth]:
+        """选出一个 Key。app_id 指定固定 Key；skip 过滤（全部被过滤时忽略）；rank 作为首要排序键。"""
+        if not self._keys:
+            return None
+        now = time.time()
+        count = len(self._keys)
+        if app_id is not None:
+            pinned = next((k for k in self._keys if k.app_id == app_id), None)
+            return self._take(pinned, now) if pinned is not None else None
+
+        best: Optional[KeyHealth] = None
+        best_key: Any = None
+        best_idx = self._cursor
+        for allow_skipped in (False, True):
+            # Walk the ring starting at the cursor so equal scores rotate fairly.
+            for offset in range(count):
+                idx = (self._cursor + offset) % count
+                state = self._keys[idx]
+                if state.cooling(now) or (not allow_skipped and skip is not None and skip(state)):
+                    continue
+                key = (rank(state), state.score()) if rank is not None else state.score()
+                if best is None or key < best_key:
+                    best, best_key, best_idx = state, key, idx
+            if best is not None or skip is None:
+                break
+        if best is None:
+            # Every key is penalized: use the one whose cooldown ends first.
+            best = min(self._keys, key=lambda k: k.cooldown_until)
+            best_idx = self._keys.index(best)
+        self._cursor = (best_idx + 1) % count
+        return self._take(best, now)
+
+    @staticmethod
+    def _take(state: KeyHealth, now: float) -> KeyHealth:
+        state.inflight += 1
+        state.requests += 1
+        state.last_used = now
+        return state
+
+    def app_ids(self) -> List[str]:
+        return [k.app_id for k in self._keys]
+
+    def has_available(self) -> bool:
+        now = time.time()
+        return any(not k.cooling(now) for k in self._keys)
+
+    def abandon(self, state: KeyHealth):
+        """释放被取消请求占用的 Key，不计入健康统计。"""
+        state.inflight = max(0, state.inflight - 1)
+
+    def release(self, state: KeyHealth, status: Optional[int], latency_ms: float, retry_after: Optional[float] = None):
+        """上报一次请求结果。status 为 None 表示网络异常。"""
+        state.inflight = max(0, state.inflight - 1)
+        # 4xx other than 429 (e.g. 404) says nothing about the key itself.
+        failed = status is None or status == 429 or status >= 500
+        state.error_rate += EWMA_ALPHA * ((1.0 if failed else 0.0) - state.error_rate)
+        if status is not None:
+            state.latency_ms += EWMA_ALPHA * (latency_ms - state.latency_ms) if state.latency_ms else latency_ms
+        if failed:
+            state.errors += 1
+        if status == 429:
+            now = time.time()
+            state.recent_429.append(now)
+            state.strikes += 1
+            penalty = retry_after if retry_after else self.cooldown_base * (2 ** (state.strikes - 1))
+            state.cooldown_until = max(state.cooldown_until, now + min(self.cooldown_max, penalty))
+        elif not failed:
+            state.strikes = 0
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        return [
+            {
+                "app_id": k.app_id,
+                "cooldown_left": max(0, round(k.cooldown_until - now)),
+                "recent_429": k.count_recent_429(now),
+                "requests": k.requests,
+                "errors": k.errors,
+                "error_rate": round(k.error_rate * 100, 1),
+                "latency_ms": round(k.latency_ms, 1),
+                "inflight": k.inflight,
+            }
+            for k in self._keys
+        ]
@@ -0,0 +1,148 @@
+import asyncio
+import inspect
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar, Union
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+Listener = Callable[[], Union[None, Awaitable[None]]]
+
+
+class AsyncSQLite:
+    """持久化 SQLite 连接 + 单线程执行器：所有查询都在事件循环之外串行执行。"""
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self._timeout = timeout
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"sqlite-{path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=self._timeout, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn = conn
+        return self._conn
+
+    def _call(self, fn: Callable[..., T], args: Tuple[Any, ...]) -> T:
+        conn = self._connection()
+        try:
+            result = fn(conn, *args)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+
+    def run_sync(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run ``fn(conn, *args)`` on the DB thread and block for the result (startup only)."""
+        return self._executor.submit(self._call, fn, args).result()
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run ``fn(conn, *args)`` on the DB thread without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, fn, args)
+
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[Tuple[Any, ...]]:
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[Tuple[Any, ...]]:
+        return await self.run(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Execute a write statement and return its rowcount."""
+        return await self.run(lambda conn: conn.execute(sql, params).rowcount)
+
+    def close(self):
+        def _close(_conn):
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+        try:
+            self._executor.submit(_close, None).result()
+        finally:
+            self._executor.shutdown(wait=False)
+
+
+class AuthDB(AsyncSQLite):
+    """白名单与 API Key 池的数据访问层；写入后立即通知监听者刷新缓存。"""
+
+    def __init__(self, path: str = "auth.db"):
+        super().__init__(path)
+        self._listeners: Dict[str, List[Listener]] = {}
+
+    def add_listener(self, table: str, callback: Listener):
+        self._listeners.setdefault(table, []).append(callback)
+
+    async def _notify(self, table: str):
+        for callback in self._listeners.get(table, []):
+            try:
+                result = callback()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error("DB change listener for %s failed: %s", table, e)
+
+    def init_schema(self, admin_id: Optional[str], env_app_id: Optional[str], env_api_key: Optional[str]):
+        def _init(conn: sqlite3.Connection):
+            c = conn.cursor()
+            c.execute('''CREATE TABLE IF NOT EXISTS whitelist
+                         (chat_id TEXT PRIMARY KEY,
+                          added_by TEXT,
+                          add_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+            c.execute('''CREATE TABLE IF NOT EXISTS api_keys
+                         (app_id TEXT PRIMARY KEY,
+                          api_key TEXT,
+                          add_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+            # Ensure ADMIN is always authorized
+            if admin_id:
+                c.execute("INSERT OR IGNORE INTO whitelist (chat_id, added_by) VALUES (?, ?)", (str(admin_id), "System"))
+
+            # Seed default API key from .env if table is empty
+            c.execute("SELECT COUNT(*) FROM api_keys")
+            if c.fetchone()[0] == 0 and env_app_id and env_api_key:
+                c.execute("INSERT INTO api_keys (app_id, api_key) VALUES (?, ?)", (env_app_id, env_api_key))
+
+        self.run_sync(_init)
+
+    # --- whitelist ---
+    async def list_whitelist_ids(self) -> List[str]:
+        rows = await self.fetchall("SELECT chat_id FROM whitelist")
+        return [str(row[0]) for row in rows]
+
+    async def list_whitelist(self) -> List[Tuple[Any, ...]]:
+        return await self.fetchall("SELECT chat_id, added_by, add_time FROM whitelist")
+
+    async def add_whitelist(self, chat_id: str, added_by: str) -> int:
+        count = await self.execute("INSERT OR IGNORE INTO whitelist (chat_id, added_by) VALUES (?, ?)", (str(chat_id), str(added_by)))
+        await self._notify("whitelist")
+        return count
+
+    async def remove_whitelist(self, chat_id: str) -> int:
+        count = await self.execute("DELETE FROM whitelist WHERE chat_id = ?", (str(chat_id),))
+        await self._notify("whitelist")
+        return count
+
+    # --- api_keys ---
+    async def list_api_keys(self) -> List[Tuple[str, str]]:
+        return await self.fetchall("SELECT app_id, api_key FROM api_keys")
+
+    async def list_api_key_rows(self) -> List[Tuple[Any, ...]]:
+        return await self.fetchall("SELECT app_id, add_time FROM api_keys")
+
+    async def upsert_api_key(self, app_id: str, api_key: str) -> int:
+        count = await self.execute("INSERT OR REPLACE INTO api_keys (app_id, api_key) VALUES (?, ?)", (app_id, api_key))
+        await self._notify("api_keys")
+        return count
+
+    async def remove_api_key(self, app_id: str) -> int:
+        count = await self.execute("DELETE FROM api_keys WHERE app_id = ?", (app_id,))
+        await self._notify("api_keys")
+        return count
@@ -0,0 +1,213 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Hashable, List, Optional
+
+# Highest first: a freed slot goes to the first class with waiters, round-robin between tenants within it.
+PRIORITIES = ("interactive", "inline", "admin", "background")
+PRIORITY_ALIASES = {"prefetch": "background"}
+DEFAULT_PRIORITY = "interactive"
+# Requests that name no tenant (background refreshes, quota probes) share one queue.
+DEFAULT_TENANT = ""
+_RANK = {name: rank for rank, name in enumerate(PRIORITIES)}
+
+
+class DeadlineExceeded(Exception):
+    """请求在闸门前排队超过截止时间，已被丢弃而不再发送。"""
+
+
+def normalize_priority(priority: Optional[str]) -> str:
+    if not priority:
+        return DEFAULT_PRIORITY
+    priority = PRIORITY_ALIASES.get(priority, priority)
+    if priority not in _RANK:
+        raise ValueError(f"unknown priority: {priority}")
+    return priority
+
+
+def _later(a: Optional[float], b: Optional[float]) -> Optional[float]:
+    # None means no deadline, which is the most lenient.
+    return None if a is None or b is None else max(a, b)
+
+
+class Ticket:
+    """一次上游调用（含重试与对冲副本）的调度信息：会话、优先级与截止时间（time.monotonic()）。"""
+
+    __slots__ = ("tenant", "priority", "deadline", "waiting")
+
+    def __init__(self, tenant: Optional[Hashable] = None, priority: Optional[str] = None, deadline: Optional[float] = None):
+        self.tenant = DEFAULT_TENANT if tenant is None else tenant
+        self.priority = normalize_priority(priority)
+        self.deadline = deadline
+        self.waiting: List["_Waiter"] = []
+
+
+class _Waiter:
+    __slots__ = ("ticket", "future", "rank", "queued", "queued_at", "timer")
+
+    def __init__(self, ticket: Ticket, future: "asyncio.Future[None]"):
+        self.ticket = ticket
+        self.future = future
+        self.rank = _RANK[ticket.priority]
+        self.queued = False
+        self.queued_at = time.monotonic()
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class FairGate:
+    """上游并发闸门：名额用尽时按优先级类别分配空出的名额，同一类别内按会话轮转；超过截止时间的排队请求直接丢弃。"""
+
+    def __init__(self, limit: int = 20):
+        self.limit = max(1, limit)
+        self._active = 0
+        # One queue per class; tenant -> waiters in arrival order, the dict order is the round-robin order.
+        self._queues: List["OrderedDict[Hashable, deque[_Waiter]]"] = [OrderedDict() for _ in PRIORITIES]
+        self._waiting = 0
+        self._class_stats = {name: {"served": 0, "expired": 0, "wait_ms_sum": 0.0} for name in PRIORITIES}
+
+    def _enqueue(self, waiter: _Waiter):
+        self._queues[waiter.rank].setdefault(waiter.ticket.tenant, deque()).append(waiter)
+        waiter.queued = True
+        self._waiting += 1
+
+    def _dequeue(self, waiter: _Waiter):
+        if not waiter.queued:
+            return
+        waiter.queued = False
+        self._waiting -= 1
+        queues = self._queues[waiter.rank]
+        queue = queues.get(waiter.ticket.tenant)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            pass
+        if not queue:
+            del queues[waiter.ticket.tenant]
+
+    def _pop_next(self) -> Optional[_Waiter]:
+        for queues in self._queues:
+            if not queues:
+                continue
+            tenant, queue = next(iter(queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                # Served once: go to the back of the rotation behind every other waiting tenant of this class.
+                queues.move_to_end(tenant)
+            else:
+                del queues[tenant]
+            waiter.queued = False
+            self._waiting -= 1
+            return waiter
+        return None
+
+    def _schedule_expiry(self, waiter: _Waiter):
+        if waiter.timer is not None:
+            waiter.timer.cancel()
+            waiter.timer = None
+        deadline = waiter.ticket.deadline
+        if deadline is not None:
+            waiter.timer = asyncio.get_running_loop().call_later(
+                max(0.0, deadline - time.monotonic()), self._expire, waiter
+            )
+
+    def _expire(self, waiter: _Waiter):
+        if waiter.future.done():
+            return
+        self._dequeue(waiter)
+        self._class_stats[PRIORITIES[waiter.rank]]["expired"] += 1
+        waiter.future.set_exception(DeadlineExceeded())
+
+    def _record_wait(self, priority: str, wait_ms: float):
+        stats = self._class_stats[priority]
+        stats["served"] += 1
+        stats["wait_ms_sum"] += wait_ms
+
+    async def acquire(self, ticket: Ticket):
+        """Wait for a slot; raises DeadlineExceeded if the ticket's deadline passes first."""
+        if ticket.deadline is not None and time.monotonic() >= ticket.deadline:
+            self._class_stats[ticket.priority]["expired"] += 1
+            raise DeadlineExceeded()
+        if self._active < self.limit and not self._waiting:
+            self._active += 1
+            self._record_wait(ticket.priority, 0.0)
+            return
+        waiter = _Waiter(ticket, asyncio.get_running_loop().create_future())
+        self._enqueue(waiter)
+        ticket.waiting.append(waiter)
+        self._schedule_expiry(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            fut = waiter.future
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                # The slot was handed over just as we were cancelled: pass it on.
+                self.release()
+            else:
+                self._dequeue(waiter)
+            raise
+        finally:
+            ticket.waiting.remove(waiter)
+            if waiter.timer is not None:
+                waiter.timer.cancel()
+        # A promoted waiter is accounted to the class that finally served it.
+        self._record_wait(PRIORITIES[waiter.rank], (time.monotonic() - waiter.queued_at) * 1000)
+
+    def promote(self, ticket: Ticket, priority: Optional[str], deadline: Optional[float]):
+        """A caller joined a shared flight: raise it to the caller's class and keep it until the later deadline."""
+        priority = normalize_priority(priority)
+        if _RANK[priority] < _RANK[ticket.priority]:
+            ticket.priority = priority
+            for waiter in ticket.waiting:
+                if waiter.queued:
+                    self._dequeue(waiter)
+                    waiter.rank = _RANK[priority]
+                    self._enqueue(waiter)
+        extended = _later(ticket.deadline, deadline)
+        if extended != ticket.deadline:
+            ticket.deadline = extended
+            for waiter in ticket.waiting:
+                if waiter.queued:
+                    self._schedule_expiry(waiter)
+
+    def release(self):
+        self._active -= 1
+        while self._active < self.limit:
+            waiter = self._pop_next()
+            if waiter is None:
+                break
+            if waiter.future.done():
+                # Cancelled, its task has not run its cleanup yet.
+                continue
+            self._active += 1
+            waiter.future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, ticket: Ticket) -> AsyncIterator[None]:
+        await self.acquire(ticket)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {name: sum(len(q) for q in self._queues[rank].values()) for rank, name in enumerate(PRIORITIES)}
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sum(s["served"] for s in self._class_stats.values())
+        wait_ms_sum = sum(s["wait_ms_sum"] for s in self._class_stats.values())
+        data = {
+            "gate_active": self._active,
+            "gate_waiting": self._waiting,
+            "gate_waiting_tenants": sum(len(queues) for queues in self._queues),
+            "gate_wait_ms_avg": round(wait_ms_sum / waits, 2) if waits else 0.0,
+        }
+        for name, depth in self.queue_depths().items():
+            stats = self._class_stats[name]
+            data[f"gate_{name}_queue"] = depth
+            data[f"gate_{name}_served"] = stats["served"]
+            data[f"gate_{name}_expired"] = stats["expired"]
+            data[f"gate_{name}_wait_ms_avg"] = round(stats["wait_ms_sum"] / stats["served"], 2) if stats["served"] else 0.0
+        return data
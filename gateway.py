@@ -0,0 +1,447 @@
+"""API 网关：由单个进程持有 NullbrAPI（缓存、凭据、合并请求、限速），多个 Bot 进程经 Unix socket 共享。
+
+协议：每帧为 4 字节大端长度 + 紧凑 JSON。
+  请求 {"i": id, "m": 方法名, "a": [参数], "k": {关键字参数}}，取消 {"c": id}
+  响应 {"i": id, "r": 结果} 或 {"i": id, "e": 错误信息}
+SearchPage / MediaItem 以 {"$": "page" | "item", "d": to_dict()} 传输。
+
+独立运行网关：python gateway.py（socket 路径取 API_GATEWAY_SOCKET，默认 nullbr_gateway.sock）；Bot 设置同一变量即改用 GatewayClient。
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import struct
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+from nullbr_api import NullbrAPI, add_derived_metrics, iter_items, iter_pages
+from records import MediaItem, SearchPage
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct(">I")
+MAX_FRAME = 16 * 1024 * 1024
+
+# Methods a worker may call on the gateway's NullbrAPI; everything else is rejected.
+ASYNC_METHODS = frozenset(
+    {
+        "search",
+        "get_list",
+        "get_movie_info",
+        "get_tv_info",
+        "get_person_info",
+        "get_collection_info",
+        "get_movie_115",
+        "get_movie_magnet",
+        "get_tv_115",
+        "get_tv_season_magnet",
+        "get_tv_episode_magnet",
+        "get_user_info",
+        "search_local",
+        "refresh_quota_ledger",
+        "warm_up",
+    }
+)
+SYNC_METHODS = frozenset({"invalidate_credentials_cache"})
+# Gauges NullbrAPI.get_metrics_snapshot adds on top of its counters.
+SNAPSHOT_GAUGES = (
+    "meta_cache_size",
+    "meta_cache_bytes",
+    "meta_cache_evictions",
+    "res_cache_size",
+    "negative_cache_size",
+    "inflight",
+)
+
+
+def encode_value(value: Any) -> Any:
+    if isinstance(value, SearchPage):
+        return {"$": "page", "d": value.to_dict()}
+    if isinstance(value, MediaItem):
+        return {"$": "item", "d": value.to_dict()}
+    if isinstance(value, list):
+        return [encode_value(v) for v in value]
+    return value
+
+
+def decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "$" in value and "d" in value:
+        if value["$"] == "page":
+            return SearchPage.from_dict(value["d"])
+        if value["$"] == "item":
+            return MediaItem.from_dict(value["d"])
+    if isinstance(value, list):
+        return [decode_value(v) for v in value]
+    return value
+
+
+def _pack(message: Dict[str, Any]) -> bytes:
+    body = json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return HEADER.pack(len(body)) + body
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    """Next message from the stream, or None once the peer has closed it."""
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (length,) = HEADER.unpack(header)
+    if length > MAX_FRAME:
+        raise ValueError(f"gateway frame too large: {length} bytes")
+    return json.loads(await reader.readexactly(length))
+
+
+class GatewayServer:
+    """在 Unix socket 上为多个 Bot 进程提供同一个 NullbrAPI 实例。"""
+
+    def __init__(self, api, path: str):
+        self.api = api
+        self.path = path
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections = 0
+        self._stats = {"gateway_calls": 0, "gateway_errors": 0, "gateway_cancelled": 0}
+
+    async def start(self):
+        if os.path.exists(self.path):
+            # A stale socket from a previous run would make bind() fail.
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o660)
+        logger.info("API 网关已监听 %s", self.path)
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def status(self) -> Dict[str, Any]:
+        """Everything a worker needs for its synchronous accessors, fetched in one round trip."""
+        metrics = self.api.get_metrics_snapshot(reset=False)
+        metrics.update(self._stats)
+        metrics["gateway_connections"] = self._connections
+        return {
+            "metrics": metrics,
+            "credentials": self.api.get_credential_states(),
+            "quota": self.api.get_quota_snapshot(),
+            "prometheus": self.api.render_prometheus(),
+            "inflight": self.api.inflight_count(),
+        }
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections += 1
+        tasks: Dict[int, "asyncio.Task[None]"] = {}
+        write_lock = asyncio.Lock()
+
+        async def reply(message: Dict[str, Any]):
+            async with write_lock:
+                writer.write(_pack(message))
+                await writer.drain()
+
+        async def run(call_id: int, method: str, args, kwargs):
+            try:
+                if method == "status":
+                    result = self.status()
+                elif method in SYNC_METHODS:
+                    result = getattr(self.api, method)(*args, **kwargs)
+                elif method in ASYNC_METHODS:
+                    result = await getattr(self.api, method)(*args, **kwargs)
+                else:
+                    raise ValueError(f"unknown gateway method: {method}")
+                await reply({"i": call_id, "r": encode_value(result)})
+            except asyncio.CancelledError:
+                self._stats["gateway_cancelled"] += 1
+            except Exception as e:
+                self._stats["gateway_errors"] += 1
+                logger.error("Gateway call %s failed: %s", method, e)
+                try:
+                    await reply({"i": call_id, "e": str(e)})
+                except Exception:
+                    pass
+            finally:
+                tasks.pop(call_id, None)
+
+        try:
+            while True:
+                message = await read_frame(reader)
+                if message is None:
+                    break
+                if "c" in message:
+                    # The worker gave up on this call; cancelling lets NullbrAPI abandon an unshared flight.
+                    task = tasks.get(message["c"])
+                    if task is not None:
+                        task.cancel()
+                    continue
+                self._stats["gateway_calls"] += 1
+                call_id = message["i"]
+                tasks[call_id] = asyncio.create_task(
+                    run(call_id, message.get("m", ""), message.get("a") or [], message.get("k") or {})
+                )
+        except (ConnectionError, ValueError) as e:
+            logger.warning("Gateway connection dropped: %s", e)
+        finally:
+            self._connections -= 1
+            for task in list(tasks.values()):
+                task.cancel()
+            writer.close()
+
+
+class GatewayClient:
+    """NullbrAPI 的轻量替身：方法签名一致，调用经 Unix socket 转发到网关进程。"""
+
+    def __init__(self, path: str, timeout: float = 60.0, status_interval: float = 2.0):
+        self.path = path
+        self.timeout = timeout
+        self.status_interval = max(0.5, status_interval)
+        self._iter_max_pages = int(os.getenv("ITER_MAX_PAGES", "5"))
+        self._iter_max_items = int(os.getenv("ITER_MAX_ITEMS", "200"))
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional["asyncio.Task[None]"] = None
+        self._status_task: Optional["asyncio.Task[None]"] = None
+        # Serializes connect/reconnect, so concurrent first calls share one connection.
+        self._connect_lock = asyncio.Lock()
+        # Calls awaiting a reply on the current connection; each connection gets its own map.
+        self._pending: Dict[int, "asyncio.Future[Any]"] = {}
+        self._ids = itertools.count(1)
+        self._status: Dict[str, Any] = {}
+        self._status_at = 0.0
+        # Counter values at the last get_metrics_snapshot(reset=True), so intervals are per worker.
+        self._metrics_baseline: Dict[str, Any] = {}
+
+    async def _ensure_connected(self) -> asyncio.StreamWriter:
+        writer = self._writer
+        if writer is None or writer.is_closing():
+            async with self._connect_lock:
+                writer = self._writer
+                if writer is None or writer.is_closing():
+                    reader, writer = await asyncio.open_unix_connection(self.path)
+                    self._writer = writer
+                    self._pending = {}
+                    self._reader_task = asyncio.create_task(self._read_loop(reader, writer, self._pending))
+        if self._status_task is None or self._status_task.done():
+            self._status_task = asyncio.create_task(self._status_loop())
+        return writer
+
+    async def _read_loop(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, pending: Dict[int, "asyncio.Future[Any]"]
+    ):
+        error: Exception = ConnectionError("gateway connection closed")
+        try:
+            while True:
+                message = await read_frame(reader)
+                if message is None:
+                    break
+                fut = pending.pop(message.get("i"), None)
+                if fut is None or fut.done():
+                    continue
+                if "e" in message:
+                    fut.set_exception(RuntimeError(message["e"]))
+                else:
+                    fut.set_result(decode_value(message.get("r")))
+        except Exception as e:
+            # A close mid-frame (IncompleteReadError) or a bad frame drops the connection like EOF does.
+            error = ConnectionError(f"gateway connection lost: {e!r}")
+        finally:
+            writer.close()
+            # Only reset our own connection; a reconnect may already have replaced it.
+            if self._writer is writer:
+                self._writer = None
+            for fut in pending.values():
+                if not fut.done():
+                    fut.set_exception(error)
+            pending.clear()
+
+    async def call(self, method: str, *args, **kwargs) -> Any:
+        writer = await self._ensure_connected()
+        pending = self._pending
+        call_id = next(self._ids)
+        fut: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+        pending[call_id] = fut
+        writer.write(_pack({"i": call_id, "m": method, "a": list(args), "k": kwargs}))
+        try:
+            await writer.drain()
+            return await asyncio.wait_for(fut, self.timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            pending.pop(call_id, None)
+            if not writer.is_closing():
+                writer.write(_pack({"c": call_id}))
+            raise
+
+    async def _call_or(self, default: Any, method: str, *args, **kwargs) -> Any:
+        """Like NullbrAPI, report failures as the method's empty result instead of raising."""
+        try:
+            return await self.call(method, *args, **kwargs)
+        except (OSError, EOFError, RuntimeError, asyncio.TimeoutError) as e:
+            # EOFError covers asyncio.IncompleteReadError: the gateway closed the socket mid-reply.
+            logger.error("Gateway call %s failed: %s", method, e)
+            return default
+
+    async def _status_loop(self):
+        while True:
+            try:
+                self._status = await self.call("status")
+                self._status_at = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Gateway status refresh failed: %s", e)
+            await asyncio.sleep(self.status_interval)
+
+    # --- synchronous accessors, served from the last status snapshot ---
+    def inflight_count(self) -> int:
+        return self._status.get("inflight", 0)
+
+    def get_credential_states(self):
+        return self._status.get("credentials", [])
+
+    def render_prometheus(self) -> str:
+        return self._status.get("prometheus", "")
+
+    def get_metrics_snapshot(self, reset: bool = False) -> Dict[str, Any]:
+        counters = NullbrAPI._new_metrics()
+        data = dict(self._status.get("metrics") or counters)
+        current = {k: data.get(k, 0) for k in counters}
+        for key, value in current.items():
+            data[key] = value - self._metrics_baseline.get(key, 0)
+        # Before the first status reply (or while the gateway is down) only the counters are known.
+        for key in SNAPSHOT_GAUGES:
+            data.setdefault(key, 0)
+        data.setdefault("latency_percentiles", {})
+        add_derived_metrics(data)
+        data["gateway_status_age"] = round(time.monotonic() - self._status_at, 1) if self._status_at else None
+        if reset:
+            self._metrics_baseline = current
+        return data
+
+    async def invalidate_credentials_cache(self):
+        await self._call_or(None, "invalidate_credentials_cache")
+
+    def get_quota_snapshot(self):
+        return self._status.get("quota", [])
+
+    async def refresh_quota_ledger(self):
+        return await self._call_or([], "refresh_quota_ledger")
+
+    async def warm_up(self):
+        await self._call_or(None, "warm_up")
+
+    async def search_local(self, query: str, limit: int = 20, media_type: Optional[str] = None):
+        return await self._call_or([], "search_local", query, limit=limit, media_type=media_type)
+
+    # --- META APIs ---
+    async def search(self, query, page=1, prefetch=False, tenant=None, priority=None):
+        return await self._call_or(
+            None, "search", query, page=page, prefetch=prefetch, tenant=tenant, priority=priority
+        )
+
+    async def get_list(self, listid, page=1, prefetch=False, tenant=None, priority=None):
+        return await self._call_or(
+            None, "get_list", listid, page=page, prefetch=prefetch, tenant=tenant, priority=priority
+        )
+
+    def iter_search_pages(
+        self, query, start_page=1, max_pages=None, tenant=None, priority=None
+    ) -> AsyncIterator[SearchPage]:
+        max_pages = self._iter_max_pages if max_pages is None else max_pages
+        return iter_pages(
+            lambda page: self.search(query, page=page, tenant=tenant, priority=priority), start_page, max_pages
+        )
+
+    def iter_search(self, query, start_page=1, max_pages=None, max_items=None) -> AsyncIterator[MediaItem]:
+        max_items = self._iter_max_items if max_items is None else max_items
+        return iter_items(self.iter_search_pages(query, start_page, max_pages), max_items)
+
+    def iter_list_pages(
+        self, listid, start_page=1, max_pages=None, tenant=None, priority=None
+    ) -> AsyncIterator[SearchPage]:
+        max_pages = self._iter_max_pages if max_pages is None else max_pages
+        return iter_pages(
+            lambda page: self.get_list(listid, page=page, tenant=tenant, priority=priority), start_page, max_pages
+        )
+
+    def iter_list(self, listid, start_page=1, max_pages=None, max_items=None) -> AsyncIterator[MediaItem]:
+        max_items = self._iter_max_items if max_items is None else max_items
+        return iter_items(self.iter_list_pages(listid, start_page, max_pages), max_items)
+
+    async def get_movie_info(self, tmdbid, prefetch=False, tenant=None, priority=None):
+        return await self._call_or(None, "get_movie_info", tmdbid, prefetch=prefetch, tenant=tenant, priority=priority)
+
+    async def get_tv_info(self, tmdbid, prefetch=False, tenant=None, priority=None):
+        return await self._call_or(None, "get_tv_info", tmdbid, prefetch=prefetch, tenant=tenant, priority=priority)
+
+    async def get_person_info(self, tmdbid, prefetch=False, tenant=None, priority=None):
+        return await self._call_or(None, "get_person_info", tmdbid, prefetch=prefetch, tenant=tenant, priority=priority)
+
+    async def get_collection_info(self, tmdbid, prefetch=False, tenant=None, priority=None):
+        return await self._call_or(
+            None, "get_collection_info", tmdbid, prefetch=prefetch, tenant=tenant, priority=priority
+        )
+
+    # --- RES APIs ---
+    async def get_movie_115(self, tmdbid, tenant=None, priority=None):
+        return await self._call_or(None, "get_movie_115", tmdbid, tenant=tenant, priority=priority)
+
+    async def get_movie_magnet(self, tmdbid, tenant=None, priority=None):
+        return await self._call_or(None, "get_movie_magnet", tmdbid, tenant=tenant, priority=priority)
+
+    async def get_tv_115(self, tmdbid, tenant=None, priority=None):
+        return await self._call_or(None, "get_tv_115", tmdbid, tenant=tenant, priority=priority)
+
+    async def get_tv_season_magnet(self, tmdbid, season_num, tenant=None, priority=None):
+        return await self._call_or(None, "get_tv_season_magnet", tmdbid, season_num, tenant=tenant, priority=priority)
+
+    async def get_tv_episode_magnet(self, tmdbid, season_num, episode_num, tenant=None, priority=None):
+        return await self._call_or(
+            None, "get_tv_episode_magnet", tmdbid, season_num, episode_num, tenant=tenant, priority=priority
+        )
+
+    async def get_user_info(self, app_id: Optional[str] = None):
+        return await self._call_or(None, "get_user_info", app_id=app_id)
+
+    async def close(self):
+        for task in (self._status_task, self._reader_task):
+            if task:
+                task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+async def _main():
+    from db import AuthDB
+
+    api = NullbrAPI(db=AuthDB(os.getenv("AUTH_DB_FILE", "auth.db")))
+    server = GatewayServer(api, os.getenv("API_GATEWAY_SOCKET") or "nullbr_gateway.sock")
+    await server.start()
+    warmup = asyncio.create_task(api.warm_up())
+    try:
+        await server.serve_forever()
+    finally:
+        warmup.cancel()
+        await server.close()
+        await api.close()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        pass
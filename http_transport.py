@@ -0,0 +1,162 @@
+import asyncio
+import ipaddress
+import logging
+import socket
+import time
+import urllib.request
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import httpcore
+import httpx
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover - optional dependency
+    HTTP2_AVAILABLE = False
+
+
+def _is_ip_literal(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+        return True
+    except ValueError:
+        return False
+
+
+class CachingDNSBackend(httpcore.AsyncNetworkBackend):
+    """带 TTL 的 DNS 解析缓存：新建连接时复用已解析的地址，失败时逐个尝试并清除缓存。"""
+
+    def __init__(self, ttl: float = 300.0, backend: Optional[httpcore.AsyncNetworkBackend] = None):
+        self.ttl = max(0.0, float(ttl))
+        self._backend = backend or httpcore.AnyIOBackend()
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+        self._resolving: Dict[Tuple[str, int], "asyncio.Future[List[str]]"] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def resolve(self, host: str, port: int) -> List[str]:
+        if _is_ip_literal(host):
+            return [host]
+        key = (host, port)
+        entry = self._cache.get(key)
+        now = time.monotonic()
+        if entry and entry[0] > now:
+            self.hits += 1
+            return entry[1]
+        # Concurrent connects to the same host share a single lookup.
+        pending = self._resolving.get(key)
+        if pending is None:
+            self.misses += 1
+            pending = self._resolving[key] = asyncio.ensure_future(self._lookup(host, port))
+            pending.add_done_callback(lambda _: self._resolving.pop(key, None))
+        else:
+            self.hits += 1
+        return await asyncio.shield(pending)
+
+    async def _lookup(self, host: str, port: int) -> List[str]:
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise httpcore.ConnectError(str(e)) from e
+        addrs = list(dict.fromkeys(info[4][0] for info in infos))
+        if self.ttl > 0 and addrs:
+            self._cache[(host, port)] = (time.monotonic() + self.ttl, addrs)
+        return addrs
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: Optional[float] = None,
+        local_address: Optional[str] = None,
+        socket_options: Optional[Iterable] = None,
+    ) -> httpcore.AsyncNetworkStream:
+        addrs = await self.resolve(host, port)
+        last_error: Optional[Exception] = None
+        # TLS SNI / certificate checks use the request origin, so dialling the IP is safe.
+        for addr in addrs:
+            try:
+                return await self._backend.connect_tcp(
+                    addr, port, timeout=timeout, local_address=local_address, socket_options=socket_options
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                last_error = e
+        # Every cached address failed: resolve afresh next time.
+        self._cache.pop((host, port), None)
+        raise last_error or httpcore.ConnectError(f"no address for {host}")
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None, socket_options: Optional[Iterable] = None):
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+    def stats(self) -> Dict[str, int]:
+        return {"dns_cache_hit": self.hits, "dns_cache_miss": self.misses, "dns_cache_size": len(self._cache)}
+
+
+class CachingDNSTransport(httpx.AsyncHTTPTransport):
+    """直连上游的 httpx 传输层：连接池与 AsyncHTTPTransport 的参数一致，只是换用给定的网络后端（DNS 缓存）。"""
+
+    def __init__(
+        self,
+        network_backend: httpcore.AsyncNetworkBackend,
+        verify: Any = True,
+        cert: Any = None,
+        trust_env: bool = True,
+        http1: bool = True,
+        http2: bool = False,
+        limits: httpx.Limits = httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        uds: Optional[str] = None,
+        local_address: Optional[str] = None,
+        retries: int = 0,
+        socket_options: Optional[Iterable] = None,
+    ):
+        # httpx does not accept a network_backend, so build the pool here instead of in super().__init__;
+        # request handling and exception mapping stay inherited.
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(verify=verify, cert=cert, trust_env=trust_env),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http1=http1,
+            http2=http2,
+            uds=uds,
+            local_address=local_address,
+            retries=retries,
+            socket_options=socket_options,
+            network_backend=network_backend,
+        )
+
+
+def build_client(
+    timeout: float,
+    connect_timeout: float,
+    max_connections: int,
+    max_keepalive: int,
+    keepalive_expiry: float,
+    http2: bool = False,
+    dns_backend: Optional[CachingDNSBackend] = None,
+) -> httpx.AsyncClient:
+    """构建上游 HTTP 客户端；HTTP/2 需要安装 h2（httpx[http2]），缺失时回退到 HTTP/1.1。"""
+    if http2 and not HTTP2_AVAILABLE:
+        logger.warning("API_HTTP2 已开启但未安装 h2（pip install 'httpx[http2]'），回退到 HTTP/1.1")
+        http2 = False
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive,
+        keepalive_expiry=keepalive_expiry,
+    )
+    timeouts = httpx.Timeout(timeout, connect=connect_timeout)
+    if any(k in urllib.request.getproxies() for k in ("http", "https", "all")):
+        # An explicit transport would bypass HTTP(S)_PROXY; the proxy resolves names anyway.
+        return httpx.AsyncClient(timeout=timeouts, limits=limits, http2=http2)
+    if dns_backend is not None:
+        transport: httpx.AsyncHTTPTransport = CachingDNSTransport(dns_backend, http2=http2, limits=limits)
+    else:
+        transport = httpx.AsyncHTTPTransport(http2=http2, limits=limits)
+    return httpx.AsyncClient(timeout=timeouts, transport=transport)
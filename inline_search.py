@@ -0,0 +1,94 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from records import MediaItem, SearchPage
+
+# Shortest prefix whose results are worth reusing for a longer query.
+PREFIX_MIN_CHARS = 2
+
+
+class InlineSearchCoordinator:
+    """行内查询协调：按用户去抖、新查询取代旧查询（取消其上游请求），并复用较短前缀的近期结果。"""
+
+    def __init__(self, debounce: float = 0.35, prefix_ttl: float = 60.0, prefix_max: int = 512):
+        self.debounce = max(0.0, debounce)
+        self.prefix_ttl = prefix_ttl
+        self.prefix_max = max(1, prefix_max)
+        self._generation: Dict[str, int] = {}
+        self._tasks: Dict[str, "asyncio.Task[Any]"] = {}
+        self._recent: "OrderedDict[str, Tuple[float, List[MediaItem]]]" = OrderedDict()
+        self._stats = {
+            "inline_queries": 0,
+            "inline_superseded": 0,
+            "inline_cancelled": 0,
+            "inline_prefix_hits": 0,
+        }
+
+    def begin(self, user_id: str) -> int:
+        """Register a new query for the user; their older query (and its upstream search) is dropped."""
+        self._stats["inline_queries"] += 1
+        generation = self._generation.get(user_id, 0) + 1
+        self._generation[user_id] = generation
+        task = self._tasks.pop(user_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+            self._stats["inline_cancelled"] += 1
+        return generation
+
+    def is_current(self, user_id: str, generation: int) -> bool:
+        return self._generation.get(user_id) == generation
+
+    async def settle(self, user_id: str, generation: int) -> bool:
+        """Wait out the debounce window; False if a newer keystroke arrived meanwhile."""
+        if self.debounce:
+            await asyncio.sleep(self.debounce)
+        if self.is_current(user_id, generation):
+            return True
+        self._stats["inline_superseded"] += 1
+        return False
+
+    def track(self, user_id: str, generation: int, query: str, task: "asyncio.Task[Any]"):
+        """Attach the upstream search of the user's current query so the next keystroke can cancel it."""
+        if not self.is_current(user_id, generation):
+            task.cancel()
+            self._stats["inline_cancelled"] += 1
+            return
+        self._tasks[user_id] = task
+        task.add_done_callback(lambda t: self._finished(user_id, query, t))
+
+    def _finished(self, user_id: str, query: str, task: "asyncio.Task[Any]"):
+        if self._tasks.get(user_id) is task:
+            del self._tasks[user_id]
+        if not task.cancelled() and task.exception() is None and isinstance(task.result(), SearchPage):
+            self.remember(query, task.result().items)
+
+    def remember(self, query: str, items: List[MediaItem]):
+        if not items:
+            return
+        key = query.strip().casefold()
+        self._recent[key] = (time.monotonic(), items)
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.prefix_max:
+            self._recent.popitem(last=False)
+
+    def prefix_results(self, query: str) -> Optional[List[MediaItem]]:
+        """Results of the longest recent shorter query that this one extends, narrowed to matching names."""
+        key = query.strip().casefold()
+        now = time.monotonic()
+        for end in range(len(key) - 1, PREFIX_MIN_CHARS - 1, -1):
+            entry = self._recent.get(key[:end].rstrip())
+            if entry is None or now - entry[0] > self.prefix_ttl:
+                continue
+            matches = [item for item in entry[1] if key in item.name.casefold()]
+            if matches:
+                self._stats["inline_prefix_hits"] += 1
+                return matches
+            return None
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        data = dict(self._stats)
+        data["inline_active"] = sum(1 for t in self._tasks.values() if not t.done())
+        return data
@@ -0,0 +1,99 @@
+import heapq
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class MetaCache:
+    """带 TTL 的 LRU 缓存：按条目数与字节数双重限额，get/put/淘汰均为 O(1)。"""
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        # key -> (expires_at, size, value); order = recency, oldest first
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        # (expires_at, key) min-heap used by sweep(); stale items are skipped lazily
+        self._expiry_heap: List[Tuple[float, Hashable]] = []
+        self._bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > time.time()
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            self._remove(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry[2]
+
+    def put(self, key: Hashable, value: Any, ttl: float, size: int = 1):
+        if ttl <= 0:
+            return
+        if key in self._entries:
+            self._remove(key)
+        expires_at = time.time() + ttl
+        self._entries[key] = (expires_at, size, value)
+        self._bytes += size
+        heapq.heappush(self._expiry_heap, (expires_at, key))
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, oldest_size, _) = self._entries.popitem(last=False)
+            self._bytes -= oldest_size
+            self.evictions += 1
+        if len(self._expiry_heap) > 2 * len(self._entries) + 64:
+            self._compact_heap()
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._remove(key)
+        return entry[2]
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """移除所有已过期条目，返回清理数量。"""
+        now = time.time() if now is None else now
+        removed = 0
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, key = heapq.heappop(heap)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == expires_at:
+                self._remove(key)
+                removed += 1
+        self.expirations += removed
+        return removed
+
+    def clear(self):
+        self._entries.clear()
+        self._expiry_heap.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _compact_heap(self):
+        self._expiry_heap = [(entry[0], key) for key, entry in self._entries.items()]
+        heapq.heapify(self._expiry_heap)
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency buckets; the last bucket is +Inf.
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000)
+
+
+class LatencyHistogram:
+    """固定分桶的累计延迟直方图（Prometheus 语义，不随读取重置）。"""
+
+    __slots__ = ("bounds", "counts", "sum_ms", "count")
+
+    def __init__(self, bounds: Iterable[float] = LATENCY_BUCKETS_MS):
+        self.bounds: Tuple[float, ...] = tuple(bounds)
+        self.counts: List[int] = [0] * (len(self.bounds) + 1)
+        self.sum_ms = 0.0
+        self.count = 0
+
+    def observe(self, value_ms: float):
+        self.counts[bisect_left(self.bounds, value_ms)] += 1
+        self.sum_ms += value_ms
+        self.count += 1
+
+    def percentile(self, q: float) -> float:
+        """Estimate the q-quantile (0..1) by linear interpolation inside its bucket."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for idx, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.bounds[idx - 1] if idx > 0 else 0.0
+                if idx >= len(self.bounds):
+                    return float(lower)
+                upper = self.bounds[idx]
+                return lower + (upper - lower) * ((rank - seen) / bucket_count)
+            seen += bucket_count
+        return float(self.bounds[-1])
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        result = []
+        running = 0
+        for bound, bucket_count in zip(self.bounds, self.counts):
+            running += bucket_count
+            result.append((str(bound), running))
+        result.append(("+Inf", running + self.counts[-1]))
+        return result
+
+
+class UpstreamStats:
+    """按接口族(search/movie/tv/person/collection/res/user)累计的延迟、状态码与缓存计数。"""
+
+    def __init__(self):
+        self.latency: Dict[str, LatencyHistogram] = {}
+        self.status: Dict[Tuple[str, str], int] = {}
+        self.counters: Dict[str, int] = {}
+
+    def observe(self, family: str, latency_ms: Optional[float], status: str):
+        if latency_ms is not None:
+            hist = self.latency.get(family)
+            if hist is None:
+                hist = self.latency[family] = LatencyHistogram()
+            hist.observe(latency_ms)
+        key = (family, status)
+        self.status[key] = self.status.get(key, 0) + 1
+
+    def incr(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def percentiles(self) -> Dict[str, Dict[str, float]]:
+        return {
+            family: {
+                "count": hist.count,
+                "p50": round(hist.percentile(0.50), 1),
+                "p95": round(hist.percentile(0.95), 1),
+                "p99": round(hist.percentile(0.99), 1),
+            }
+            for family, hist in sorted(self.latency.items())
+        }
+
+    def render_prometheus(self, prefix: str = "nullbr", gauges: Optional[Dict[str, float]] = None) -> str:
+        lines = [
+            f"# HELP {prefix}_upstream_latency_ms Upstream request latency in milliseconds.",
+            f"# TYPE {prefix}_upstream_latency_ms histogram",
+        ]
+        for family, hist in sorted(self.latency.items()):
+            for le, value in hist.cumulative():
+                lines.append(f'{prefix}_upstream_latency_ms_bucket{{family="{family}",le="{le}"}} {value}')
+            lines.append(f'{prefix}_upstream_latency_ms_sum{{family="{family}"}} {round(hist.sum_ms, 3)}')
+            lines.append(f'{prefix}_upstream_latency_ms_count{{family="{family}"}} {hist.count}')
+        lines.append(f"# HELP {prefix}_upstream_responses_total Upstream responses by family and status.")
+        lines.append(f"# TYPE {prefix}_upstream_responses_total counter")
+        for (family, status), value in sorted(self.status.items()):
+            lines.append(f'{prefix}_upstream_responses_total{{family="{family}",status="{status}"}} {value}')
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        typed = set()
+        for name, value in sorted((gauges or {}).items()):
+            # Gauge names may carry labels, e.g. credential_inflight{app_id="x"}.
+            base = name.split("{", 1)[0]
+            if base not in typed:
+                typed.add(base)
+                lines.append(f"# TYPE {prefix}_{base} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+async def start_metrics_server(render: Callable[[], str], host: str = "127.0.0.1", port: int = 9464) -> asyncio.AbstractServer:
+    """在本地端口以 Prometheus 文本格式提供 GET /metrics。"""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Drain headers; the request body (if any) is ignored.
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?", 1)[0] in ("/metrics", "/"):
+                status, body = "200 OK", render().encode("utf-8")
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.debug("metrics request failed: %s", e)
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info("Prometheus metrics listening on http://%s:%s/metrics", host, port)
+    return server
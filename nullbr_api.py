@@ -1,54 +1,265 @@
 import os
 import asyncio
+import contextlib
 import httpx
 import logging
-import sqlite3
-import random
 import time
-from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict, deque
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
+from credential_scheduler import CredentialScheduler, KeyHealth
+from db import AuthDB
+from fair_gate import DEFAULT_PRIORITY, PRIORITIES, DeadlineExceeded, FairGate, Ticket, normalize_priority
+from http_transport import CachingDNSBackend, build_client
+from meta_cache import MetaCache
+from quota_ledger import QuotaLedger
+from records import MediaItem, SearchPage
+from metrics import UpstreamStats
+from res_cache import ResCache
+from search_index import SearchIndex
+from retry_policy import RetryPolicy
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+PREFETCH_TRACK_MAX = 2048
+# Sentinel stored in the negative cache for upstream 404 responses.
+NOT_FOUND = object()
+META_FAMILIES = ("search", "list", "movie", "tv", "person", "collection")
+# Default TTL (seconds) per META endpoint family; META_TTL_<FAMILY> overrides it.
+META_FAMILY_TTL_DEFAULTS = {
+    "search": None,  # falls back to META_CACHE_TTL
+    "list": 300,
+    "movie": 600,
+    "tv": 300,
+    "person": 1800,
+    "collection": 1800,
+}
+
+
+def parse_retry_after(response: Optional[httpx.Response]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP date) into seconds."""
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def endpoint_family(endpoint: str, auth_mode: str = "meta") -> str:
+    """Map an endpoint path to its family, e.g. /movie/1/115 -> res, /tv/1 -> tv."""
+    if auth_mode in ("res", "user"):
+        return auth_mode
+    head = endpoint.strip("/").split("/", 1)[0]
+    return head if head in META_FAMILIES else "other"
+
+
+async def iter_pages(
+    fetch_page: Callable[[int], Awaitable[Any]],
+    start_page: int,
+    max_pages: int,
+) -> AsyncIterator[SearchPage]:
+    """Yield consecutive pages, fetching page N+1 while the caller is still consuming page N."""
+    page = max(1, int(start_page))
+    pending: Optional["asyncio.Future[Any]"] = asyncio.ensure_future(fetch_page(page)) if max_pages > 0 else None
+    fetched = 0
+    try:
+        while pending is not None:
+            data = await pending
+            pending = None
+            fetched += 1
+            if not isinstance(data, SearchPage):
+                return
+            if not data.items:
+                # An empty page is a valid answer (no results), unlike None for a failed request.
+                yield data
+                return
+            if fetched < max_pages and (data.total_pages is None or page < int(data.total_pages)):
+                pending = asyncio.ensure_future(fetch_page(page + 1))
+            yield data
+            page += 1
+    finally:
+        # The consumer stopped early: drop the read-ahead (aborted upstream unless someone else shares it).
+        if pending is not None:
+            pending.cancel()
+
+
+async def iter_items(pages: AsyncIterator[SearchPage], max_items: int) -> AsyncIterator[MediaItem]:
+    if max_items <= 0:
+        return
+    count = 0
+    async with contextlib.aclosing(pages):
+        async for data in pages:
+            for item in data.items:
+                yield item
+                count += 1
+                if count >= max_items:
+                    return
+
+
+def add_derived_metrics(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Averages and hit rates computed from the counters of a metrics snapshot."""
+    upstream = data["upstream_calls"]
+    data["latency_ms_avg"] = round((data["latency_ms_sum"] / upstream), 2) if upstream > 0 else 0.0
+    data["prefetch_hit_rate"] = (
+        round(data["prefetch_hits"] / data["prefetch_requests"] * 100, 1) if data["prefetch_requests"] else 0.0
+    )
+    local_total = data["local_search_hit"] + data["local_search_miss"]
+    data["local_search_hit_rate"] = round(data["local_search_hit"] / local_total * 100, 1) if local_total else 0.0
+    return data
+
+
 class NullbrAPI:
-    def __init__(self, base_url: str = "https://api.nullbr.eu.org"):
+    def __init__(
+        self,
+        base_url: str = "https://api.nullbr.eu.org",
+        res_cache_path: Optional[str] = None,
+        db: Optional[AuthDB] = None,
+    ):
         self.base_url = base_url
-        self.client = httpx.AsyncClient(
-            timeout=20.0,
-            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
-        )
+        self.db = db or AuthDB(os.getenv("AUTH_DB_FILE", "auth.db"))
+        self._dns = CachingDNSBackend(ttl=float(os.getenv("API_DNS_CACHE_TTL", "300")))
+        http2 = os.getenv("API_HTTP2", "0").lower() in ("1", "true", "yes", "on")
+        keepalive_expiry = float(os.getenv("API_KEEPALIVE_EXPIRY", "60"))
+        connect_timeout = float(os.getenv("API_CONNECT_TIMEOUT", "5"))
+        # META calls are short and bursty, RES calls are slower: give each its own pool and timeouts.
+        self._clients: Dict[str, httpx.AsyncClient] = {
+            "meta": build_client(
+                timeout=float(os.getenv("META_HTTP_TIMEOUT", "10")),
+                connect_timeout=connect_timeout,
+                max_connections=int(os.getenv("META_HTTP_MAX_CONNECTIONS", "50")),
+                max_keepalive=int(os.getenv("META_HTTP_MAX_KEEPALIVE", "20")),
+                keepalive_expiry=keepalive_expiry,
+                http2=http2,
+                dns_backend=self._dns,
+            ),
+            "res": build_client(
+                timeout=float(os.getenv("RES_HTTP_TIMEOUT", "30")),
+                connect_timeout=connect_timeout,
+                max_connections=int(os.getenv("RES_HTTP_MAX_CONNECTIONS", "20")),
+                max_keepalive=int(os.getenv("RES_HTTP_MAX_KEEPALIVE", "10")),
+                keepalive_expiry=keepalive_expiry,
+                http2=http2,
+                dns_backend=self._dns,
+            ),
+        }
+        self.client = self._clients["meta"]
+        self._warmup_connections = int(os.getenv("API_WARMUP_CONNECTIONS", "2"))
+        # Default budget for the paginated iterators (iter_search / iter_list).
+        self._iter_max_pages = int(os.getenv("ITER_MAX_PAGES", "5"))
+        self._iter_max_items = int(os.getenv("ITER_MAX_ITEMS", "200"))
         self._credentials_cache: List[Tuple[str, str]] = []
         self._credentials_cache_at = 0.0
         self._credentials_ttl = int(os.getenv("CREDENTIALS_CACHE_TTL", "60"))
-        self._meta_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._scheduler = CredentialScheduler(
+            cooldown_base=float(os.getenv("CREDENTIAL_COOLDOWN_BASE", "30")),
+            cooldown_max=float(os.getenv("CREDENTIAL_COOLDOWN_MAX", "600")),
+        )
         self._meta_ttl = int(os.getenv("META_CACHE_TTL", "30"))
-        self._meta_cache_max = int(os.getenv("META_CACHE_MAX", "512"))
-        self._request_semaphore = asyncio.Semaphore(int(os.getenv("API_MAX_CONCURRENCY", "20")))
-        self._metrics = {
+        self._meta_family_ttl = {
+            family: int(os.getenv(f"META_TTL_{family.upper()}", str(default if default is not None else self._meta_ttl)))
+            for family, default in META_FAMILY_TTL_DEFAULTS.items()
+        }
+        self._meta_cache = MetaCache(
+            max_entries=int(os.getenv("META_CACHE_MAX", "512")),
+            max_bytes=int(os.getenv("META_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+        )
+        self._meta_sweep_interval = int(os.getenv("META_CACHE_SWEEP_INTERVAL", "30"))
+        self._sweeper_task: Optional["asyncio.Task[None]"] = None
+        # Negative outcomes (404, empty lists) live apart from positive entries with a shorter TTL.
+        self._negative_cache = MetaCache(max_entries=int(os.getenv("NEGATIVE_CACHE_MAX", "1024")))
+        self._negative_ttl = int(os.getenv("NEGATIVE_CACHE_TTL", "120"))
+        self.quota_ledger = QuotaLedger()
+        self._quota_refresh_interval = int(os.getenv("QUOTA_REFRESH_INTERVAL", "600"))
+        self._quota_task: Optional["asyncio.Task[None]"] = None
+        self._res_cache = ResCache(
+            res_cache_path or os.getenv("RES_CACHE_DB", "res_cache.db"),
+            ttl_hours=float(os.getenv("RES_CACHE_TTL_HOURS", "24")),
+            max_entries=int(os.getenv("RES_CACHE_MAX", "5000")),
+        )
+        self.search_index = SearchIndex(
+            os.getenv("SEARCH_INDEX_DB", "search_index.db"),
+            max_entries=int(os.getenv("SEARCH_INDEX_MAX", "50000")),
+        )
+        self._index_tasks: "set[asyncio.Task[Any]]" = set()
+        # Upstream slots go to the highest priority class first, round-robin between chats within a class.
+        self._gate = FairGate(int(os.getenv("API_MAX_CONCURRENCY", "20")))
+        # Seconds a request may wait (including retries) before it is dropped instead of sent; 0 = no deadline.
+        self._deadlines = {
+            name: float(os.getenv(f"API_DEADLINE_{name.upper()}", str(default)))
+            for name, default in zip(PRIORITIES, (20, 8, 60, 5))
+        }
+        # flight key -> scheduling ticket, so callers joining a flight can promote it.
+        self._flight_tickets: Dict[str, Ticket] = {}
+        self._retry_policy = RetryPolicy(
+            max_retries=int(os.getenv("API_RETRY_MAX", "2")),
+            base_delay=float(os.getenv("API_RETRY_BASE_DELAY", "0.3")),
+            max_delay=float(os.getenv("API_RETRY_MAX_DELAY", "5")),
+            max_retry_after=float(os.getenv("API_RETRY_MAX_RETRY_AFTER", "10")),
+        )
+        self._hedge_enabled = os.getenv("API_HEDGE_ENABLED", "0").lower() in ("1", "true", "yes", "on")
+        self._hedge_min_delay_ms = float(os.getenv("API_HEDGE_MIN_DELAY_MS", "150"))
+        self._hedge_min_samples = int(os.getenv("API_HEDGE_MIN_SAMPLES", "20"))
+        self._meta_latencies: "deque[float]" = deque(maxlen=200)
+        self._inflight: Dict[str, "asyncio.Future[Any]"] = {}
+        self._flight_waiters: Dict[str, int] = {}
+        # Cache keys warmed by prefetch and not yet used by a real request (insertion ordered).
+        self._prefetched: "OrderedDict[str, None]" = OrderedDict()
+        self._metrics = self._new_metrics()
+        self.stats = UpstreamStats()
+
+    @staticmethod
+    def _new_metrics() -> Dict[str, Any]:
+        return {
             "requests_total": 0,
             "requests_meta": 0,
             "requests_res": 0,
             "requests_user": 0,
             "meta_cache_hit": 0,
             "meta_cache_miss": 0,
+            "coalesced_waiters": 0,
+            "res_cache_hit": 0,
+            "res_cache_miss": 0,
+            "quota_saved": 0,
+            "negative_cache_hit": 0,
+            "upstream_calls": 0,
+            "retries": 0,
+            "hedges_sent": 0,
+            "hedges_won": 0,
+            "prefetch_requests": 0,
+            "prefetch_skipped": 0,
+            "prefetch_hits": 0,
+            "local_search_hit": 0,
+            "local_search_miss": 0,
+            "flights_abandoned": 0,
             "http_429": 0,
             "http_errors": 0,
             "request_errors": 0,
             "latency_ms_sum": 0.0,
         }
 
+    def _count(self, name: str):
+        """Bump both the interval counter (reset by the log reporter) and the cumulative one."""
+        self._metrics[name] += 1
+        self.stats.incr(name)
+
     def invalidate_credentials_cache(self):
         self._credentials_cache = []
         self._credentials_cache_at = 0.0
 
-    def _load_credentials_from_db(self) -> List[Tuple[str, str]]:
+    async def _load_credentials_from_db(self) -> List[Tuple[str, str]]:
         try:
-            with sqlite3.connect("auth.db") as conn:
-                c = conn.cursor()
-                c.execute("SELECT app_id, api_key FROM api_keys")
-                return c.fetchall()
+            return await self.db.list_api_keys()
         except Exception as e:
             logger.error("Error reading API keys from DB: %s", e)
             return []
@@ -58,20 +269,83 @@ class NullbrAPI:
         api_key = os.getenv("X_API_KEY") or os.getenv("NULLBR_API_KEY")
         return app_id, api_key
 
-    def _get_credentials(self) -> Tuple[str, str]:
-        """Pick one AppID/APIKey pair from DB cache, fallback to .env."""
+    async def _refresh_credentials(self):
         now = time.time()
         if now - self._credentials_cache_at > self._credentials_ttl or not self._credentials_cache:
-            self._credentials_cache = self._load_credentials_from_db()
+            self._credentials_cache = await self._load_credentials_from_db()
             self._credentials_cache_at = now
+            credentials = self._credentials_cache
+            if not credentials:
+                app_id, api_key = self._env_credentials()
+                credentials = [(app_id, api_key)] if app_id and api_key else []
+            self._scheduler.set_credentials(credentials)
+            self.quota_ledger.retain(self._scheduler.app_ids())
 
-        if self._credentials_cache:
-            return random.choice(self._credentials_cache)
+    async def _get_credentials(self, auth_mode: str = "meta", app_id: Optional[str] = None) -> KeyHealth:
+        """Pick the healthiest AppID/APIKey pair from DB cache, fallback to .env.
 
-        app_id, api_key = self._env_credentials()
-        if not app_id or not api_key:
+        RES calls skip keys the quota ledger marks as exhausted and prefer the one
+        with the most remaining budget.
+        """
+        await self._refresh_credentials()
+        if app_id is not None:
+            state = self._scheduler.acquire(app_id=app_id)
+        elif auth_mode == "res":
+            ledger = self.quota_ledger
+            state = self._scheduler.acquire(
+                skip=lambda k: ledger.is_exhausted(k.app_id),
+                rank=self._quota_rank,
+            )
+        else:
+            state = self._scheduler.acquire()
+        if state is None:
             raise ValueError("No API credentials found in database or .env file.")
-        return app_id, api_key
+        return state
+
+    def _quota_rank(self, state: KeyHealth) -> Tuple[int, int]:
+        remaining = self.quota_ledger.remaining(state.app_id)
+        if remaining is None:
+            # Unknown budget ranks after every key with a known positive balance.
+            return 1, 0
+        return 0, -(remaining - state.inflight)
+
+    def get_credential_states(self) -> List[Dict[str, Any]]:
+        """每个 AppID 的调度状态（冷却、429、错误率、延迟），用于管理面板。"""
+        return self._scheduler.snapshot()
+
+    def _ensure_background_tasks(self):
+        if self._sweeper_task is None or self._sweeper_task.done():
+            self._sweeper_task = asyncio.create_task(self._sweep_meta_cache_loop())
+        if self._quota_refresh_interval > 0 and (self._quota_task is None or self._quota_task.done()):
+            self._quota_task = asyncio.create_task(self._quota_refresh_loop())
+
+    async def _quota_refresh_loop(self):
+        while True:
+            try:
+                await self.refresh_quota_ledger()
+            except Exception as e:
+                logger.error("Quota ledger refresh failed: %s", e)
+            await asyncio.sleep(max(30, self._quota_refresh_interval))
+
+    async def refresh_quota_ledger(self) -> List[Dict[str, Any]]:
+        """对接口池中的每个 Key 调用 /user/info（不耗配额），校准本地配额账本。"""
+        await self._refresh_credentials()
+        app_ids = self._scheduler.app_ids()
+        results = await asyncio.gather(*(self.get_user_info(app_id=app_id) for app_id in app_ids))
+        for app_id, data in zip(app_ids, results):
+            if not isinstance(data, dict):
+                self.quota_ledger.mark_error(app_id, "查询失败")
+        return self.quota_ledger.snapshot()
+
+    def get_quota_snapshot(self) -> List[Dict[str, Any]]:
+        return self.quota_ledger.snapshot()
+
+    async def _sweep_meta_cache_loop(self):
+        while True:
+            await asyncio.sleep(max(1, self._meta_sweep_interval))
+            removed = self._meta_cache.sweep() + self._negative_cache.sweep()
+            if removed:
+                logger.debug("meta cache sweep removed %s expired entries", removed)
 
     @staticmethod
     def _build_meta_cache_key(endpoint: str, params: Optional[Dict[str, Any]]) -> str:
@@ -80,124 +354,482 @@ class NullbrAPI:
         items = sorted((str(k), str(v)) for k, v in params.items())
         return f"{endpoint}?" + "&".join(f"{k}={v}" for k, v in items)
 
-    async def _request(self, endpoint: str, auth_mode: str = "meta", params: Optional[Dict[str, Any]] = None):
-        self._metrics["requests_total"] += 1
+    async def _request(
+        self,
+        endpoint: str,
+        auth_mode: str = "meta",
+        params: Optional[Dict[str, Any]] = None,
+        app_id: Optional[str] = None,
+        prefetch: bool = False,
+        tenant: Optional[str] = None,
+        priority: Optional[str] = None,
+    ):
+        self._ensure_background_tasks()
+        cache_key = self._build_meta_cache_key(endpoint, params)
+        flight_key = f"{auth_mode}:{app_id or ''}:{cache_key}"
+        if prefetch:
+            return await self._prefetch(endpoint, params, cache_key, flight_key)
+        # Quota probes are admin work; everything else defaults to an interactive user action.
+        priority = normalize_priority(priority or ("admin" if auth_mode == "user" else None))
+
+        self._count("requests_total")
         if auth_mode == "meta":
-            self._metrics["requests_meta"] += 1
+            self._count("requests_meta")
         elif auth_mode == "res":
-            self._metrics["requests_res"] += 1
+            self._count("requests_res")
         elif auth_mode == "user":
-            self._metrics["requests_user"] += 1
-
-        app_id, api_key = self._get_credentials()
+            self._count("requests_user")
 
-        headers = {"X-APP-ID": app_id}
-        if auth_mode in ("res", "user"):
-            headers["X-API-KEY"] = api_key
+        if auth_mode in ("meta", "res"):
+            negative = self._negative_cache.get(f"{auth_mode}:{cache_key}")
+            if negative is not None:
+                self._count("negative_cache_hit")
+                if auth_mode == "res":
+                    self._count("quota_saved")
+                return None if negative is NOT_FOUND else negative
 
-        cache_key = None
         if auth_mode == "meta":
-            cache_key = self._build_meta_cache_key(endpoint, params)
             cached = self._meta_cache.get(cache_key)
-            if cached and (time.time() - cached[0] <= self._meta_ttl):
-                self._metrics["meta_cache_hit"] += 1
-                return cached[1]
-            self._metrics["meta_cache_miss"] += 1
+            if cached is not None:
+                self._count("meta_cache_hit")
+                self._note_prefetch_use(cache_key)
+                return cached
+            self._count("meta_cache_miss")
+        elif auth_mode == "res" and self._res_cache.enabled:
+            cached = await self._res_cache.get(cache_key)
+            if cached is not None:
+                self._count("res_cache_hit")
+                self._count("quota_saved")
+                return cached
+            self._count("res_cache_miss")
+
+        # Singleflight: identical concurrent calls share one upstream request.
+        task = self._inflight.get(flight_key)
+        if task is not None:
+            self._count("coalesced_waiters")
+            if auth_mode == "res":
+                self._count("quota_saved")
+            elif auth_mode == "meta":
+                self._note_prefetch_use(cache_key)
+            ticket = self._flight_tickets.get(flight_key)
+            if ticket is not None:
+                # A user joining a queued prefetch must not wait behind background work.
+                self._gate.promote(ticket, priority, self._deadline(priority))
+        else:
+            task = self._start_flight(
+                flight_key, endpoint, auth_mode, params, cache_key, app_id, self._ticket(tenant, priority)
+            )
+        return await self._await_flight(flight_key, task, auth_mode)
 
+    async def _await_flight(self, flight_key: str, task: "asyncio.Future[Any]", auth_mode: str) -> Any:
+        """Wait for a shared flight; a META flight is aborted once every waiter has been cancelled."""
+        self._flight_waiters[flight_key] = self._flight_waiters.get(flight_key, 0) + 1
         try:
-            started_at = time.perf_counter()
-            async with self._request_semaphore:
-                response = await self.client.get(f"{self.base_url}{endpoint}", headers=headers, params=params)
-            response.raise_for_status()
-            self._metrics["latency_ms_sum"] += (time.perf_counter() - started_at) * 1000
-            data = response.json()
-            if auth_mode == "meta" and cache_key:
-                if len(self._meta_cache) >= self._meta_cache_max:
-                    oldest = min(self._meta_cache, key=lambda k: self._meta_cache[k][0])
-                    self._meta_cache.pop(oldest, None)
-                self._meta_cache[cache_key] = (time.time(), data)
-            return data
-        except httpx.RequestError as e:
-            self._metrics["request_errors"] += 1
-            logger.error("API request failed: %s", e)
+            # Shield so that one cancelled caller does not cancel the request for the others.
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # RES calls may already be billed upstream, so only META work is dropped.
+            if auth_mode == "meta" and self._flight_waiters.get(flight_key) == 1 and not task.done():
+                task.cancel()
+                self._count("flights_abandoned")
+            raise
+        finally:
+            remaining = self._flight_waiters.get(flight_key, 1) - 1
+            if remaining > 0:
+                self._flight_waiters[flight_key] = remaining
+            else:
+                self._flight_waiters.pop(flight_key, None)
+
+    def _deadline(self, priority: str) -> Optional[float]:
+        seconds = self._deadlines[priority]
+        return time.monotonic() + seconds if seconds > 0 else None
+
+    def _ticket(self, tenant: Optional[str], priority: str) -> Ticket:
+        return Ticket(tenant, priority, self._deadline(priority))
+
+    def _start_flight(
+        self, flight_key, endpoint, auth_mode, params, cache_key, app_id=None, ticket=None
+    ) -> "asyncio.Future[Any]":
+        # A shared flight queues under the tenant that started it.
+        ticket = ticket or self._ticket(None, DEFAULT_PRIORITY)
+        task = asyncio.ensure_future(self._fetch(endpoint, auth_mode, params, cache_key, app_id, ticket))
+        self._inflight[flight_key] = task
+        self._flight_tickets[flight_key] = ticket
+        task.add_done_callback(lambda _t, k=flight_key: self._end_flight(k))
+        return task
+
+    def _end_flight(self, flight_key: str):
+        self._inflight.pop(flight_key, None)
+        self._flight_tickets.pop(flight_key, None)
+
+    async def _prefetch(self, endpoint: str, params: Optional[Dict[str, Any]], cache_key: str, flight_key: str):
+        """Warm the META cache without touching user-facing request/hit counters."""
+        if cache_key in self._meta_cache or f"meta:{cache_key}" in self._negative_cache or flight_key in self._inflight:
+            self._count("prefetch_skipped")
             return None
-        except httpx.HTTPStatusError as e:
-            status = e.response.status_code if e.response else "unknown"
-            self._metrics["http_errors"] += 1
+        self._count("prefetch_requests")
+        self._prefetched[cache_key] = None
+        while len(self._prefetched) > PREFETCH_TRACK_MAX:
+            self._prefetched.popitem(last=False)
+        task = self._start_flight(flight_key, endpoint, "meta", params, cache_key, ticket=self._ticket(None, "background"))
+        data = await self._await_flight(flight_key, task, "meta")
+        if data is None:
+            self._prefetched.pop(cache_key, None)
+        return data
+
+    def _note_prefetch_use(self, cache_key: str):
+        if self._prefetched and cache_key in self._prefetched:
+            del self._prefetched[cache_key]
+            self._count("prefetch_hits")
+
+    @staticmethod
+    def _project(endpoint: str, auth_mode: str, raw: Any, params: Optional[Dict[str, Any]]) -> Any:
+        """Turn raw META JSON into compact records; RES/USER payloads pass through unchanged."""
+        if auth_mode != "meta" or not isinstance(raw, dict):
+            return raw
+        family = endpoint_family(endpoint)
+        if family in ("search", "list"):
+            return SearchPage.from_api(raw, page=int((params or {}).get("page", 1)))
+        if family in ("movie", "tv", "person", "collection") and endpoint.strip("/").count("/") == 1:
+            return MediaItem.from_api(raw, default_media_type=family)
+        return raw
+
+    @staticmethod
+    def _is_empty_result(endpoint: str, auth_mode: str, data: Any) -> bool:
+        """Empty search pages and empty resource lists are cached as negative results."""
+        if isinstance(data, SearchPage):
+            return not data.items
+        if auth_mode == "res" and isinstance(data, dict):
+            # /movie/1/115 -> "115", /tv/1/season/1/magnet -> "magnet"
+            return not data.get(endpoint.rstrip("/").rsplit("/", 1)[-1])
+        return False
+
+    def _index_records(self, data: Any):
+        """Feed fresh search/detail records into the local index without delaying the caller."""
+        items = data.items if isinstance(data, SearchPage) else [data] if isinstance(data, MediaItem) else None
+        if not items:
+            return
+        task = asyncio.ensure_future(self.search_index.add_items(items))
+        self._index_tasks.add(task)
+        task.add_done_callback(self._index_tasks.discard)
+
+    async def search_local(self, query: str, limit: int = 20, media_type: Optional[str] = None) -> List[MediaItem]:
+        """从本地索引即时查询曾经见过的条目（不访问上游）"""
+        items = await self.search_index.search(query, limit=limit, media_type=media_type)
+        self._count("local_search_hit" if items else "local_search_miss")
+        return items
+
+    def inflight_count(self) -> int:
+        return len(self._inflight)
+
+    async def _fetch(
+        self,
+        endpoint: str,
+        auth_mode: str,
+        params: Optional[Dict[str, Any]],
+        cache_key: str,
+        app_id: Optional[str] = None,
+        ticket: Optional[Ticket] = None,
+    ):
+        attempt = 0
+        while True:
+            retry_after: Optional[float] = None
+            error: Exception
+            try:
+                if auth_mode == "meta" and self._hedge_enabled:
+                    response = await self._send_hedged(endpoint, auth_mode, params, ticket)
+                else:
+                    response = await self._send_once(endpoint, auth_mode, params, app_id, ticket)
+                data = self._project(endpoint, auth_mode, response.json(), params)
+                size = data.approx_size() if isinstance(data, (MediaItem, SearchPage)) else len(response.content)
+                used_app_id = response.request.headers.get("X-APP-ID")
+                if auth_mode == "res":
+                    self.quota_ledger.record_spend(used_app_id)
+                elif auth_mode == "user" and endpoint == "/user/info" and isinstance(data, dict):
+                    self.quota_ledger.update_from_info(used_app_id, data)
+                negative_key = f"{auth_mode}:{cache_key}"
+                if auth_mode in ("meta", "res") and self._is_empty_result(endpoint, auth_mode, data):
+                    self._negative_cache.put(negative_key, data, self._negative_ttl, size=size)
+                    return data
+                self._negative_cache.pop(negative_key)
+                if auth_mode == "meta":
+                    self._index_records(data)
+                    ttl = self._meta_family_ttl.get(endpoint_family(endpoint), self._meta_ttl)
+                    self._meta_cache.put(cache_key, data, ttl, size=size)
+                elif auth_mode == "res" and isinstance(data, dict):
+                    await self._res_cache.put(cache_key, data)
+                return data
+            except DeadlineExceeded:
+                # Nobody is waiting for this any more: drop it, and cache nothing.
+                logger.info("API request to %s dropped: %s deadline passed in queue", endpoint, ticket.priority)
+                return None
+            except httpx.RequestError as e:
+                self._count("request_errors")
+                error = e
+                logger.warning("API request failed (attempt %s): %s", attempt + 1, e)
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                self._count("http_errors")
+                if status == 429:
+                    self._count("http_429")
+                    retry_after = parse_retry_after(e.response)
+                error = e
+                if status == 404 and auth_mode in ("meta", "res"):
+                    self._negative_cache.put(f"{auth_mode}:{cache_key}", NOT_FOUND, self._negative_ttl)
+                    logger.info("API %s not found (404), cached as negative", endpoint)
+                    return None
+                logger.warning("API HTTP status error (%s, attempt %s): %s", status, attempt + 1, e)
+
+            if not self._retry_policy.should_retry(attempt, auth_mode, error, retry_after):
+                logger.error("API request to %s gave up after %s attempt(s): %s", endpoint, attempt + 1, error)
+                return None
+            delay = self._retry_policy.backoff(attempt)
+            if retry_after and not self._scheduler.has_available():
+                # No other key can take over, so wait out the upstream penalty.
+                delay = max(delay, retry_after)
+            attempt += 1
+            self._count("retries")
+            await asyncio.sleep(delay)
+
+    async def _send_once(
+        self,
+        endpoint: str,
+        auth_mode: str,
+        params: Optional[Dict[str, Any]],
+        app_id: Optional[str] = None,
+        ticket: Optional[Ticket] = None,
+    ) -> httpx.Response:
+        """Send one upstream request with a scheduled credential; raises on HTTP errors."""
+        credential = await self._get_credentials(auth_mode, app_id)
+
+        headers = {"X-APP-ID": credential.app_id}
+        if auth_mode in ("res", "user"):
+            headers["X-API-KEY"] = credential.api_key
+
+        family = endpoint_family(endpoint, auth_mode)
+        status: Optional[int] = None
+        retry_after: Optional[float] = None
+        elapsed_ms = 0.0
+        try:
+            self._count("upstream_calls")
+            async with self._gate.slot(ticket or self._ticket(None, DEFAULT_PRIORITY)):
+                started_at = time.perf_counter()
+                try:
+                    response = await self._client_for(auth_mode).get(f"{self.base_url}{endpoint}", headers=headers, params=params)
+                except httpx.RequestError:
+                    self.stats.observe(family, None, "error")
+                    raise
+                elapsed_ms = (time.perf_counter() - started_at) * 1000
+            status = response.status_code
+            self.stats.observe(family, elapsed_ms, str(status))
             if status == 429:
-                self._metrics["http_429"] += 1
-            logger.error("API HTTP status error (%s): %s", status, e)
+                retry_after = parse_retry_after(response)
+            response.raise_for_status()
+            self._metrics["latency_ms_sum"] += elapsed_ms
+            if auth_mode == "meta":
+                self._meta_latencies.append(elapsed_ms)
+            return response
+        except (asyncio.CancelledError, DeadlineExceeded):
+            # A cancelled hedge or a request dropped in the queue says nothing about the key's health.
+            self._scheduler.abandon(credential)
+            credential = None
+            raise
+        finally:
+            if credential is not None:
+                self._scheduler.release(credential, status, elapsed_ms, retry_after)
+
+    def _client_for(self, auth_mode: str) -> httpx.AsyncClient:
+        return self._clients["meta" if auth_mode == "meta" else "res"]
+
+    async def warm_up(self):
+        """预先解析 DNS 并建立连接（TLS 握手），避免重启后的首个请求承担建连耗时"""
+        started_at = time.perf_counter()
+        jobs = [
+            client.head(self.base_url)
+            for client in self._clients.values()
+            for _ in range(max(1, self._warmup_connections))
+        ]
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        failed = [r for r in results if isinstance(r, Exception)]
+        if failed:
+            logger.warning("Upstream warm-up: %s/%s connections failed: %s", len(failed), len(jobs), failed[0])
+        else:
+            logger.info("Upstream warm-up: %s connections in %.0fms", len(jobs), (time.perf_counter() - started_at) * 1000)
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, derived from the recent META p95 latency."""
+        samples = self._meta_latencies
+        if len(samples) < self._hedge_min_samples:
             return None
+        ordered = sorted(samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return max(self._hedge_min_delay_ms, p95) / 1000
+
+    async def _send_hedged(
+        self, endpoint: str, auth_mode: str, params: Optional[Dict[str, Any]], ticket: Optional[Ticket] = None
+    ) -> httpx.Response:
+        """Send a META request and, if it is slower than p95, race a second copy against it."""
+        delay = self._hedge_delay()
+        primary = asyncio.ensure_future(self._send_once(endpoint, auth_mode, params, ticket=ticket))
+        if delay is None:
+            return await primary
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+            self._count("hedges_sent")
+            hedge = asyncio.ensure_future(self._send_once(endpoint, auth_mode, params, ticket=ticket))
+            pending.add(hedge)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count("hedges_won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
 
     def get_metrics_snapshot(self, reset: bool = False) -> Dict[str, Any]:
         data = dict(self._metrics)
-        total_for_avg = data["requests_total"] - data["meta_cache_hit"]
-        data["latency_ms_avg"] = round((data["latency_ms_sum"] / total_for_avg), 2) if total_for_avg > 0 else 0.0
         data["meta_cache_size"] = len(self._meta_cache)
+        data["meta_cache_bytes"] = self._meta_cache.bytes
+        data["meta_cache_evictions"] = self._meta_cache.evictions
+        data["res_cache_size"] = self._res_cache.size()
+        data["negative_cache_size"] = len(self._negative_cache)
+        data["inflight"] = len(self._inflight)
+        data.update(self._dns.stats())
+        data.update(self.search_index.stats())
+        data.update(self._gate.stats())
+        add_derived_metrics(data)
+        data["latency_percentiles"] = self.stats.percentiles()
         if reset:
-            self._metrics = {
-                "requests_total": 0,
-                "requests_meta": 0,
-                "requests_res": 0,
-                "requests_user": 0,
-                "meta_cache_hit": 0,
-                "meta_cache_miss": 0,
-                "http_429": 0,
-                "http_errors": 0,
-                "request_errors": 0,
-                "latency_ms_sum": 0.0,
-            }
+            self._metrics = self._new_metrics()
         return data
 
+    def render_prometheus(self) -> str:
+        """Prometheus 文本格式的累计指标（不受 get_metrics_snapshot(reset=True) 影响）。"""
+        gauges = {
+            "meta_cache_entries": len(self._meta_cache),
+            "meta_cache_bytes": self._meta_cache.bytes,
+            "res_cache_entries": self._res_cache.size(),
+            "inflight_requests": len(self._inflight),
+            "dns_cache_entries": self._dns.stats()["dns_cache_size"],
+            "search_index_entries": self.search_index.size(),
+        }
+        for state in self._scheduler.snapshot():
+            gauges[f'credential_cooldown_seconds{{app_id="{state["app_id"]}"}}'] = state["cooldown_left"]
+            gauges[f'credential_inflight{{app_id="{state["app_id"]}"}}'] = state["inflight"]
+        gate = self._gate.stats()
+        for name in PRIORITIES:
+            gauges[f'gate_queue_depth{{priority="{name}"}}'] = gate[f"gate_{name}_queue"]
+            gauges[f'gate_wait_ms_avg{{priority="{name}"}}'] = gate[f"gate_{name}_wait_ms_avg"]
+            gauges[f'gate_expired{{priority="{name}"}}'] = gate[f"gate_{name}_expired"]
+        return self.stats.render_prometheus(gauges=gauges)
+
     # --- META APIs ---
-    async def search(self, query, page=1):
-        """搜索影视"""
-        return await self._request("/search", params={"query": query, "page": page})
+    async def search(self, query, page=1, prefetch=False, tenant=None, priority=None):
+        """搜索影视（tenant 为发起请求的会话，priority 为调度类别：interactive/inline/admin/background）"""
+        return await self._request(
+            "/search", params={"query": query, "page": page}, prefetch=prefetch, tenant=tenant, priority=priority
+        )
         
-    async def get_movie_info(self, tmdbid):
+    async def get_list(self, listid, page=1, prefetch=False, tenant=None, priority=None):
+        """获取片单"""
+        return await self._request(
+            f"/list/{listid}", params={"page": page}, prefetch=prefetch, tenant=tenant, priority=priority
+        )
+
+    def iter_search_pages(
+        self, query, start_page=1, max_pages=None, tenant=None, priority=None
+    ) -> AsyncIterator[SearchPage]:
+        """逐页迭代搜索结果（预读下一页），最多 max_pages 页"""
+        max_pages = self._iter_max_pages if max_pages is None else max_pages
+        return iter_pages(
+            lambda page: self.search(query, page=page, tenant=tenant, priority=priority), start_page, max_pages
+        )
+
+    def iter_search(self, query, start_page=1, max_pages=None, max_items=None) -> AsyncIterator[MediaItem]:
+        """跨页逐条迭代搜索结果，受 max_pages / max_items 预算约束"""
+        max_items = self._iter_max_items if max_items is None else max_items
+        return iter_items(self.iter_search_pages(query, start_page, max_pages), max_items)
+
+    def iter_list_pages(
+        self, listid, start_page=1, max_pages=None, tenant=None, priority=None
+    ) -> AsyncIterator[SearchPage]:
+        """逐页迭代片单（预读下一页），最多 max_pages 页"""
+        max_pages = self._iter_max_pages if max_pages is None else max_pages
+        return iter_pages(
+            lambda page: self.get_list(listid, page=page, tenant=tenant, priority=priority), start_page, max_pages
+        )
+
+    def iter_list(self, listid, start_page=1, max_pages=None, max_items=None) -> AsyncIterator[MediaItem]:
+        """跨页逐条迭代片单条目，受 max_pages / max_items 预算约束"""
+        max_items = self._iter_max_items if max_items is None else max_items
+        return iter_items(self.iter_list_pages(listid, start_page, max_pages), max_items)
+
+    async def get_movie_info(self, tmdbid, prefetch=False, tenant=None, priority=None):
         """获取电影信息"""
-        return await self._request(f"/movie/{tmdbid}")
+        return await self._request(f"/movie/{tmdbid}", prefetch=prefetch, tenant=tenant, priority=priority)
         
-    async def get_tv_info(self, tmdbid):
+    async def get_tv_info(self, tmdbid, prefetch=False, tenant=None, priority=None):
         """获取剧集信息"""
-        return await self._request(f"/tv/{tmdbid}")
+        return await self._request(f"/tv/{tmdbid}", prefetch=prefetch, tenant=tenant, priority=priority)
         
-    async def get_person_info(self, tmdbid):
+    async def get_person_info(self, tmdbid, prefetch=False, tenant=None, priority=None):
         """获取人物信息"""
-        return await self._request(f"/person/{tmdbid}")
+        return await self._request(f"/person/{tmdbid}", prefetch=prefetch, tenant=tenant, priority=priority)
         
-    async def get_collection_info(self, tmdbid):
+    async def get_collection_info(self, tmdbid, prefetch=False, tenant=None, priority=None):
         """获取合集信息"""
-        return await self._request(f"/collection/{tmdbid}")
+        return await self._request(f"/collection/{tmdbid}", prefetch=prefetch, tenant=tenant, priority=priority)
 
     # --- RES APIs ---
-    async def get_movie_115(self, tmdbid):
+    async def get_movie_115(self, tmdbid, tenant=None, priority=None):
         """获取电影115网盘资源"""
-        return await self._request(f"/movie/{tmdbid}/115", auth_mode="res")
+        return await self._request(f"/movie/{tmdbid}/115", auth_mode="res", tenant=tenant, priority=priority)
         
-    async def get_movie_magnet(self, tmdbid):
+    async def get_movie_magnet(self, tmdbid, tenant=None, priority=None):
         """获取电影磁力资源"""
-        return await self._request(f"/movie/{tmdbid}/magnet", auth_mode="res")
+        return await self._request(f"/movie/{tmdbid}/magnet", auth_mode="res", tenant=tenant, priority=priority)
 
-    async def get_tv_115(self, tmdbid):
+    async def get_tv_115(self, tmdbid, tenant=None, priority=None):
         """获取剧集115网盘资源"""
-        return await self._request(f"/tv/{tmdbid}/115", auth_mode="res")
+        return await self._request(f"/tv/{tmdbid}/115", auth_mode="res", tenant=tenant, priority=priority)
 
-    async def get_tv_season_magnet(self, tmdbid, season_num):
+    async def get_tv_season_magnet(self, tmdbid, season_num, tenant=None, priority=None):
         """获取剧集整季磁力资源"""
-        return await self._request(f"/tv/{tmdbid}/season/{season_num}/magnet", auth_mode="res")
+        return await self._request(
+            f"/tv/{tmdbid}/season/{season_num}/magnet", auth_mode="res", tenant=tenant, priority=priority
+        )
 
-    async def get_tv_episode_magnet(self, tmdbid, season_num, episode_num):
+    async def get_tv_episode_magnet(self, tmdbid, season_num, episode_num, tenant=None, priority=None):
         """获取剧集单集磁力资源"""
         return await self._request(
             f"/tv/{tmdbid}/season/{season_num}/episode/{episode_num}/magnet",
             auth_mode="res",
+            tenant=tenant,
+            priority=priority,
         )
         
-    async def get_user_info(self):
-        """获取用户信息（订阅及配额）"""
-        return await self._request("/user/info", auth_mode="user")
+    async def get_user_info(self, app_id: Optional[str] = None):
+        """获取用户信息（订阅及配额），可指定 AppID 查询接口池中的某个 Key"""
+        return await self._request("/user/info", auth_mode="user", app_id=app_id)
             
     async def close(self):
         """关闭 HTTPX 客户端"""
-        await self.client.aclose()
+        tasks = [task for task in (self._sweeper_task, self._quota_task) if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for client in self._clients.values():
+            await client.aclose()
+        if self._index_tasks:
+            await asyncio.gather(*self._index_tasks, return_exceptions=True)
+        self._res_cache.close()
+        self.search_index.close()
@@ -0,0 +1,214 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first. Pass e.g. ``rate_limit_args=PRIORITY_BULK`` to a bot method to override.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_NORMAL: "normal", PRIORITY_BULK: "bulk"}
+
+# Only message-producing calls count against Telegram's flood limits.
+THROTTLED_PREFIXES = ("send", "edit", "copy", "forward")
+CHAT_IDLE_TTL = 120.0
+
+
+def _retry_after_seconds(exc: RetryAfter) -> float:
+    value = exc.retry_after
+    return float(value.total_seconds()) if hasattr(value, "total_seconds") else float(value)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated_at", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, now: Optional[float] = None) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        blocked = max(0.0, self.blocked_until - now)
+        if self.tokens >= 1:
+            return blocked
+        return max(blocked, (1 - self.tokens) / self.rate)
+
+    def take(self):
+        self.tokens -= 1
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+
+class OutboundDispatcher(BaseRateLimiter[int]):
+    """Telegram 出站调度：全局与按会话令牌桶、自动处理 RetryAfter，并让交互式编辑优先于批量通知。"""
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        group_per_minute: float = 20.0,
+        group_burst: float = 5.0,
+        max_retries: int = 3,
+    ):
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._group_rate = group_per_minute / 60
+        self._group_burst = group_burst
+        self._max_retries = max(0, max_retries)
+        self._chats: Dict[Union[int, str], TokenBucket] = {}
+        self._chat_locks: Dict[Union[int, str], asyncio.Lock] = {}
+        self._waiters: List[Tuple[int, int, "asyncio.Future[None]"]] = []
+        self._seq = itertools.count()
+        self._pump_task: Optional["asyncio.Task[None]"] = None
+        self._chat_waiting = 0
+        self._waits_ms: "deque[float]" = deque(maxlen=500)
+        self._last_prune = time.monotonic()
+        self._stats: Dict[str, Any] = {"tg_sent": 0, "tg_flood_waits": 0, "tg_retries": 0, "tg_failed": 0}
+        for name in PRIORITY_NAMES.values():
+            self._stats[f"tg_sent_{name}"] = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self._pump_task:
+            self._pump_task.cancel()
+            self._pump_task = None
+        for _, _, fut in self._waiters:
+            fut.cancel()
+        self._waiters.clear()
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Negative ids and @usernames are groups/channels, which have a per-minute limit.
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            bucket = self._chats[chat_id] = (
+                TokenBucket(self._group_rate, self._group_burst) if is_group else TokenBucket(self._chat_rate, self._chat_burst)
+            )
+        return bucket
+
+    def _prune(self, now: float):
+        if now - self._last_prune < CHAT_IDLE_TTL:
+            return
+        self._last_prune = now
+        for chat_id in [c for c, b in self._chats.items() if b.idle(now) and not self._chat_locks.get(c, asyncio.Lock()).locked()]:
+            self._chats.pop(chat_id, None)
+            self._chat_locks.pop(chat_id, None)
+
+    async def _acquire_chat(self, chat_id: Union[int, str]):
+        lock = self._chat_locks.setdefault(chat_id, asyncio.Lock())
+        self._chat_waiting += 1
+        try:
+            async with lock:
+                bucket = self._chat_bucket(chat_id)
+                while True:
+                    wait = bucket.wait_time()
+                    if wait <= 0:
+                        bucket.take()
+                        return
+                    await asyncio.sleep(wait)
+        finally:
+            self._chat_waiting -= 1
+
+    async def _acquire_global(self, priority: int):
+        if not self._waiters and self._global.wait_time() <= 0:
+            self._global.take()
+            return
+        fut: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+        await fut
+
+    async def _pump(self):
+        """Hand out global tokens to queued requests in priority order."""
+        while self._waiters:
+            wait = self._global.wait_time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            _, _, fut = heapq.heappop(self._waiters)
+            if fut.done():
+                continue
+            self._global.take()
+            fut.set_result(None)
+
+    @staticmethod
+    def _default_priority(endpoint: str) -> int:
+        return PRIORITY_INTERACTIVE if endpoint.startswith("edit") else PRIORITY_NORMAL
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        throttled = endpoint.startswith(THROTTLED_PREFIXES)
+        priority = rate_limit_args if isinstance(rate_limit_args, int) else self._default_priority(endpoint)
+        chat_id = data.get("chat_id") if throttled else None
+        if isinstance(chat_id, str) and chat_id.lstrip("-").isdigit():
+            chat_id = int(chat_id)
+
+        for attempt in range(self._max_retries + 1):
+            started = time.monotonic()
+            if throttled:
+                self._prune(started)
+                if chat_id is not None:
+                    await self._acquire_chat(chat_id)
+                await self._acquire_global(priority)
+                self._waits_ms.append((time.monotonic() - started) * 1000)
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as exc:
+                delay = _retry_after_seconds(exc)
+                self._stats["tg_flood_waits"] += 1
+                # Block the chat that was flooded (or everything, for chat-less calls) for the advised time.
+                target = self._chat_bucket(chat_id) if chat_id is not None else self._global
+                target.blocked_until = max(target.blocked_until, time.monotonic() + delay)
+                if attempt == self._max_retries:
+                    self._stats["tg_failed"] += 1
+                    logger.warning("Telegram flood wait on %s persisted after %s retries", endpoint, attempt)
+                    raise
+                self._stats["tg_retries"] += 1
+                logger.info("Telegram flood wait %.1fs on %s (chat %s), retrying", delay, endpoint, chat_id)
+                if not throttled:
+                    await asyncio.sleep(delay)
+                continue
+            if throttled:
+                self._stats["tg_sent"] += 1
+                self._stats[f"tg_sent_{PRIORITY_NAMES.get(priority, 'normal')}"] += 1
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        data = dict(self._stats)
+        waits = sorted(self._waits_ms)
+        data["tg_queue_depth"] = len(self._waiters) + self._chat_waiting
+        data["tg_wait_ms_avg"] = round(sum(waits) / len(waits), 1) if waits else 0.0
+        data["tg_wait_ms_p95"] = round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 1) if waits else 0.0
+        data["tg_chats_tracked"] = len(self._chats)
+        return data
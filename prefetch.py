@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from records import MediaItem
+
+logger = logging.getLogger(__name__)
+
+DETAIL_FETCHERS = {
+    "movie": "get_movie_info",
+    "tv": "get_tv_info",
+    "person": "get_person_info",
+    "collection": "get_collection_info",
+}
+
+
+class Prefetcher:
+    """搜索结果页渲染后的低优先级预取：预热前 N 个条目的详情与下一页。"""
+
+    def __init__(
+        self,
+        api,
+        top_n: int = 3,
+        max_queue: int = 32,
+        per_minute: int = 60,
+        idle_inflight: int = 4,
+        max_age: float = 10.0,
+        enabled: bool = True,
+    ):
+        self.api = api
+        self.top_n = max(0, top_n)
+        self.max_queue = max(1, max_queue)
+        self.per_minute = max(1, per_minute)
+        self.idle_inflight = max(1, idle_inflight)
+        self.max_age = max_age
+        self.enabled = enabled
+        self._queue: Optional["asyncio.Queue[Tuple[float, Tuple[Any, ...]]]"] = None
+        self._pending: set = set()
+        self._worker: Optional["asyncio.Task[None]"] = None
+        self._tokens = float(self.per_minute)
+        self._tokens_at = time.monotonic()
+        self._stats = {"prefetch_scheduled": 0, "prefetch_dropped": 0, "prefetch_expired": 0, "prefetch_done": 0}
+
+    def start(self):
+        if not self.enabled or (self._worker and not self._worker.done()):
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def schedule_search_page(self, query: str, page: int, items: Iterable[MediaItem]):
+        """Queue details for the top N items of a rendered page and the next page of the same query."""
+        if not self.enabled or self._queue is None:
+            return
+        for item in list(items)[: self.top_n]:
+            if item.media_type in DETAIL_FETCHERS and item.tmdbid:
+                self._enqueue(("detail", item.media_type, item.tmdbid))
+        self._enqueue(("search", query, page + 1))
+
+    def _enqueue(self, job: Tuple[Any, ...]):
+        if job in self._pending:
+            return
+        try:
+            self._queue.put_nowait((time.monotonic(), job))
+        except asyncio.QueueFull:
+            self._stats["prefetch_dropped"] += 1
+            return
+        self._pending.add(job)
+        self._stats["prefetch_scheduled"] += 1
+
+    def _take_token(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self.per_minute, self._tokens + (now - self._tokens_at) * self.per_minute / 60)
+        self._tokens_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def _run(self):
+        while True:
+            queued_at, job = await self._queue.get()
+            try:
+                # Stay out of the way of interactive traffic: wait for an idle moment.
+                while self.api.inflight_count() >= self.idle_inflight or not self._take_token():
+                    if time.monotonic() - queued_at > self.max_age:
+                        break
+                    await asyncio.sleep(0.1)
+                if time.monotonic() - queued_at > self.max_age:
+                    self._stats["prefetch_expired"] += 1
+                    continue
+                await self._execute(job)
+                self._stats["prefetch_done"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug("prefetch %s failed: %s", job, e)
+            finally:
+                self._pending.discard(job)
+                self._queue.task_done()
+
+    async def _execute(self, job: Tuple[Any, ...]):
+        if job[0] == "search":
+            _, query, page = job
+            await self.api.search(query, page=page, prefetch=True)
+        else:
+            _, media_type, tmdbid = job
+            await getattr(self.api, DETAIL_FETCHERS[media_type])(tmdbid, prefetch=True)
+
+    def stats(self) -> Dict[str, Any]:
+        data = dict(self._stats)
+        data["prefetch_queue"] = self._queue.qsize() if self._queue else 0
+        return data
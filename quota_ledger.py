@@ -0,0 +1,116 @@
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+def _to_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_timestamp(value: Any) -> Optional[float]:
+    if value in (None, ""):
+        return None
+    if isinstance(value, (int, float)):
+        # Accept both seconds and milliseconds since epoch.
+        return float(value) / 1000 if value > 1e12 else float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def parse_quota_info(data: Dict[str, Any]) -> Tuple[Any, Any, Any]:
+    """从 /user/info 响应中提取 (套餐, 总配额, 剩余配额)，字段名兼容多种写法。"""
+    plan = data.get("plan") or data.get("subscription") or "未知"
+    total = data.get("limit") or data.get("total") or data.get("quota_total") or "未知"
+    remain = data.get("remaining")
+    if remain is None:
+        remain = data.get("left")
+    if remain is None:
+        remain = data.get("quota_left")
+    return plan, total, "未知" if remain is None else remain
+
+
+class QuotaEntry:
+    __slots__ = ("app_id", "plan", "total", "remaining", "synced_at", "spent_since_sync", "reset_at", "error")
+
+    def __init__(self, app_id: str):
+        self.app_id = app_id
+        self.plan: Any = None
+        self.total: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.synced_at = 0.0
+        self.spent_since_sync = 0
+        self.reset_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+
+class QuotaLedger:
+    """本地的每 Key 配额账本：定期用 /user/info 校准，每次 RES 调用本地扣减。"""
+
+    def __init__(self):
+        self._entries: Dict[str, QuotaEntry] = {}
+
+    def _entry(self, app_id: str) -> QuotaEntry:
+        entry = self._entries.get(app_id)
+        if entry is None:
+            entry = self._entries[app_id] = QuotaEntry(app_id)
+        return entry
+
+    def retain(self, app_ids: Iterable[str]):
+        """Forget keys that are no longer in the pool."""
+        keep = set(app_ids)
+        for app_id in list(self._entries):
+            if app_id not in keep:
+                del self._entries[app_id]
+
+    def update_from_info(self, app_id: str, data: Dict[str, Any]):
+        entry = self._entry(app_id)
+        plan, total, remain = parse_quota_info(data)
+        entry.plan = plan
+        entry.total = _to_int(total)
+        entry.remaining = _to_int(remain)
+        entry.reset_at = _to_timestamp(data.get("reset_at") or data.get("reset_time") or data.get("expire_at"))
+        entry.synced_at = time.time()
+        entry.spent_since_sync = 0
+        entry.error = None
+
+    def mark_error(self, app_id: str, message: str):
+        self._entry(app_id).error = message
+
+    def record_spend(self, app_id: str, amount: int = 1):
+        entry = self._entry(app_id)
+        entry.spent_since_sync += amount
+        if entry.remaining is not None:
+            entry.remaining = max(0, entry.remaining - amount)
+
+    def remaining(self, app_id: str) -> Optional[int]:
+        entry = self._entries.get(app_id)
+        return entry.remaining if entry else None
+
+    def is_exhausted(self, app_id: str, now: Optional[float] = None) -> bool:
+        entry = self._entries.get(app_id)
+        if entry is None or entry.remaining is None or entry.remaining > 0:
+            return False
+        now = time.time() if now is None else now
+        # Once the announced reset time has passed, let the key be tried again.
+        return entry.reset_at is None or now < entry.reset_at
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        return [
+            {
+                "app_id": e.app_id,
+                "plan": e.plan if e.plan is not None else "未知",
+                "total": e.total if e.total is not None else "未知",
+                "remaining": e.remaining if e.remaining is not None else "未知",
+                "spent_since_sync": e.spent_since_sync,
+                "synced_ago": round(now - e.synced_at) if e.synced_at else None,
+                "exhausted": self.is_exhausted(e.app_id, now),
+                "error": e.error,
+            }
+            for e in self._entries.values()
+        ]
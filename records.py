@@ -0,0 +1,161 @@
+import sys
+from typing import Any, Dict, List, Optional, Sequence
+
+# Longest overview any view renders (detail page); inline results slice further.
+OVERVIEW_MAX = 300
+# Rough per-object overhead used by approx_size(); only relative sizes matter.
+_OBJECT_OVERHEAD = 56
+_SLOT_OVERHEAD = 8
+
+
+def _str_or_empty(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+class MediaItem:
+    """搜索结果或详情接口的精简记录：只保留界面实际使用的字段，简介在入库时截断一次。"""
+
+    __slots__ = ("name", "tmdbid", "release_date", "media_type", "overview", "overview_truncated", "poster", "vote")
+
+    def __init__(
+        self,
+        name: str,
+        tmdbid: str,
+        release_date: str = "",
+        media_type: str = "movie",
+        overview: str = "",
+        overview_truncated: bool = False,
+        poster: str = "",
+        vote: Any = 0,
+    ):
+        self.name = name
+        self.tmdbid = tmdbid
+        self.release_date = release_date
+        self.media_type = media_type
+        self.overview = overview
+        self.overview_truncated = overview_truncated
+        self.poster = poster
+        self.vote = vote
+
+    @classmethod
+    def from_api(cls, raw: Dict[str, Any], default_media_type: str = "movie") -> "MediaItem":
+        overview = _str_or_empty(raw.get("overview"))
+        truncated = len(overview) > OVERVIEW_MAX
+        return cls(
+            name=_str_or_empty(raw.get("name") or raw.get("title")) or "未知",
+            tmdbid=_str_or_empty(raw.get("tmdbid") or raw.get("id")),
+            release_date=_str_or_empty(raw.get("release_date") or raw.get("first_air_date")),
+            media_type=sys.intern(str(raw.get("media_type") or default_media_type).lower()),
+            overview=overview[:OVERVIEW_MAX],
+            overview_truncated=truncated,
+            poster=_str_or_empty(raw.get("poster") or raw.get("poster_path")),
+            vote=raw.get("vote") or raw.get("vote_average") or 0,
+        )
+
+    @property
+    def year(self) -> str:
+        return self.release_date[:4] if self.release_date else "未知年份"
+
+    def short_overview(self, limit: int) -> str:
+        """Overview cut to ``limit`` chars with an ellipsis if anything was dropped."""
+        if len(self.overview) > limit:
+            return self.overview[:limit] + "..."
+        return self.overview + ("..." if self.overview_truncated else "")
+
+    def poster_url(self, size: str = "w500") -> str:
+        if self.poster and not self.poster.startswith("http"):
+            return f"https://image.tmdb.org/t/p/{size}{self.poster}"
+        return self.poster
+
+    def approx_size(self) -> int:
+        return (
+            _OBJECT_OVERHEAD
+            + _SLOT_OVERHEAD * len(self.__slots__)
+            + sum(len(getattr(self, f)) for f in ("name", "tmdbid", "release_date", "overview", "poster")) * 2
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {f: getattr(self, f) for f in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MediaItem":
+        return cls(**{f: data[f] for f in cls.__slots__ if f in data})
+
+    def __repr__(self) -> str:
+        return f"MediaItem({self.media_type}:{self.tmdbid} {self.name!r})"
+
+
+class SearchPage:
+    """一页搜索 / 片单结果（片单额外带标题）。"""
+
+    __slots__ = ("items", "page", "total_pages", "total_results", "title", "_by_type")
+
+    def __init__(
+        self,
+        items: List[MediaItem],
+        page: int = 1,
+        total_pages: Optional[int] = None,
+        total_results: Optional[int] = None,
+        title: str = "",
+    ):
+        self.items = items
+        self.page = page
+        self.total_pages = total_pages
+        self.total_results = total_results
+        self.title = title
+        self._by_type: Optional[Dict[str, List[int]]] = None
+
+    def indexes_for(self, media_type: str) -> Sequence[int]:
+        """Positions of the items of one media type ("all" = every item); built once per page."""
+        if media_type == "all":
+            return range(len(self.items))
+        if self._by_type is None:
+            by_type: Dict[str, List[int]] = {}
+            for idx, item in enumerate(self.items):
+                by_type.setdefault(item.media_type, []).append(idx)
+            self._by_type = by_type
+        return self._by_type.get(media_type, [])
+
+    def has_next(self) -> bool:
+        return bool(self.items) and (self.total_pages is None or self.page < int(self.total_pages))
+
+    @classmethod
+    def from_api(cls, raw: Dict[str, Any], page: int = 1) -> "SearchPage":
+        items = [MediaItem.from_api(x) for x in raw.get("items") or [] if isinstance(x, dict)]
+        return cls(
+            items=items,
+            page=int(raw.get("page") or page),
+            total_pages=raw.get("total_pages") or raw.get("total_page"),
+            total_results=raw.get("total_results") or raw.get("total_items"),
+            title=_str_or_empty(raw.get("name") or raw.get("title")),
+        )
+
+    def approx_size(self) -> int:
+        return (
+            _OBJECT_OVERHEAD
+            + _SLOT_OVERHEAD * (len(self.items) + len(self.__slots__))
+            + len(self.title) * 2
+            + sum(i.approx_size() for i in self.items)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "items": [i.to_dict() for i in self.items],
+            "page": self.page,
+            "total_pages": self.total_pages,
+            "total_results": self.total_results,
+            "title": self.title,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SearchPage":
+        return cls(
+            items=[MediaItem.from_dict(i) for i in data.get("items", [])],
+            page=data.get("page", 1),
+            total_pages=data.get("total_pages"),
+            total_results=data.get("total_results"),
+            title=data.get("title", ""),
+        )
+
+    def __len__(self) -> int:
+        return len(self.items)
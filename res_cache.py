@@ -0,0 +1,94 @@
+import json
+import logging
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+from db import AsyncSQLite
+
+logger = logging.getLogger(__name__)
+
+
+class ResCache:
+    """RES 接口响应的 SQLite 持久化缓存（资源每日仅变动 0.5%~1%，命中即节省配额）。"""
+
+    def __init__(self, path: str, ttl_hours: float = 24.0, max_entries: int = 5000):
+        self.path = path
+        self.ttl = max(0.0, float(ttl_hours)) * 3600
+        self.max_entries = max(1, int(max_entries))
+        self._db = AsyncSQLite(path)
+        self._ready = False
+        self._count = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def _ensure_schema(self, conn: sqlite3.Connection):
+        if self._ready:
+            return
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS res_cache
+               (cache_key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL)"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_res_cache_accessed ON res_cache (accessed_at)")
+        self._count = conn.execute("SELECT COUNT(*) FROM res_cache").fetchone()[0]
+        self._ready = True
+
+    def _get_sync(self, conn: sqlite3.Connection, key: str) -> Optional[Dict[str, Any]]:
+        self._ensure_schema(conn)
+        row = conn.execute("SELECT payload, created_at FROM res_cache WHERE cache_key = ?", (key,)).fetchone()
+        if not row:
+            return None
+        now = time.time()
+        if now - row[1] > self.ttl:
+            conn.execute("DELETE FROM res_cache WHERE cache_key = ?", (key,))
+            self._count = max(0, self._count - 1)
+            return None
+        conn.execute("UPDATE res_cache SET accessed_at = ? WHERE cache_key = ?", (now, key))
+        return json.loads(row[0])
+
+    def _put_sync(self, conn: sqlite3.Connection, key: str, data: Dict[str, Any]):
+        self._ensure_schema(conn)
+        payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        now = time.time()
+        cur = conn.execute("UPDATE res_cache SET payload = ?, created_at = ?, accessed_at = ? WHERE cache_key = ?", (payload, now, now, key))
+        if cur.rowcount == 0:
+            conn.execute("INSERT INTO res_cache (cache_key, payload, created_at, accessed_at) VALUES (?, ?, ?, ?)", (key, payload, now, now))
+            self._count += 1
+        if self._count > self.max_entries:
+            # Drop expired rows first, then the least recently used ones.
+            conn.execute("DELETE FROM res_cache WHERE created_at < ?", (now - self.ttl,))
+            overflow = conn.execute("SELECT COUNT(*) FROM res_cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM res_cache WHERE cache_key IN (SELECT cache_key FROM res_cache ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                )
+            self._count = conn.execute("SELECT COUNT(*) FROM res_cache").fetchone()[0]
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        try:
+            return await self._db.run(self._get_sync, key)
+        except Exception as e:
+            logger.error("Error reading RES cache: %s", e)
+            return None
+
+    async def put(self, key: str, data: Dict[str, Any]):
+        if not self.enabled:
+            return
+        try:
+            await self._db.run(self._put_sync, key, data)
+        except Exception as e:
+            logger.error("Error writing RES cache: %s", e)
+
+    def size(self) -> int:
+        return self._count
+
+    def close(self):
+        self._db.close()
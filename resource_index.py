@@ -0,0 +1,207 @@
+import base64
+import binascii
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+_SIZE_RE = re.compile(r"([\d.]+)\s*([KMGTP]?)I?B?", re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4, "P": 1024**5}
+# Unit letter of "1.5 GB" / "700 MiB" in either case -> multiplier, for the fast path in _size_bytes.
+_UNIT_FACTORS = {"": 1, **{c: f for u, f in _SIZE_UNITS.items() if u for c in (u, u.lower())}}
+# Normalized resolution for each spelling.
+_RESOLUTION_ALIASES = {
+    "2160p": "2160p",
+    "4k": "2160p",
+    "uhd": "2160p",
+    "1080p": "1080p",
+    "1080i": "1080p",
+    "720p": "720p",
+    "576p": "576p",
+    "480p": "480p",
+}
+# One precompiled scan of the lowered name instead of a substring test per alias (case-sensitive is faster).
+_RESOLUTION_RE = re.compile("|".join(_RESOLUTION_ALIASES))
+# Higher first; used to order the resolution facet.
+RESOLUTION_RANK = {"2160p": 0, "1080p": 1, "720p": 2, "576p": 3, "480p": 4}
+SORTS = ("size", "size_desc", "group")
+COLUMNS = ("resolution", "size", "quality", "group")
+
+
+def resource_link(item: Dict[str, Any]) -> str:
+    return item.get("url") or item.get("link") or item.get("share_link") or item.get("magnet") or ""
+
+
+def parse_infohash(link: str) -> Optional[str]:
+    """BitTorrent v1 infohash of a magnet link as lowercase hex (base32 hashes are converted)."""
+    pos = link.find("btih:")
+    if pos < 0:
+        return None
+    pos += 5
+    end = link.find("&", pos)
+    value = link[pos:] if end < 0 else link[pos:end]
+    if len(value) == 40:
+        return value.lower()
+    if len(value) == 32:
+        try:
+            return binascii.hexlify(base64.b32decode(value.upper())).decode()
+        except (binascii.Error, ValueError):
+            return None
+    return None
+
+
+def parse_size(value: Any) -> Optional[int]:
+    """"1.5 GB" / "700MiB" / 123456 -> bytes; None when unparseable."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    if not value:
+        return None
+    match = _SIZE_RE.search(str(value).replace(",", ""))
+    if not match:
+        return None
+    try:
+        return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+    except ValueError:
+        return None
+
+
+def parse_resolution(declared: Any, name: str) -> Optional[str]:
+    if declared:
+        text = str(declared)
+        known = _RESOLUTION_ALIASES.get(text.strip().lower())
+        if known:
+            return known
+        match = _RESOLUTION_RE.search(text.lower())
+        if match:
+            return _RESOLUTION_ALIASES[match.group()]
+    match = _RESOLUTION_RE.search(name.lower()) if name else None
+    return _RESOLUTION_ALIASES[match.group()] if match else None
+
+
+def _size_bytes(value: Any) -> Optional[int]:
+    if type(value) is str:
+        # Upstream sizes are almost always "<number> <unit>": split instead of running the regex.
+        number, _, unit = value.partition(" ")
+        factor = _UNIT_FACTORS.get(unit[:1])
+        if factor is not None:
+            try:
+                return int(float(number) * factor)
+            except (ValueError, OverflowError):
+                pass
+    return parse_size(value)
+
+
+class ResourceIndex:
+    """RES 资源列表的列式索引：按 infohash（或链接）去重，一次遍历解析体积/分辨率/质量/发布组并建立分辨率分面。"""
+
+    __slots__ = ("items", "duplicates", "resolution", "size", "quality", "group", "_facets")
+
+    def __init__(self, raw_items: Sequence[Dict[str, Any]]):
+        items: List[Dict[str, Any]] = []
+        seen = set()
+        duplicates = 0
+        for raw in raw_items:
+            if not isinstance(raw, dict):
+                continue
+            get = raw.get
+            link = get("url") or get("link") or get("share_link") or get("magnet") or ""
+            key = link
+            if link.startswith("magnet:"):
+                # Inline fast path for 40-char hex hashes; base32 and odd links go through parse_infohash.
+                value = link.partition("btih:")[2].partition("&")[0]
+                key = value.lower() if len(value) == 40 else parse_infohash(link) or link
+            key = key or (get("name") or get("title"), get("size"))
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            items.append(raw)
+        self.items = items
+        self.duplicates = duplicates
+
+        # Every column is parsed here, one comprehension per field, so sorts and facets never parse later.
+        names = [raw.get("name") or raw.get("title") or "" for raw in items]
+        search = _RESOLUTION_RE.search
+        aliases = _RESOLUTION_ALIASES
+        resolutions: List[Optional[str]] = []
+        append = resolutions.append
+        for raw, name in zip(items, names):
+            declared = raw.get("resolution")
+            if declared:
+                append(parse_resolution(declared, name))
+            else:
+                match = search(name.lower())
+                append(aliases[match.group()] if match else None)
+        self.resolution = resolutions
+        self.size: List[Optional[int]] = [_size_bytes(raw.get("size")) for raw in items]
+        self.quality: List[Tuple[str, ...]] = [
+            tuple(map(str, q)) if type(q) is list else (str(q),) if q else ()
+            for q in [raw.get("quality") for raw in items]
+        ]
+        self.group: List[Optional[str]] = [raw.get("group") or None for raw in items]
+        by_resolution: Dict[str, List[int]] = {}
+        for idx, resolution in enumerate(resolutions):
+            if resolution:
+                by_resolution.setdefault(resolution, []).append(idx)
+        self._facets: Dict[str, Dict[str, List[int]]] = {"resolution": by_resolution}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def column(self, name: str) -> List[Any]:
+        if name not in COLUMNS:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def facet(self, name: str) -> Dict[str, List[int]]:
+        """Value -> item positions for resolution, quality or group."""
+        index = self._facets.get(name)
+        if index is None:
+            index = self._facets[name] = {}
+            column = self.column(name)
+            if name == "quality":
+                for idx, values in enumerate(column):
+                    for v in values:
+                        if v:
+                            index.setdefault(v, []).append(idx)
+            else:
+                for idx, v in enumerate(column):
+                    if v:
+                        index.setdefault(v, []).append(idx)
+        return index
+
+    def facet_counts(self, name: str) -> List[Tuple[str, int]]:
+        """Values of a facet with their item counts; resolutions high to low, others by count."""
+        values = self.facet(name)
+        if name == "resolution":
+            keys = sorted(values, key=lambda v: RESOLUTION_RANK.get(v, len(RESOLUTION_RANK)))
+        else:
+            keys = sorted(values, key=lambda v: -len(values[v]))
+        return [(k, len(values[k])) for k in keys]
+
+    def select(
+        self,
+        resolution: Optional[str] = None,
+        quality: Optional[str] = None,
+        group: Optional[str] = None,
+        sort: Optional[str] = None,
+    ) -> List[int]:
+        """Item positions matching every given facet, in upstream order unless ``sort`` is set."""
+        picked: Optional[List[int]] = None
+        for name, value in (("resolution", resolution), ("quality", quality), ("group", group)):
+            if not value:
+                continue
+            positions = self.facet(name).get(value, [])
+            if picked is None:
+                picked = positions
+            else:
+                allowed = set(positions)
+                picked = [i for i in picked if i in allowed]
+        result = list(range(len(self.items))) if picked is None else list(picked)
+        if sort in ("size", "size_desc"):
+            sizes = self.size
+            sign = 1 if sort == "size" else -1
+            # Unknown sizes sort last either way.
+            result.sort(key=lambda i: (sizes[i] is None, sign * (sizes[i] or 0)))
+        elif sort == "group":
+            groups = self.group
+            result.sort(key=lambda i: (groups[i] is None, (groups[i] or "").casefold()))
+        return result
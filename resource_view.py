@@ -0,0 +1,150 @@
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from message_utils import escape_md, format_resource_block
+from resource_index import ResourceIndex
+
+# Telegram rejects messages over 4096 chars; keep room for the header and Markdown overhead.
+MESSAGE_LIMIT = 4000
+SORT_LABELS = {"size": "体积↑", "size_desc": "体积↓", "group": "发布组"}
+
+
+class ResourceView:
+    """一次 RES 查询的完整结果：条目只转义一次，分页按需排版；筛选/排序与翻页都不再请求上游。"""
+
+    __slots__ = ("title", "index", "page_chars", "page_items", "selection", "order", "_blocks", "_starts", "_rendered")
+
+    def __init__(
+        self,
+        title: str,
+        items: Union[ResourceIndex, Sequence[Dict[str, Any]]],
+        page_chars: int = 3500,
+        page_items: int = 10,
+    ):
+        self.title = title
+        self.index = items if isinstance(items, ResourceIndex) else ResourceIndex(items)
+        self.page_chars = page_chars
+        self.page_items = max(1, page_items)
+        self._blocks: List[Optional[str]] = [None] * len(self.index)
+        self.select()
+
+    def select(self, resolution: Optional[str] = None, sort: Optional[str] = None):
+        """Switch the facet filter / sort order; pages are laid out again, item blocks are reused."""
+        self.selection = {"resolution": resolution or None, "sort": sort or None}
+        self.order = self.index.select(**self.selection)
+        # _starts[n] = position in ``order`` of the first item on page n + 1; grows as later pages are viewed.
+        self._starts = [0]
+        self._rendered: Dict[int, Tuple[str, int, bool]] = {}
+
+    def _block(self, idx: int) -> str:
+        block = self._blocks[idx]
+        if block is None:
+            block = self._blocks[idx] = format_resource_block(self.index.items[idx])
+        return block
+
+    def _layout_next(self) -> bool:
+        """Work out where the page after the last known one ends; False once every item is placed."""
+        start = self._starts[-1]
+        if start >= len(self.order):
+            return False
+        end, used = start, 0
+        while end < len(self.order) and end - start < self.page_items:
+            size = len(self._block(self.order[end])) + 1
+            if end > start and used + size > self.page_chars:
+                break
+            used += size
+            end += 1
+        self._starts.append(end)
+        return True
+
+    def _header(self, start: int, end: int) -> str:
+        total = len(self.index)
+        shown = len(self.order)
+        header = f"✅ *{escape_md(self.title)} ({total}条)*"
+        notes = []
+        if self.index.duplicates:
+            notes.append(f"已去重 {self.index.duplicates} 条")
+        if self.selection["resolution"]:
+            notes.append(f"{self.selection['resolution']}: {shown} 条")
+        if self.selection["sort"]:
+            notes.append(f"排序: {SORT_LABELS.get(self.selection['sort'], self.selection['sort'])}")
+        if shown > end - start:
+            notes.append(f"第 {start + 1}-{end} 条")
+        if notes:
+            header += "\n" + escape_md("  ".join(notes))
+        return header
+
+    def render(self, page: int) -> Tuple[str, int, bool]:
+        """Text of a 1-based page (clamped to the last one), the page shown and whether another follows."""
+        page = max(1, page)
+        cached = self._rendered.get(page)
+        if cached is not None:
+            return cached
+        while len(self._starts) <= page and self._layout_next():
+            pass
+        page = max(1, min(page, len(self._starts) - 1))
+        if page in self._rendered:
+            return self._rendered[page]
+        start = self._starts[page - 1]
+        end = self._starts[page] if page < len(self._starts) else len(self.order)
+        body = "\n".join(self._block(i) for i in self.order[start:end]) or "📭 没有符合条件的资源。"
+        text = self._header(start, end) + "\n\n" + body
+        if len(text) > MESSAGE_LIMIT:
+            # Only a single oversized item can get here.
+            text = text[:MESSAGE_LIMIT] + "...\n(截断)"
+        result = self._rendered[page] = (text, page, end < len(self.order))
+        return result
+
+
+class ResourceViewStore:
+    """以短 token 保存资源结果集（内存 LRU + TTL），供 ◀ ▶ 翻页与筛选按钮使用。"""
+
+    def __init__(self, ttl: float = 1800, max_views: int = 500, page_chars: int = 3500, page_items: int = 10):
+        self.ttl = ttl
+        self.max_views = max(1, max_views)
+        self.page_chars = page_chars
+        self.page_items = page_items
+        self._views: "OrderedDict[str, Tuple[float, ResourceView]]" = OrderedDict()
+        self._stats = {
+            "resource_views": 0,
+            "resource_pages_served": 0,
+            "resource_views_expired": 0,
+            "resource_duplicates": 0,
+        }
+
+    def add(self, title: str, items: Sequence[Dict[str, Any]]) -> Tuple[str, ResourceView]:
+        token = secrets.token_hex(4)
+        while token in self._views:
+            token = secrets.token_hex(4)
+        view = ResourceView(title, items, self.page_chars, self.page_items)
+        now = time.monotonic()
+        self._views[token] = (now, view)
+        self._stats["resource_views"] += 1
+        self._stats["resource_duplicates"] += view.index.duplicates
+        while self._views:
+            oldest_at, _ = next(iter(self._views.values()))
+            if len(self._views) <= self.max_views and now - oldest_at <= self.ttl:
+                break
+            self._views.popitem(last=False)
+        return token, view
+
+    def get(self, token: str) -> Optional[ResourceView]:
+        entry = self._views.get(token)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if now - entry[0] > self.ttl:
+            del self._views[token]
+            self._stats["resource_views_expired"] += 1
+            return None
+        self._views[token] = (now, entry[1])
+        self._views.move_to_end(token)
+        self._stats["resource_pages_served"] += 1
+        return entry[1]
+
+    def stats(self) -> Dict[str, Any]:
+        data = dict(self._stats)
+        data["resource_views_active"] = len(self._views)
+        return data
@@ -0,0 +1,38 @@
+import random
+from typing import Optional
+
+import httpx
+
+# Failures where the request provably never reached upstream, so even a
+# quota-charging RES call can be re-sent without risk of double billing.
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class RetryPolicy:
+    """指数退避 + 全抖动重试策略，RES 请求只在确定未被计费时重试。"""
+
+    def __init__(self, max_retries: int = 2, base_delay: float = 0.3, max_delay: float = 5.0, max_retry_after: float = 10.0):
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay = max(0.0, float(base_delay))
+        self.max_delay = max(self.base_delay, float(max_delay))
+        self.max_retry_after = max(0.0, float(max_retry_after))
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given (0-based) retry attempt."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def should_retry(self, attempt: int, auth_mode: str, error: Exception, retry_after: Optional[float] = None) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        if isinstance(error, httpx.HTTPStatusError):
+            status = error.response.status_code
+            if status not in RETRYABLE_STATUS:
+                return False
+            if retry_after is not None and retry_after > self.max_retry_after:
+                return False
+            # A 429 is rejected before any quota is spent; a 5xx on RES may already be billed.
+            return status == 429 or auth_mode != "res"
+        if isinstance(error, httpx.TransportError):
+            return auth_mode != "res" or isinstance(error, NOT_SENT_ERRORS)
+        return False
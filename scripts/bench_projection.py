@@ -0,0 +1,85 @@
+"""对比缓存原始 JSON 与精简记录（records.py）的每条目内存占用。
+
+用法:
+    python scripts/bench_projection.py [--entries 500] [--items 20]
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import MediaItem, SearchPage  # noqa: E402
+
+
+def fake_item(rng: random.Random, idx: int) -> dict:
+    media_type = rng.choice(["movie", "tv", "person", "collection"])
+    return {
+        "tmdbid": rng.randint(1, 999999),
+        "media_type": media_type,
+        "title": f"测试影片标题 {idx}",
+        "name": f"测试影片标题 {idx}",
+        "original_title": f"Original Title Number {idx}",
+        "release_date": f"{rng.randint(1970, 2026)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+        "overview": "这是一段很长的剧情简介，" * rng.randint(10, 60),
+        "poster": f"/poster{idx:06d}abcdefghijklmnop.jpg",
+        "backdrop": f"/backdrop{idx:06d}abcdefghijklmnop.jpg",
+        "vote": round(rng.uniform(1, 10), 1),
+        "vote_count": rng.randint(0, 50000),
+        "popularity": rng.uniform(0, 500),
+        "genre_ids": [rng.randint(1, 99) for _ in range(4)],
+        "original_language": "en",
+        "adult": False,
+        "video": False,
+    }
+
+
+def fake_payloads(entries: int, items: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    return [
+        json.dumps({"page": 1, "total_pages": 10, "total_results": 200, "items": [fake_item(rng, i) for i in range(items)]}).encode()
+        for _ in range(entries)
+    ]
+
+
+def measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    held = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del held
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=500, help="缓存条目数（每条为一页搜索结果）")
+    parser.add_argument("--items", type=int, default=20, help="每页条目数")
+    args = parser.parse_args()
+
+    payloads = fake_payloads(args.entries, args.items)
+    raw_bytes = measure(lambda: [json.loads(p) for p in payloads])
+    slim_bytes = measure(lambda: [SearchPage.from_api(json.loads(p)) for p in payloads])
+
+    raw_per = raw_bytes / args.entries
+    slim_per = slim_bytes / args.entries
+    print(f"entries={args.entries} items/page={args.items}")
+    print(f"raw JSON dict : {raw_per / 1024:8.1f} KiB/entry")
+    print(f"slim records  : {slim_per / 1024:8.1f} KiB/entry")
+    print(f"ratio         : {raw_per / slim_per:8.2f}x")
+
+    detail = json.dumps(json.loads(payloads[0])["items"][0]).encode()
+    raw_detail = measure(lambda: [json.loads(detail) for _ in range(1000)]) / 1000
+    slim_detail = measure(lambda: [MediaItem.from_api(json.loads(detail)) for _ in range(1000)]) / 1000
+    print(f"detail entry  : raw {raw_detail:.0f} B vs slim {slim_detail:.0f} B ({raw_detail / slim_detail:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
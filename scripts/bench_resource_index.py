@@ -0,0 +1,94 @@
+"""测量 RES 资源列表的索引耗时（解析 infohash/体积/分辨率、去重、分面）与从缓存结果集筛选排序的耗时。
+
+用法:
+    python scripts/bench_resource_index.py [--items 500] [--dup-rate 0.2] [--rounds 200]
+"""
+import argparse
+import gc
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from resource_index import ResourceIndex  # noqa: E402
+
+RESOLUTIONS = ["2160p", "1080p", "720p", "4K", None]
+QUALITIES = [["WEB-DL"], ["BluRay", "REMUX"], ["HDR", "DV"], "HDTV", None]
+GROUPS = ["CMCT", "FRDS", "HDS", "WiKi", "MTeam", None]
+UNITS = ["GB", "MB", "GiB", "TB"]
+
+
+def fake_resources(count: int, dup_rate: float, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        if items and rng.random() < dup_rate:
+            # Same torrent listed again with a different display name.
+            dup = dict(rng.choice(items))
+            dup["name"] = dup["name"] + " [mirror]"
+            items.append(dup)
+            continue
+        infohash = "%040x" % rng.getrandbits(160)
+        resolution = rng.choice(RESOLUTIONS)
+        items.append(
+            {
+                "name": f"Some.Movie.{2000 + i % 25}.{resolution or 'unknown'}.x265-{i}",
+                "size": f"{rng.uniform(0.3, 80):.2f} {rng.choice(UNITS)}",
+                "magnet": f"magnet:?xt=urn:btih:{infohash}&dn=Some.Movie.{i}",
+                "resolution": resolution if rng.random() < 0.7 else None,
+                "quality": rng.choice(QUALITIES),
+                "group": rng.choice(GROUPS),
+            }
+        )
+    return items
+
+
+def timed(fn, rounds: int) -> list:
+    # Warm up and keep the collector out of the samples, as timeit does.
+    for _ in range(min(rounds, 20)):
+        fn()
+    samples = []
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            started = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - started) * 1000)
+    finally:
+        gc.enable()
+    return samples
+
+
+def report(label: str, samples: list):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{label:<22} median {statistics.median(samples):7.3f} ms   p95 {p95:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=500, help="每个资源列表的条目数")
+    parser.add_argument("--dup-rate", type=float, default=0.2, help="重复条目比例")
+    parser.add_argument("--rounds", type=int, default=200, help="重复次数")
+    args = parser.parse_args()
+
+    raw = fake_resources(args.items, args.dup_rate)
+    index = ResourceIndex(raw)
+    print(f"items={len(raw)} unique={len(index)} duplicates={index.duplicates}")
+    print("resolution facet:", index.facet_counts("resolution"))
+
+    # Building parses every column (infohash, size, resolution, quality, group) in one pass.
+    report("build index", timed(lambda: ResourceIndex(raw), args.rounds))
+    report("build + first sort", timed(lambda: ResourceIndex(raw).select(sort="size"), args.rounds))
+    report("filter 2160p", timed(lambda: index.select(resolution="2160p"), args.rounds))
+    report("smallest first", timed(lambda: index.select(sort="size"), args.rounds))
+    report("2160p by size desc", timed(lambda: index.select(resolution="2160p", sort="size_desc"), args.rounds))
+    report("by group", timed(lambda: index.select(sort="group"), args.rounds))
+    report("build + group facet", timed(lambda: ResourceIndex(raw).facet_counts("group"), args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""对 bot 的请求路径做压测：用假 Telegram 消息对象驱动 render_search_page / send_detail_message / send_res_message。
+
+默认在进程内启动 scripts/mock_nullbr_server.py 的模拟上游，不消耗真实配额。
+
+用法:
+    python scripts/load_test.py [--users 50] [--duration 20] [--queries 40] [--latency-ms 80] [--rate-429 0.01]
+    python scripts/load_test.py --base-url http://127.0.0.1:18080   # 使用独立启动的模拟服务器
+
+输出吞吐量、各操作 p50/p95/p99 延迟、上游实际调用次数与缓存命中情况，便于对比缓存/并发改动前后的数据。
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_nullbr_server import add_config_arguments, config_from_args, start_mock_server  # noqa: E402
+
+OPERATIONS = ("search", "page", "filter", "detail", "res")
+
+
+class FakeMessage:
+    """Stands in for telegram.Message: records what the handlers would have sent."""
+
+    def __init__(self, chat_id: int = 0):
+        self.chat_id = chat_id
+        self.text: Optional[str] = None
+        self.reply_markup = None
+        self.sent = 0
+        self.first_edit_at: Optional[float] = None
+
+    async def edit_text(self, text, **kwargs):
+        if self.first_edit_at is None:
+            self.first_edit_at = time.perf_counter()
+        self.text = text
+        self.reply_markup = kwargs.get("reply_markup", self.reply_markup)
+        self.sent += 1
+        return self
+
+    async def reply_text(self, text, **kwargs):
+        return await self.edit_text(text, **kwargs)
+
+    async def edit_reply_markup(self, reply_markup=None, **kwargs):
+        self.reply_markup = reply_markup
+        return self
+
+    def callbacks(self, prefix: str) -> List[str]:
+        if not self.reply_markup:
+            return []
+        return [
+            button.callback_data
+            for row in self.reply_markup.inline_keyboard
+            for button in row
+            if isinstance(button.callback_data, str) and button.callback_data.startswith(prefix)
+        ]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise SystemExit(f"unknown operation in --mix: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+class VirtualUser:
+    def __init__(
+        self, bot, rng: random.Random, queries: List[str], weights: List[float], mix: Dict[str, float], chat_id: int = 0
+    ):
+        self.bot = bot
+        # Each virtual user is its own chat, so upstream slots are shared between them like in production.
+        self.chat_id = chat_id
+        self.rng = rng
+        self.queries = queries
+        self.weights = weights
+        self.ops = list(mix)
+        self.op_weights = [mix[o] for o in self.ops]
+        self.msg = FakeMessage(chat_id)
+        self.token: Optional[str] = None
+        self.page = 1
+
+    def _pick_item(self):
+        items = self.msg.callbacks("st_")
+        if items:
+            _, media_type, tmdbid = self.rng.choice(items).split("_", 2)
+            return media_type, tmdbid
+        return "movie", str(self.rng.randint(1, 5000))
+
+    async def step(self):
+        """Run one random operation; returns (operation, message it wrote to)."""
+        op = self.rng.choices(self.ops, self.op_weights)[0]
+        if op != "search" and self.token is None:
+            op = "search"
+        bot = self.bot
+        if op == "search":
+            query = self.rng.choices(self.queries, self.weights)[0]
+            self.token = bot.create_search_session(query, chat_id=str(self.chat_id))
+            self.page = 1
+            self.msg.first_edit_at = None
+            await bot.render_search_page(self.msg, self.token, 1)
+        elif op == "page":
+            self.page += 1
+            await bot.render_search_page(self.msg, self.token, self.page)
+        elif op == "filter":
+            session = bot.get_search_session(self.token)
+            if session is not None:
+                session["filter"] = self.rng.choice(["all", "movie", "tv", "person", "collection"])
+            self.page = 1
+            await bot.render_search_page(self.msg, self.token, 1)
+        elif op == "detail":
+            media_type, tmdbid = self._pick_item()
+            reply = FakeMessage(self.chat_id)
+            await bot.send_detail_message(reply, tmdbid, media_type)
+            return op, reply
+        else:
+            media_type, tmdbid = self._pick_item()
+            if media_type not in ("movie", "tv"):
+                media_type = "movie"
+            reply = FakeMessage(self.chat_id)
+            await bot.send_res_message(reply, tmdbid, media_type, self.rng.choice(["115", "magnet"]))
+            return op, reply
+        return op, self.msg
+
+
+async def run(args: argparse.Namespace):
+    tmp = tempfile.mkdtemp(prefix="nullbr-load-")
+    os.environ.setdefault("BOT_TOKEN", "0:load-test")
+    os.environ["AUTH_DB_FILE"] = os.path.join(tmp, "auth.db")
+    os.environ["RES_CACHE_DB"] = os.path.join(tmp, "res_cache.db")
+    os.environ["SEARCH_INDEX_DB"] = os.path.join(tmp, "search_index.db")
+    os.environ["SEARCH_SESSION_DB"] = os.path.join(tmp, "search_sessions.db")
+    os.environ["NULLBR_APP_ID"] = "mock-app-0"
+    os.environ["NULLBR_API_KEY"] = "mock-key-0"
+    os.environ["QUOTA_REFRESH_INTERVAL"] = "0"
+    os.environ["PREFETCH_ENABLED"] = "1" if args.prefetch else "0"
+
+    server = mock = None
+    base_url = args.base_url
+    if not base_url:
+        server, mock, base_url = await start_mock_server(config_from_args(args))
+
+    import logging
+
+    import bot  # noqa: E402  (reads the environment prepared above)
+
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+    bot.api_client.base_url = base_url
+    for i in range(1, args.keys):
+        await bot.db.upsert_api_key(f"mock-app-{i}", f"mock-key-{i}")
+    bot.prefetcher.start()
+
+    rng = random.Random(args.seed)
+    queries = [f"query{i}" for i in range(args.queries)]
+    # Zipf-like popularity so a few queries are hot, as in real traffic.
+    weights = [1 / (i + 1) ** args.zipf for i in range(args.queries)]
+    mix = parse_mix(args.mix)
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    deadline = time.perf_counter() + args.duration
+
+    async def user_loop(uid: int):
+        user = VirtualUser(bot, random.Random(rng.random()), queries, weights, mix, chat_id=uid + 1)
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                op, msg = await user.step()
+            except Exception as e:
+                errors["exception"] += 1
+                if errors["exception"] <= 3:
+                    print(f"user {uid}: {type(e).__name__}: {e}")
+                continue
+            latencies[op].append((time.perf_counter() - started) * 1000)
+            if op == "search" and msg.first_edit_at:
+                # Time until the user first sees results (local index preview or upstream).
+                latencies["first"].append((msg.first_edit_at - started) * 1000)
+            if msg.text and msg.text.startswith("❌"):
+                errors[op] += 1
+            if args.think_ms:
+                await asyncio.sleep(rng.uniform(0, args.think_ms) / 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user_loop(i) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+
+    metrics = bot.api_client.get_metrics_snapshot()
+    await bot.prefetcher.stop()
+    await bot.api_client.close()
+    bot.db.close()
+    if server is not None:
+        server.close()
+        await server.wait_closed()
+
+    total_ops = sum(len(v) for v in latencies.values())
+    print(f"users={args.users} duration={elapsed:.1f}s ops={total_ops} throughput={total_ops / elapsed:.1f} ops/s")
+    print(f"{'op':<8}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'errors':>8}")
+    for op in OPERATIONS + ("first",):
+        samples = latencies.get(op)
+        if not samples:
+            continue
+        print(
+            f"{op:<8}{len(samples):>8}{percentile(samples, 0.5):>10.1f}{percentile(samples, 0.95):>10.1f}"
+            f"{percentile(samples, 0.99):>10.1f}{errors.get(op, 0):>8}"
+        )
+    if errors.get("exception"):
+        print(f"exceptions: {errors['exception']}")
+    upstream = metrics["upstream_calls"]
+    print(
+        f"upstream calls={upstream} ({upstream / max(1, total_ops):.2f}/op) "
+        f"meta hit/miss={metrics['meta_cache_hit']}/{metrics['meta_cache_miss']} "
+        f"coalesced={metrics['coalesced_waiters']} res hit/miss={metrics['res_cache_hit']}/{metrics['res_cache_miss']} "
+        f"negative hits={metrics['negative_cache_hit']} retries={metrics['retries']} 429={metrics['http_429']}"
+    )
+    print(
+        f"local index hit/miss={metrics['local_search_hit']}/{metrics['local_search_miss']} "
+        f"entries={metrics['search_index_entries']} size={metrics['search_index_bytes'] / 1024:.0f} KiB "
+        f"write avg={metrics['search_index_write_ms_avg']}ms"
+    )
+    if mock is not None:
+        print(f"mock server calls: {dict(sorted(mock.calls.items()))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50, help="并发虚拟用户数")
+    parser.add_argument("--duration", type=float, default=20.0, help="压测时长（秒）")
+    parser.add_argument("--queries", type=int, default=40, help="搜索关键字池大小")
+    parser.add_argument("--zipf", type=float, default=1.1, help="关键字热度分布的 Zipf 指数")
+    parser.add_argument("--mix", default="search=4,page=2,filter=1,detail=3,res=1", help="操作权重")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="每次操作后的随机思考时间上限（毫秒）")
+    parser.add_argument("--keys", type=int, default=3, help="接口池中的模拟 Key 数量")
+    parser.add_argument("--prefetch", action="store_true", help="开启预取")
+    parser.add_argument("--verbose", action="store_true", help="保留 WARNING 级别日志（如 429 重试）")
+    parser.add_argument("--base-url", default=None, help="使用外部模拟服务器而不是进程内启动")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    if args.seed is None:
+        args.seed = 1
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
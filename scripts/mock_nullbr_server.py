@@ -0,0 +1,232 @@
+"""本地 Nullbr API 模拟服务器：实现 NullbrAPI 用到的全部接口，可配置延迟分布、429 注入与响应体大小。
+
+用法:
+    python scripts/mock_nullbr_server.py [--port 18080] [--latency-ms 80] [--dist lognormal] [--rate-429 0.02]
+
+然后以 NullbrAPI(base_url="http://127.0.0.1:18080") 连接。
+附加的调试接口: GET /__stats 返回各接口调用次数，GET /__reset 清零。
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+MEDIA_TYPES = ("movie", "tv", "person", "collection")
+
+ROUTES = [
+    ("res", re.compile(r"^/(movie|tv)/(\d+)/(115)$")),
+    ("res", re.compile(r"^/(movie)/(\d+)/(magnet)$")),
+    ("res", re.compile(r"^/(tv)/(\d+)/season/\d+(?:/episode/\d+)?/(magnet)$")),
+    ("detail", re.compile(r"^/(movie|tv|person|collection)/(\d+)$")),
+    ("list", re.compile(r"^/list/(\d+)$")),
+    ("search", re.compile(r"^/search$")),
+    ("user", re.compile(r"^/user/info$")),
+]
+
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 80.0
+    dist: str = "lognormal"  # fixed | uniform | lognormal
+    jitter: float = 0.5
+    rate_429: float = 0.0
+    retry_after: int = 1
+    items_per_page: int = 20
+    total_pages: int = 5
+    overview_len: int = 400
+    res_items: int = 15
+    not_found_rate: float = 0.0
+    seed: Optional[int] = None
+
+
+class MockNullbr:
+    """请求处理与计数；不依赖任何第三方 HTTP 框架。"""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.calls: Counter = Counter()
+        # Titles handed out in search pages, so detail responses stay consistent with them.
+        self.names: Dict[int, str] = {}
+
+    def latency(self) -> float:
+        c = self.config
+        if c.latency_ms <= 0:
+            return 0.0
+        if c.dist == "fixed":
+            ms = c.latency_ms
+        elif c.dist == "uniform":
+            ms = self.rng.uniform(c.latency_ms * (1 - c.jitter), c.latency_ms * (1 + c.jitter))
+        else:
+            # Median at latency_ms with a long right tail, like a real upstream.
+            ms = self.rng.lognormvariate(0, c.jitter) * c.latency_ms
+        return max(0.0, ms) / 1000
+
+    def _item(self, tmdbid: int, media_type: str, prefix: str = "") -> Dict[str, Any]:
+        if prefix:
+            self.names[tmdbid] = f"{prefix} 模拟条目 {tmdbid}"
+        return {
+            "tmdbid": tmdbid,
+            "media_type": media_type,
+            "title": self.names.get(tmdbid, f"模拟条目 {tmdbid}"),
+            "original_title": f"Mock Title {tmdbid}",
+            "release_date": f"{1980 + tmdbid % 45}-0{1 + tmdbid % 9}-1{tmdbid % 10}",
+            "overview": ("模拟剧情简介" * (self.config.overview_len // 6 + 1))[: self.config.overview_len],
+            "poster": f"/mock{tmdbid}.jpg",
+            "backdrop": f"/mock{tmdbid}_bg.jpg",
+            "vote": round(5 + (tmdbid % 50) / 10, 1),
+            "vote_count": tmdbid % 9000,
+            "genre_ids": [tmdbid % 20, tmdbid % 30],
+        }
+
+    def _page(self, seed: str, page: int) -> Dict[str, Any]:
+        c = self.config
+        if page > c.total_pages:
+            return {"page": page, "total_pages": c.total_pages, "total_results": c.total_pages * c.items_per_page, "items": []}
+        base = (zlib.crc32(seed.encode()) % 100000) * 100 + page * c.items_per_page
+        items = [self._item(base + i, MEDIA_TYPES[(base + i) % len(MEDIA_TYPES)], seed) for i in range(c.items_per_page)]
+        return {"page": page, "total_pages": c.total_pages, "total_results": c.total_pages * c.items_per_page, "items": items}
+
+    def _resources(self, tmdbid: str, kind: str) -> Dict[str, Any]:
+        entries = []
+        for i in range(self.config.res_items):
+            entry = {
+                "name": f"Mock.{tmdbid}.{2160 if i % 3 == 0 else 1080}p.WEB-DL.x265-GRP{i % 4}.mkv",
+                "size": f"{1 + i % 30}.{i % 10} GB",
+                "resolution": "2160p" if i % 3 == 0 else "1080p",
+                "quality": ["WEB-DL", "HDR"] if i % 2 else "BluRay",
+                "group": f"GRP{i % 4}",
+            }
+            if kind == "magnet":
+                entry["magnet"] = f"magnet:?xt=urn:btih:{(int(tmdbid) * 1000 + i):040x}"
+            else:
+                entry["share_link"] = f"https://115.com/s/mock{tmdbid}{i}"
+            entries.append(entry)
+        return {kind: entries}
+
+    def route(self, path: str, query: Dict[str, str]) -> Tuple[str, int, Dict[str, Any]]:
+        for family, pattern in ROUTES:
+            m = pattern.match(path)
+            if not m:
+                continue
+            if family == "search":
+                return family, 200, self._page(query.get("query", ""), int(query.get("page", "1")))
+            if family == "list":
+                data = self._page(f"list:{m.group(1)}", int(query.get("page", "1")))
+                data["name"] = f"模拟片单 {m.group(1)}"
+                return family, 200, data
+            if family == "user":
+                return family, 200, {"plan": "mock", "limit": 1000, "remaining": 1000 - self.calls["res"]}
+            if self.config.not_found_rate and self.rng.random() < self.config.not_found_rate:
+                return family, 404, {"detail": "not found"}
+            if family == "detail":
+                return family, 200, self._item(int(m.group(2)), m.group(1))
+            return family, 200, self._resources(m.group(2), m.group(3))
+        return "other", 404, {"detail": "not found"}
+
+    async def handle(self, method: str, target: str) -> Tuple[int, Dict[str, str], bytes]:
+        url = urlsplit(target)
+        if url.path == "/__stats":
+            return 200, {}, json.dumps(dict(self.calls)).encode()
+        if url.path == "/__reset":
+            self.calls.clear()
+            return 200, {}, b"{}"
+        if method == "HEAD" or url.path == "/":
+            return 200, {}, b""
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        await asyncio.sleep(self.latency())
+        if self.config.rate_429 and self.rng.random() < self.config.rate_429:
+            self.calls["http_429"] += 1
+            return 429, {"Retry-After": str(self.config.retry_after)}, b'{"detail":"rate limited"}'
+        family, status, body = self.route(url.path, query)
+        self.calls[family] += 1
+        return status, {}, json.dumps(body, ensure_ascii=False).encode()
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                keep_alive = True
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    if line.lower().startswith(b"connection:") and b"close" in line.lower():
+                        keep_alive = False
+                status, headers, body = await self.handle(method, target)
+                head = [f"HTTP/1.1 {status} {'OK' if status == 200 else 'ERR'}", "Content-Type: application/json"]
+                head += [f"{k}: {v}" for k, v in headers.items()]
+                head.append(f"Content-Length: {len(body)}")
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + (b"" if method == "HEAD" else body))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def start_mock_server(config: MockConfig, host: str = "127.0.0.1", port: int = 0):
+    """启动模拟服务器，返回 (server, mock, base_url)；port=0 时随机分配端口。"""
+    mock = MockNullbr(config)
+    server = await asyncio.start_server(mock.serve_connection, host, port)
+    bound_port = server.sockets[0].getsockname()[1]
+    return server, mock, f"http://{host}:{bound_port}"
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="上游延迟中位数/均值（毫秒）")
+    parser.add_argument("--dist", choices=["fixed", "uniform", "lognormal"], default="lognormal", help="延迟分布")
+    parser.add_argument("--jitter", type=float, default=0.5, help="uniform 的相对抖动 / lognormal 的 sigma")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="返回 429 的概率")
+    parser.add_argument("--retry-after", type=int, default=1, help="429 响应的 Retry-After（秒）")
+    parser.add_argument("--items-per-page", type=int, default=20)
+    parser.add_argument("--total-pages", type=int, default=5)
+    parser.add_argument("--overview-len", type=int, default=400, help="简介长度（控制响应体大小）")
+    parser.add_argument("--res-items", type=int, default=15, help="每个资源响应的条目数")
+    parser.add_argument("--not-found-rate", type=float, default=0.0, help="详情/资源接口返回 404 的概率")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        latency_ms=args.latency_ms,
+        dist=args.dist,
+        jitter=args.jitter,
+        rate_429=args.rate_429,
+        retry_after=args.retry_after,
+        items_per_page=args.items_per_page,
+        total_pages=args.total_pages,
+        overview_len=args.overview_len,
+        res_items=args.res_items,
+        not_found_rate=args.not_found_rate,
+        seed=args.seed,
+    )
+
+
+async def _main(args: argparse.Namespace):
+    server, _, base_url = await start_mock_server(config_from_args(args), args.host, args.port)
+    print(f"mock Nullbr API listening on {base_url}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    add_config_arguments(parser)
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,182 @@
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from db import AsyncSQLite
+from records import MediaItem
+
+logger = logging.getLogger(__name__)
+
+# trigram needs at least 3 characters; shorter (typical 2-char CJK) queries use LIKE.
+TRIGRAM_MIN_CHARS = 3
+
+
+def _fts_query(query: str) -> str:
+    """Quote each whitespace-separated term so user input is never parsed as FTS syntax."""
+    terms = [t for t in query.split() if t]
+    return " ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def _like_pattern(query: str) -> str:
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class SearchIndex:
+    """本地全文索引：收录上游返回过的所有条目（SQLite FTS5 trigram 分词，兼容中日韩），供搜索即时作答。"""
+
+    def __init__(self, path: str, max_entries: int = 50000):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self._db = AsyncSQLite(path)
+        self._ready = False
+        self._fts = False
+        self._count = 0
+        self._write_ms = 0.0
+        self._writes = 0
+
+    def _ensure_schema(self, conn: sqlite3.Connection):
+        if self._ready:
+            return
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS media_items
+               (item_key TEXT PRIMARY KEY,
+                media_type TEXT NOT NULL,
+                tmdbid TEXT NOT NULL,
+                name TEXT NOT NULL,
+                release_date TEXT,
+                overview TEXT,
+                overview_truncated INTEGER,
+                poster TEXT,
+                vote TEXT,
+                updated_at REAL NOT NULL)"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_media_items_updated ON media_items (updated_at)")
+        try:
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS media_fts USING fts5(name, tokenize='trigram')")
+            self._fts = True
+        except sqlite3.OperationalError as e:
+            logger.warning("SQLite 不支持 FTS5 trigram，本地索引退化为 LIKE 查询: %s", e)
+        self._count = conn.execute("SELECT COUNT(*) FROM media_items").fetchone()[0]
+        self._ready = True
+
+    def _add_sync(self, conn: sqlite3.Connection, items: List[MediaItem]) -> int:
+        self._ensure_schema(conn)
+        started_at = time.perf_counter()
+        now = time.time()
+        added = 0
+        for item in items:
+            key = f"{item.media_type}:{item.tmdbid}"
+            row = conn.execute("SELECT rowid, name FROM media_items WHERE item_key = ?", (key,)).fetchone()
+            values = (
+                item.name,
+                item.release_date,
+                item.overview,
+                int(item.overview_truncated),
+                item.poster,
+                str(item.vote),
+                now,
+            )
+            if row:
+                conn.execute(
+                    """UPDATE media_items SET name = ?, release_date = ?, overview = ?, overview_truncated = ?,
+                       poster = ?, vote = ?, updated_at = ? WHERE rowid = ?""",
+                    values + (row[0],),
+                )
+                if self._fts and row[1] != item.name:
+                    conn.execute("UPDATE media_fts SET name = ? WHERE rowid = ?", (item.name, row[0]))
+                continue
+            cur = conn.execute(
+                """INSERT INTO media_items (name, release_date, overview, overview_truncated, poster, vote, updated_at,
+                   item_key, media_type, tmdbid) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                values + (key, item.media_type, item.tmdbid),
+            )
+            if self._fts:
+                conn.execute("INSERT INTO media_fts (rowid, name) VALUES (?, ?)", (cur.lastrowid, item.name))
+            added += 1
+        self._count += added
+        if self._count > self.max_entries:
+            overflow = self._count - self.max_entries
+            stale = "SELECT rowid FROM media_items ORDER BY updated_at LIMIT ?"
+            if self._fts:
+                conn.execute(f"DELETE FROM media_fts WHERE rowid IN ({stale})", (overflow,))
+            conn.execute(f"DELETE FROM media_items WHERE rowid IN ({stale})", (overflow,))
+            self._count = conn.execute("SELECT COUNT(*) FROM media_items").fetchone()[0]
+        self._write_ms += (time.perf_counter() - started_at) * 1000
+        self._writes += 1
+        return added
+
+    def _search_sync(self, conn: sqlite3.Connection, query: str, limit: int, media_type: Optional[str]) -> List[MediaItem]:
+        self._ensure_schema(conn)
+        columns = "m.name, m.tmdbid, m.release_date, m.media_type, m.overview, m.overview_truncated, m.poster, m.vote"
+        type_clause = " AND m.media_type = ?" if media_type else ""
+        type_params: tuple = (media_type,) if media_type else ()
+        terms = query.split()
+        if self._fts and terms and all(len(t) >= TRIGRAM_MIN_CHARS for t in terms):
+            rows = conn.execute(
+                f"""SELECT {columns} FROM media_fts f JOIN media_items m ON m.rowid = f.rowid
+                    WHERE media_fts MATCH ?{type_clause} ORDER BY f.rank LIMIT ?""",
+                (_fts_query(query),) + type_params + (limit,),
+            ).fetchall()
+        else:
+            # Shortest matching names first: "流浪" should rank 流浪地球 above longer titles.
+            rows = conn.execute(
+                f"""SELECT {columns} FROM media_items m WHERE m.name LIKE ? ESCAPE '\\'{type_clause}
+                    ORDER BY length(m.name), m.updated_at DESC LIMIT ?""",
+                (_like_pattern(query.strip()),) + type_params + (limit,),
+            ).fetchall()
+        return [
+            MediaItem(
+                name=r[0],
+                tmdbid=r[1],
+                release_date=r[2] or "",
+                media_type=r[3],
+                overview=r[4] or "",
+                overview_truncated=bool(r[5]),
+                poster=r[6] or "",
+                vote=r[7] or 0,
+            )
+            for r in rows
+        ]
+
+    async def add_items(self, items: Iterable[MediaItem]) -> int:
+        batch = [i for i in items if i.tmdbid and i.name]
+        if not batch:
+            return 0
+        try:
+            return await self._db.run(self._add_sync, batch)
+        except Exception as e:
+            logger.error("Error writing search index: %s", e)
+            return 0
+
+    async def search(self, query: str, limit: int = 20, media_type: Optional[str] = None) -> List[MediaItem]:
+        query = query.strip()
+        if not query:
+            return []
+        try:
+            return await self._db.run(self._search_sync, query, limit, media_type)
+        except Exception as e:
+            logger.error("Error querying search index: %s", e)
+            return []
+
+    def size(self) -> int:
+        return self._count
+
+    def stats(self) -> Dict[str, Any]:
+        disk_bytes = 0
+        for suffix in ("", "-wal"):
+            try:
+                disk_bytes += os.path.getsize(self.path + suffix)
+            except OSError:
+                pass
+        return {
+            "search_index_entries": self._count,
+            "search_index_bytes": disk_bytes,
+            "search_index_fts": self._fts,
+            "search_index_write_ms_avg": round(self._write_ms / self._writes, 2) if self._writes else 0.0,
+        }
+
+    def close(self):
+        self._db.close()
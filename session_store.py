@@ -0,0 +1,230 @@
+import asyncio
+import json
+import logging
+import secrets
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from db import AsyncSQLite
+from records import SearchPage
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(session: Dict[str, Any]) -> str:
+    # Keys starting with "_" hold per-process caches and are never persisted.
+    return json.dumps({k: v for k, v in session.items() if not k.startswith("_")}, ensure_ascii=False)
+
+
+def _decode(raw: str) -> Dict[str, Any]:
+    session = json.loads(raw)
+    # JSON turns the int view-page keys into strings and the (page, index) tuples into lists.
+    session["cursors"] = {
+        media_filter: {int(page): tuple(pos) for page, pos in views.items()}
+        for media_filter, views in (session.get("cursors") or {}).items()
+    }
+    return session
+
+
+class SearchSessionStore:
+    """搜索会话存储：按最近访问排序的 OrderedDict，创建/访问/淘汰均摊 O(1)；后台批量写入 SQLite，重启后按钮仍可用。"""
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = 24 * 3600,
+        max_sessions: int = 200,
+        flush_interval: float = 2.0,
+        max_pages: int = 10,
+    ):
+        self.ttl = ttl
+        self.max_sessions = max(1, max_sessions)
+        self.max_pages = max(0, max_pages)
+        self.flush_interval = max(0.1, flush_interval)
+        self._db = AsyncSQLite(path)
+        # Least recently used first; since every access moves a session to the end, the head is also the stalest.
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        self._deleted: Set[str] = set()
+        # Created since the last flush, so dropping them needs no DELETE.
+        self._unsaved: Set[str] = set()
+        self._flush_task: Optional["asyncio.Task[None]"] = None
+        self._stats = {
+            "sessions_loaded": 0,
+            "sessions_expired": 0,
+            "sessions_evicted": 0,
+            "sessions_flushed": 0,
+            "session_page_hit": 0,
+            "session_page_miss": 0,
+        }
+
+    @staticmethod
+    def _ensure_schema(conn: sqlite3.Connection):
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS search_sessions
+               (token TEXT PRIMARY KEY, data TEXT NOT NULL, ts REAL NOT NULL)"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_search_sessions_ts ON search_sessions (ts)")
+
+    def load(self):
+        """Restore unexpired sessions at startup (blocking, before the event loop runs)."""
+
+        def _load(conn: sqlite3.Connection) -> Tuple[List[Tuple[str, str, float]], int]:
+            self._ensure_schema(conn)
+            pruned = conn.execute("DELETE FROM search_sessions WHERE ts < ?", (time.time() - self.ttl,)).rowcount
+            # Rows past max_sessions would never be restored; with an hours-long TTL they would pile up.
+            pruned += conn.execute(
+                """DELETE FROM search_sessions WHERE token NOT IN
+                   (SELECT token FROM search_sessions ORDER BY ts DESC LIMIT ?)""",
+                (self.max_sessions,),
+            ).rowcount
+            rows = conn.execute("SELECT token, data, ts FROM search_sessions ORDER BY ts").fetchall()
+            return rows, pruned
+
+        try:
+            rows, pruned = self._db.run_sync(_load)
+        except Exception as e:
+            logger.error("加载搜索会话失败: %s", e)
+            return
+        if pruned:
+            logger.info("Pruned %s expired or surplus search sessions at startup", pruned)
+        for token, raw, ts in rows:
+            try:
+                session = _decode(raw)
+            except (ValueError, TypeError, AttributeError):
+                continue
+            session["ts"] = ts
+            self._sessions[token] = session
+        self._stats["sessions_loaded"] = len(self._sessions)
+
+    def _evict(self, now: float):
+        while self._sessions:
+            token, session = next(iter(self._sessions.items()))
+            if now - session.get("ts", 0) > self.ttl:
+                self._stats["sessions_expired"] += 1
+            elif len(self._sessions) > self.max_sessions:
+                self._stats["sessions_evicted"] += 1
+            else:
+                break
+            self._drop(token)
+
+    def _drop(self, token: str):
+        self._sessions.pop(token, None)
+        self._dirty.discard(token)
+        if token in self._unsaved:
+            self._unsaved.discard(token)
+        else:
+            self._deleted.add(token)
+
+    def create(self, session: Dict[str, Any]) -> str:
+        token = secrets.token_hex(4)
+        while token in self._sessions:
+            token = secrets.token_hex(4)
+        now = time.time()
+        session["ts"] = now
+        self._sessions[token] = session
+        self._dirty.add(token)
+        self._unsaved.add(token)
+        self._evict(now)
+        return token
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        session = self._sessions.get(token)
+        if session is None:
+            return None
+        now = time.time()
+        if now - session.get("ts", 0) > self.ttl:
+            self._stats["sessions_expired"] += 1
+            self._drop(token)
+            return None
+        session["ts"] = now
+        self._sessions.move_to_end(token)
+        self._dirty.add(token)
+        return session
+
+    def save(self, token: str):
+        """Mark a session changed after an await, so its latest state is written by the next flush."""
+        if token in self._sessions:
+            self._dirty.add(token)
+
+    def get_page(self, session: Dict[str, Any], page: int) -> Optional[SearchPage]:
+        """An upstream page this session already fetched (memory only; refetched after a restart)."""
+        data = session.get("_pages", {}).get(page)
+        self._stats["session_page_hit" if data is not None else "session_page_miss"] += 1
+        return data
+
+    def put_page(self, session: Dict[str, Any], data: SearchPage):
+        pages = session.setdefault("_pages", {})
+        if data.page in pages or len(pages) < self.max_pages:
+            pages[data.page] = data
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def start(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("搜索会话写入失败: %s", e)
+
+    def _take_batch(self) -> Tuple[List[Tuple[str, str, float]], List[Tuple[str]]]:
+        upserts = [(t, _encode(self._sessions[t]), self._sessions[t].get("ts", 0)) for t in self._dirty if t in self._sessions]
+        deletes = [(t,) for t in self._deleted]
+        self._dirty.clear()
+        self._deleted.clear()
+        self._unsaved.clear()
+        return upserts, deletes
+
+    def _write_sync(self, conn: sqlite3.Connection, upserts, deletes):
+        self._ensure_schema(conn)
+        if deletes:
+            conn.executemany("DELETE FROM search_sessions WHERE token = ?", deletes)
+        if upserts:
+            conn.executemany(
+                """INSERT INTO search_sessions (token, data, ts) VALUES (?, ?, ?)
+                   ON CONFLICT(token) DO UPDATE SET data = excluded.data, ts = excluded.ts""",
+                upserts,
+            )
+        conn.execute("DELETE FROM search_sessions WHERE ts < ?", (time.time() - self.ttl,))
+
+    async def flush(self):
+        """Write every session touched since the last flush in one transaction."""
+        if not self._dirty and not self._deleted:
+            return
+        upserts, deletes = self._take_batch()
+        await self._db.run(self._write_sync, upserts, deletes)
+        self._stats["sessions_flushed"] += len(upserts)
+
+    async def stop(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    def close(self):
+        if self._dirty or self._deleted:
+            try:
+                self._db.run_sync(self._write_sync, *self._take_batch())
+            except Exception as e:
+                logger.error("搜索会话写入失败: %s", e)
+        self._db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        data = dict(self._stats)
+        data["sessions_active"] = len(self._sessions)
+        data["sessions_dirty"] = len(self._dirty)
+        lookups = data["session_page_hit"] + data["session_page_miss"]
+        data["session_page_hit_rate"] = round(data["session_page_hit"] / lookups * 100, 1) if lookups else 0.0
+        return data
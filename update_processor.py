@@ -0,0 +1,74 @@
+import asyncio
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """并发处理更新：同一会话内按到达顺序串行，不同会话并行，总并发数受限。"""
+
+    def __init__(self, max_concurrent: int = 16, max_pending: int = 1024):
+        # The base semaphore only caps the backlog; the worker slots are taken after the per-chat lock,
+        # so a chat waiting on its own earlier update never holds a slot another chat could use.
+        super().__init__(max_concurrent_updates=max(max_pending, max_concurrent))
+        self._workers = asyncio.Semaphore(max(1, max_concurrent))
+        self._active = 0
+        self._chat_locks: Dict[int, asyncio.Lock] = {}
+        self._chat_pending: Dict[int, int] = {}
+        self._stats = {"updates_processed": 0, "updates_failed": 0, "updates_peak_chat_queue": 0}
+
+    @staticmethod
+    def _chat_key(update: object) -> Optional[int]:
+        if isinstance(update, Update) and update.effective_chat is not None:
+            return update.effective_chat.id
+        # Inline queries and inline-message callbacks carry no chat: no ordering needed.
+        return None
+
+    async def do_process_update(self, update: object, coroutine: "Awaitable[Any]") -> None:
+        key = self._chat_key(update)
+        if key is None:
+            await self._run(coroutine)
+            return
+        lock = self._chat_locks.get(key)
+        if lock is None:
+            lock = self._chat_locks[key] = asyncio.Lock()
+        pending = self._chat_pending.get(key, 0) + 1
+        self._chat_pending[key] = pending
+        self._stats["updates_peak_chat_queue"] = max(self._stats["updates_peak_chat_queue"], pending)
+        try:
+            async with lock:
+                await self._run(coroutine)
+        finally:
+            pending = self._chat_pending[key] - 1
+            if pending:
+                self._chat_pending[key] = pending
+            else:
+                del self._chat_pending[key]
+                self._chat_locks.pop(key, None)
+
+    async def _run(self, coroutine: "Awaitable[Any]"):
+        async with self._workers:
+            self._active += 1
+            try:
+                await coroutine
+            except Exception:
+                # Application already routes handler errors to its error handlers; just count here.
+                self._stats["updates_failed"] += 1
+                raise
+            finally:
+                self._active -= 1
+                self._stats["updates_processed"] += 1
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        data = dict(self._stats)
+        data["updates_active"] = self._active
+        data["updates_queued_chats"] = len(self._chat_pending)
+        data["updates_backlog"] = self.current_concurrent_updates
+        return data